@@ -0,0 +1,122 @@
+"""
+admission.py
+
+Admission control in front of the LLM server. A bounded number of chat requests are sent to the
+LLM server at the same time; the others wait in a bounded queue for at most a configured time.
+Requests over the queue limit are rejected immediately with 429 and requests that wait too long
+get a 503, both with a Retry-After header, instead of piling up until everyone times out.
+
+Note: the limits apply per uvicorn worker (API_NO_WORKERS).
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+from fastapi import HTTPException
+
+from config import settings
+
+
+class AdmissionController:
+    """Bounded concurrency limiter with a bounded waiting queue and a maximum queue time."""
+
+    def __init__(self, max_concurrent: int, max_queue: int, max_queue_wait: float, retry_after: int) -> None:
+        self.max_concurrent = max(max_concurrent, 1)
+        self.max_queue = max(max_queue, 0)
+        self.max_queue_wait = max_queue_wait
+        self.retry_after = retry_after
+        self._condition = threading.Condition()
+        # current state
+        self.in_flight: int = 0
+        self.queued: int = 0
+        # counters
+        self.admitted: int = 0
+        self.rejected: int = 0
+        self.timed_out: int = 0
+        self.total_wait: float = 0.0
+        self.max_wait: float = 0.0
+
+    def _reject(self, status_code: int, detail: str) -> HTTPException:
+        return HTTPException(
+            status_code=status_code,
+            detail=detail,
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    def acquire(self) -> None:
+        """
+        Take a slot, waiting in the queue if all slots are in use.
+
+        Raises:
+            HTTPException: 429 if the queue is full, 503 if the maximum queue time is exceeded.
+        """
+        start = time.monotonic()
+        with self._condition:
+            if self.in_flight >= self.max_concurrent:
+                if self.queued >= self.max_queue:
+                    self.rejected += 1
+                    raise self._reject(429, "Too many chat requests, please retry later")
+                self.queued += 1
+                try:
+                    deadline = start + self.max_queue_wait
+                    while self.in_flight >= self.max_concurrent:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.timed_out += 1
+                            raise self._reject(503, "Chat service is busy, please retry later")
+                        self._condition.wait(remaining)
+                finally:
+                    self.queued -= 1
+            self.in_flight += 1
+            waited = time.monotonic() - start
+            self.admitted += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+    def release(self) -> None:
+        """
+        Free a slot and wake up the next waiting request.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """
+        Context manager holding a slot for the duration of the block.
+        """
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Current queue depth, in-flight requests and wait-time statistics.
+        """
+        with self._condition:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "max_queue_wait_seconds": self.max_queue_wait,
+                "in_flight": self.in_flight,
+                "queue_depth": self.queued,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "avg_wait_seconds": round(self.total_wait / self.admitted, 4) if self.admitted else 0.0,
+                "max_wait_seconds": round(self.max_wait, 4),
+            }
+
+
+# Instantiate the limiter used for the LLM server
+llm_admission = AdmissionController(
+    max_concurrent=settings.llm_max_concurrent,
+    max_queue=settings.llm_max_queue,
+    max_queue_wait=settings.llm_max_queue_wait,
+    retry_after=settings.llm_retry_after,
+)
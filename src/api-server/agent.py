@@ -5,6 +5,8 @@ CRUD operations for agent-related data in the SQLite database, including agent c
 """
 
 from fastapi import HTTPException
+import base64
+import json
 import time
 from datetime import datetime
 import sqlite3
@@ -76,6 +78,22 @@ def _create_table(cursor: Cursor) -> None:
         )
     """
     )
+    # indexes for the sorted and paginated agents list (name is indexed by UNIQUE)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_agents_created_on ON agents (created_on, id)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_agents_updated_on ON agents (updated_on, id)"
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS embeddings_progress (
+            agent_name TEXT PRIMARY KEY,
+            progress TEXT,
+            updated_on INTEGER
+        )
+    """
+    )
 
 
 # Utility function to convert an Agent object to a dictionary of selected fields
@@ -97,17 +115,69 @@ def agent_to_dict(agent: Agent) -> Dict[str, Any]:
 # ---------- Methods for Agent Operations
 
 
-# Function to get a list of agents
-def get_agents() -> List[Dict[str, Any]]:
+# Columns the agents list can be sorted by
+AGENT_SORT_COLUMNS = ("name", "created_on", "updated_on")
+
+
+def _encode_cursor(value: Any, id: int) -> str:
+    """
+    Encode the sort value and id of the last agent of a page into an opaque cursor.
+    """
+    return base64.urlsafe_b64encode(json.dumps([value, id]).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor_str: str) -> Tuple[Any, int]:
+    try:
+        value, id = json.loads(base64.urlsafe_b64decode(cursor_str.encode("ascii")))
+        return value, int(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# Function to get a page of agents
+def get_agents(
+    limit: int = 50,
+    cursor_str: Optional[str] = None,
+    sort: str = "name",
+    order: str = "asc",
+    prefix: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Get a page of agents sorted by name, created_on or updated_on, optionally filtered by name prefix.
+    Uses keyset pagination on (sort column, id): returns the agents and the cursor of the next page.
+    """
+    if sort not in AGENT_SORT_COLUMNS:
+        raise HTTPException(status_code=400, detail=f"Invalid sort, use one of {', '.join(AGENT_SORT_COLUMNS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="Invalid order, use asc or desc")
+
     agents: List[Dict[str, Any]] = []
+    conn: sqlite3.Connection = None
     try:
         conn, cursor = _get_db_connection()
+        conditions: List[str] = []
+        params: List[Any] = []
+        if prefix:
+            # range condition so the name index is used
+            conditions.append("name >= ? AND name < ?")
+            params.extend([prefix, prefix + "\U0010ffff"])
+        if cursor_str:
+            value, last_id = _decode_cursor(cursor_str)
+            conditions.append(f"({sort}, id) {'>' if order == 'asc' else '<'} (?, ?)")
+            params.extend([value, last_id])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
         cursor.execute(
-            "SELECT id, name, status, embeddings_status, created_on, updated_on FROM agents"
+            f"""
+            SELECT id, name, status, embeddings_status, created_on, updated_on FROM agents
+            {where}
+            ORDER BY {sort} {order}, id {order}
+            LIMIT ?
+        """,
+            (*params, limit + 1),
         )
         rows: List[tuple] = cursor.fetchall()
         # Convert each row to an Agent object
-        for row in rows:
+        for row in rows[:limit]:
             agent = Agent(
                 id=row[0],
                 name=row[1],
@@ -118,7 +188,12 @@ def get_agents() -> List[Dict[str, Any]]:
             )
             # Append to list after converting it to dict
             agents.append(agent_to_dict(agent))
-        return agents
+
+        next_cursor: Optional[str] = None
+        if len(rows) > limit:
+            last = agents[-1]
+            next_cursor = _encode_cursor(last[sort], last["id"])
+        return agents, next_cursor
 
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -135,6 +210,7 @@ def save_agent(
     welcome_message: Optional[str] = None,
     suggested_prompts: Optional[str] = None,
     files: Optional[str] = None,
+    embeddings_status: str = "",
 ) -> Dict[str, Any]:
     """
     Insert a new agent into the 'agents' table.
@@ -167,11 +243,12 @@ def save_agent(
                 suggested_prompts,
                 files,
                 "",
-                "",
+                embeddings_status,
                 now,
                 now,
             ),
         )
+        conn.commit()
 
         # Retrieve the newly inserted agent data
         cursor.execute(
@@ -327,6 +404,8 @@ def update_agent_embeddings_status(
         conn.commit()
         return
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error updating agent: {str(e)}")
     finally:
@@ -335,6 +414,50 @@ def update_agent_embeddings_status(
 
 
 
+# Function to get the names of the agents with a given embeddings status
+def get_agent_names_by_embeddings_status(embeddings_status: str) -> List[str]:
+    conn: sqlite3.Connection = None
+    try:
+        conn, cursor = _get_db_connection()
+        cursor.execute(
+            "SELECT name FROM agents WHERE embeddings_status = ?", (embeddings_status,)
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    finally:
+        if conn:
+            conn.close()
+
+
+# Function to get the public view of an agent (what the chat page needs)
+def get_agent_public(name: str) -> Optional[Dict[str, Any]]:
+    conn: sqlite3.Connection = None
+    try:
+        conn, cursor = _get_db_connection()
+        cursor.execute(
+            "SELECT name, welcome_message, suggested_prompts FROM agents WHERE name = ?",
+            (name,),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return {
+            "name": row[0],
+            "welcome_message": row[1],
+            "suggested_prompts": row[2],
+        }
+
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    finally:
+        if conn:
+            conn.close()
+
+
 # Function to get an agent by name
 def get_agent(name: str) -> Agent:
     conn: sqlite3.Connection = None
@@ -396,6 +519,29 @@ def delete_agent(name: str) -> None:
 
         # Delete the agent record from the database
         cursor.execute("DELETE FROM agents WHERE name = ?", (name,))
+        cursor.execute("DELETE FROM embeddings_progress WHERE agent_name = ?", (name,))
+        conn.commit()
+
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    finally:
+        if conn:
+            conn.close()
+
+
+# Function to store the latest ingest progress reported for an agent
+def save_embeddings_progress(name: str, progress: Dict[str, Any]) -> None:
+    conn: sqlite3.Connection = None
+    try:
+        conn, cursor = _get_db_connection()
+        cursor.execute(
+            """
+            INSERT INTO embeddings_progress (agent_name, progress, updated_on) VALUES (?, ?, ?)
+            ON CONFLICT(agent_name) DO UPDATE SET progress = excluded.progress, updated_on = excluded.updated_on
+        """,
+            (name, json.dumps(progress), int(time.time())),
+        )
         conn.commit()
 
     except sqlite3.Error as e:
@@ -404,3 +550,22 @@ def delete_agent(name: str) -> None:
     finally:
         if conn:
             conn.close()
+
+
+# Function to get the latest ingest progress of an agent
+def get_embeddings_progress(name: str) -> Optional[Dict[str, Any]]:
+    conn: sqlite3.Connection = None
+    try:
+        conn, cursor = _get_db_connection()
+        cursor.execute(
+            "SELECT progress FROM embeddings_progress WHERE agent_name = ?", (name,)
+        )
+        row = cursor.fetchone()
+        return json.loads(row[0]) if row else None
+
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    finally:
+        if conn:
+            conn.close()
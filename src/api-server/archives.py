@@ -0,0 +1,138 @@
+"""
+archives.py
+
+Extraction of a zip or tar archive of documents into an agent's directory. The upload is spooled
+to a temporary file in chunks (zip archives need random access to their central directory) and
+each member is copied in chunks, so an archive is never held in memory. Members are extracted to
+a staging directory first and only moved into the agent's directory once the whole archive passed
+the guards: no path traversal, only regular files, no two members flattened to the same file name,
+and limits on the number of files and on the extracted size (counted while copying, not trusted
+from the archive headers).
+"""
+
+from fastapi import HTTPException
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+from typing import IO, Iterator, List, Tuple
+
+from config import settings
+
+# Size of the chunks read from the upload and from the archive members
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def _safe_file_name(member_name: str) -> str:
+    """
+    Flatten a member path into a file name of the agent's directory ("docs/api/intro.md" becomes
+    "docs_api_intro.md"). Returns "" for members to skip (directories, hidden or metadata files)
+    and raises for absolute paths and parent directory references.
+    """
+    path = member_name.replace("\\", "/")
+    if path.startswith("/") or (len(path) > 1 and path[1] == ":"):
+        raise HTTPException(status_code=400, detail=f"Absolute path in archive: {member_name}")
+    parts = [part for part in path.split("/") if part not in ("", ".")]
+    if ".." in parts:
+        raise HTTPException(status_code=400, detail=f"Path traversal in archive: {member_name}")
+    if not parts or any(part.startswith(".") or part == "__MACOSX" for part in parts):
+        return ""
+    return "_".join(parts)
+
+
+def _iter_members(archive_path: str) -> Iterator[Tuple[str, IO[bytes]]]:
+    """
+    Yield (name, readable stream) for the regular files of a zip or tar archive.
+    Links, devices and other special members are skipped.
+    """
+    if zipfile.is_zipfile(archive_path):
+        with zipfile.ZipFile(archive_path) as archive:
+            for info in archive.infolist():
+                # the upper bits of external_attr hold the unix mode, 0o120000 is a symlink
+                if info.is_dir() or (info.external_attr >> 16) & 0o170000 == 0o120000:
+                    continue
+                with archive.open(info) as stream:
+                    yield info.filename, stream
+        return
+
+    try:
+        archive = tarfile.open(archive_path, mode="r:*")
+    except tarfile.TarError:
+        raise HTTPException(status_code=400, detail="The upload is not a zip or tar archive")
+    with archive:
+        for info in archive:
+            if not info.isreg():
+                continue
+            stream = archive.extractfile(info)
+            if stream is not None:
+                with stream:
+                    yield info.name, stream
+
+
+def spool_upload_path() -> str:
+    """
+    Path of a new temporary file to spool an uploaded archive to.
+    """
+    os.makedirs(settings.agents_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=".upload-", suffix=".archive", dir=settings.agents_dir)
+    os.close(fd)
+    return path
+
+
+def extract_archive(agent_name: str, archive_path: str) -> List[str]:
+    """
+    Extract the documents of the archive into the agent's directory and return their file names.
+    Nothing is written to the agent's directory if any member fails a guard.
+    """
+    agent_dir = os.path.join(settings.agents_dir, agent_name)
+    os.makedirs(agent_dir, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix=f".{agent_name}-extract-", dir=settings.agents_dir)
+    try:
+        file_names: List[str] = []
+        extracted_bytes = 0
+        for member_name, stream in _iter_members(archive_path):
+            file_name = _safe_file_name(member_name)
+            if not file_name:
+                continue
+            if file_name in file_names:
+                # e.g. "a/b.txt" and "a_b.txt", or a path repeated in a tar: one would overwrite the other
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Several members of the archive are stored as {file_name}: {member_name}",
+                )
+            if len(file_names) >= settings.archive_max_files:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"The archive has more than {settings.archive_max_files} files",
+                )
+            with open(os.path.join(staging_dir, file_name), "wb") as f:
+                while True:
+                    chunk = stream.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    extracted_bytes += len(chunk)
+                    if extracted_bytes > settings.archive_max_extracted_bytes:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"The extracted archive exceeds {settings.archive_max_extracted_bytes} bytes",
+                        )
+                    f.write(chunk)
+            file_names.append(file_name)
+
+        if not file_names:
+            raise HTTPException(status_code=400, detail="The archive contains no files")
+
+        # every member passed the guards, move them into place
+        for file_name in file_names:
+            os.replace(os.path.join(staging_dir, file_name), os.path.join(agent_dir, file_name))
+        return file_names
+
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, RuntimeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid archive: {str(e)}")
+
+    except OSError as e:
+        raise HTTPException(status_code=500, detail=f"Error extracting archive: {str(e)}")
+
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
@@ -6,7 +6,7 @@ Configuration settings for the FastAPI application. This module retrieves enviro
 
 import os
 from decimal import Decimal, InvalidOperation
-from typing import List
+from typing import List, Tuple
 
 class Settings:
     """Configuration class for loading environment variables and setting static constants."""
@@ -33,14 +33,43 @@ class Settings:
         token_expiry_hours: int = self._get_env_int("TOKEN_EXPIRY_IN_HOURS", 24)
         self.access_token_expire_minutes: int = token_expiry_hours * 60  # Convert hours to minutes
 
+        # agents list
+        self.agents_page_max_limit = self._get_env_int("AGENTS_PAGE_MAX_LIMIT", 200) # maximum agents per page
+
+        # bulk upload of documents as a zip or tar archive
+        self.archive_max_bytes = self._get_env_int("ARCHIVE_MAX_BYTES", 512 * 1024 * 1024) # size of the uploaded archive
+        self.archive_max_extracted_bytes = self._get_env_int("ARCHIVE_MAX_EXTRACTED_BYTES", 2048 * 1024 * 1024) # total size once extracted
+        self.archive_max_files = self._get_env_int("ARCHIVE_MAX_FILES", 5000) # files in one archive
+
+        # caching of the public agent config used by the chat page
+        self.chat_config_max_age = self._get_env_int("CHAT_CONFIG_MAX_AGE", 60) # seconds browsers and proxies may reuse it
+        self.chat_config_stale_while_revalidate = self._get_env_int("CHAT_CONFIG_STALE_WHILE_REVALIDATE", 300)
+
         # embeddings-server info
         self.embeddings_server = os.getenv("EMBEDDINGS_SERVER", "embeddings-server")
         self.embeddings_server_port = self._get_env_int("EMBEDDINGS_SERVER_PORT", 8002) # port used by the embeddings-server
+        self.progress_poll_interval = self._get_env_int("EMBEDDINGS_PROGRESS_POLL_INTERVAL", 1) # seconds between progress stream checks
+        self.embeddings_trigger_attempts = self._get_env_int("EMBEDDINGS_TRIGGER_ATTEMPTS", 8) # attempts to queue an ingest job
 
         # llm-server info
         self.llm_server = os.getenv("LLM_SERVER", "llm-server")
         self.llm_server_port = self._get_env_int("LLM_SERVER_PORT", 8000) # port used by the llm-server
         self.llm_model_name = os.getenv("LLM_MODEL_NAME", "microsoft/Phi-3-mini-4k-instruct")
+        # llm-server replicas as comma-delimited host:port, defaults to LLM_SERVER:LLM_SERVER_PORT
+        self.llm_servers: List[Tuple[str, int]] = self._parse_upstreams(
+            os.getenv("LLM_SERVERS", ""), self.llm_server, self.llm_server_port
+        )
+        self.llm_health_path = os.getenv("LLM_HEALTH_PATH", "/health")
+        self.llm_health_interval = self._get_env_int("LLM_HEALTH_INTERVAL", 10) # seconds, 0 disables active checks
+        self.llm_failure_threshold = self._get_env_int("LLM_FAILURE_THRESHOLD", 3) # consecutive failures before ejection
+        self.llm_eject_cooldown = self._get_env_int("LLM_EJECT_COOLDOWN", 30) # seconds before an ejected upstream is retried, without health checks
+        self.llm_max_attempts = self._get_env_int("LLM_MAX_ATTEMPTS", 2) # upstreams tried when one is unreachable
+
+        # admission control in front of the llm-server (per worker)
+        self.llm_max_concurrent = self._get_env_int("LLM_MAX_CONCURRENT", 8) # requests sent to the llm-server at the same time
+        self.llm_max_queue = self._get_env_int("LLM_MAX_QUEUE", 16) # requests waiting for a slot, over this get 429
+        self.llm_max_queue_wait = self._get_env_int("LLM_MAX_QUEUE_WAIT", 30) # seconds in the queue before a 503
+        self.llm_retry_after = self._get_env_int("LLM_RETRY_AFTER", 5) # Retry-After seconds sent with 429/503
         
         # chat params
         self.chat_response_length_default = os.getenv("CHAT_RESPONSE_LENGTH_DEFAULT", "M")
@@ -53,6 +82,17 @@ class Settings:
         self.chat_frequency_penalty = self._get_env_decimal("CHAT_FREQUENCY_PENALTY", 0.0)  # Values from 0.0 to 2.0
         self.chat_presence_penalty = self._get_env_decimal("CHAT_PRESENCE_PENALTY", 0.0)
 
+        # server-side chat sessions
+        self.chat_session_ttl = self._get_env_int("CHAT_SESSION_TTL", 3600) # seconds of inactivity before a session expires
+        self.chat_session_max_bytes = self._get_env_int("CHAT_SESSION_MAX_BYTES", 16384) # turns kept per session, oldest dropped first
+        self.chat_max_sessions = self._get_env_int("CHAT_MAX_SESSIONS", 10000) # least recently used sessions evicted over this
+
+        # rolling summary of the older turns of a session (opt-in)
+        self.chat_summary_enabled = self._get_env_bool("CHAT_SUMMARY_ENABLED", False)
+        self.chat_summary_window = self._get_env_int("CHAT_SUMMARY_WINDOW", 6) # most recent turns always sent verbatim
+        self.chat_summary_min_turns = self._get_env_int("CHAT_SUMMARY_MIN_TURNS", 4) # older turns gathered before updating the summary
+        self.chat_summary_max_tokens = self._get_env_int("CHAT_SUMMARY_MAX_TOKENS", 256) # length of the summary
+
         # Allowed hosts handling
         allowed_hosts_str: str = os.getenv("ALLOWED_HOSTS", "")
         self.allowed_hosts: List[str] = self._parse_allowed_hosts(allowed_hosts_str)
@@ -63,6 +103,12 @@ class Settings:
             return int(os.getenv(key, default))
         except ValueError:
             return default
+    def _get_env_bool(self, key: str, default: bool) -> bool:
+        """Helper function to safely get a boolean environment variable."""
+        value = os.getenv(key)
+        if value is None:
+            return default
+        return value.strip().lower() in ("1", "true", "yes", "on")
     def _get_env_decimal(self, key: str, default: Decimal) -> Decimal:
         """Helper function to safely get a decimal environment variable."""
         try:
@@ -70,6 +116,20 @@ class Settings:
         except (ValueError, InvalidOperation):
             return default
 
+    def _parse_upstreams(self, upstreams_str: str, default_host: str, default_port: int) -> List[Tuple[str, int]]:
+        """Helper function to parse a comma-delimited list of host[:port] into (host, port) tuples."""
+        upstreams: List[Tuple[str, int]] = []
+        for item in upstreams_str.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            host, _, port = item.partition(":")
+            try:
+                upstreams.append((host, int(port) if port else default_port))
+            except ValueError:
+                upstreams.append((host, default_port))
+        return upstreams or [(default_host, default_port)]
+
     def _parse_allowed_hosts(self, hosts_str: str) -> List[str]:
         """Helper function to parse the ALLOWED_HOSTS environment variable into a list."""
         # Split the string by commas, strip spaces, and filter out empty strings
@@ -13,20 +13,31 @@ from fastapi import (
     UploadFile,
     Body,
     Form,
+    BackgroundTasks,
 )
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from typing import Dict, Any, Union, List, Optional
+from contextlib import asynccontextmanager
 from datetime import datetime
+import asyncio
+import hashlib
+import json
 import os
+import shutil
 from shutil import copyfile
 import requests
 import threading
+import time
+from urllib.parse import quote
 
 from config import settings
 from dependencies import verify_x_api_key, get_current_user
+from admission import llm_admission
+from upstreams import llm_upstreams
 from auth import (
     is_admin_password_set,
     set_admin_password,
@@ -41,11 +52,34 @@ from agent import (
     get_agent, 
     change_agent,
     delete_agent,
-    update_agent_embeddings_status
+    update_agent_embeddings_status,
+    get_agent_names_by_embeddings_status,
+    save_embeddings_progress,
+    get_embeddings_progress,
+    get_agent_public,
     )
+from archives import spool_upload_path, extract_archive
+from retrieval import merge_chunks, retrieval_stats
+from sessions import (
+    get_or_create_session,
+    get_session_turns,
+    append_session_turns,
+    get_session_summary,
+    save_session_summary,
+    delete_session,
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Actively check the health of the llm-server replicas
+    llm_upstreams.start_health_checks()
+    # Make sure the embeddings-server has a job for every agent still marked in progress
+    resume_pending_embeddings()
+    yield
+    llm_upstreams.stop_health_checks()
 
 # Create the app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # uncomment below in case CORS settings required for direct api-access during development 
 #origins = []
@@ -109,21 +143,85 @@ def delete_agent_files(agent_name: str) -> None:
         shutil.rmtree(agent_dir)
 
 # function to call the embeddings server in a separate thread
-def trigger_embeddings_generation(agent_name):
+def trigger_embeddings_generation(agent_name: str, resume: bool = False):
     def generate_embeddings_task():
-        try:
-            # Call the embeddings server to start generating embeddings
-            url = f"http://{settings.embeddings_server}:{settings.embeddings_server_port}/generate"
-            headers = {
-               "X-Requested-With": "XteNATqxnbBkPa6TCHcK0NTxOM1JVkQl"
-            }
-            requests.post(url, json={"agent_name": agent_name}, headers=headers)
-            # do not wait for response
-        except Exception as e:
-            print(f"Error during embeddings generation for agent {agent_name}: {str(e)}")
+        # Call the embeddings server to queue the ingest job, retrying while it is unreachable
+        url = f"http://{settings.embeddings_server}:{settings.embeddings_server_port}/generate"
+        headers = {
+           "X-Requested-With": "XteNATqxnbBkPa6TCHcK0NTxOM1JVkQl"
+        }
+        for attempt in range(settings.embeddings_trigger_attempts):
+            try:
+                response = requests.post(url, json={"agent_name": agent_name, "resume": resume}, headers=headers, timeout=30)
+                if response.status_code < 500:
+                    if response.status_code != 200:
+                        print(f"Embeddings generation rejected for agent {agent_name}: {response.status_code}")
+                    return
+            except requests.exceptions.RequestException as e:
+                print(f"Error during embeddings generation for agent {agent_name}: {str(e)}")
+            time.sleep(min(2 ** attempt, 60))
+        print(f"Giving up embeddings generation for agent {agent_name}, it will be retried on restart")
+
+    # Progress is reported by the embeddings-server once the job runs
+    if not resume:
+        save_embeddings_progress(agent_name, {"status": "queued"})
 
     # Run the task in a separate thread
-    threading.Thread(target=generate_embeddings_task).start()
+    threading.Thread(target=generate_embeddings_task, daemon=True).start()
+
+# function to delete the chunks of removed files without re-ingesting the agent's other files
+def delete_file_embeddings(agent_name: str, file_names: List[str]) -> bool:
+    """
+    Ask the embeddings-server to delete the chunks of each file. Returns False if any deletion
+    failed or was refused (409 when the agent's chunks were deduplicated across files, or when no
+    completed ingest of the agent is on record), in which case the caller falls back to a full
+    re-ingest.
+    """
+    headers = {settings.header_name: settings.header_key}
+    for file_name in file_names:
+        url = (
+            f"http://{settings.embeddings_server}:{settings.embeddings_server_port}"
+            f"/agents/{agent_name}/files/{quote(file_name, safe='')}/chunks"
+        )
+        try:
+            response = requests.delete(url, headers=headers, timeout=30)
+        except requests.exceptions.RequestException as e:
+            print(f"Error deleting the embeddings of {file_name} for agent {agent_name}: {str(e)}")
+            return False
+        if response.status_code != 200:
+            return False
+    return True
+
+# function to delete the collection of an agent on the embeddings-server
+def delete_agent_embeddings(agent_name: str) -> None:
+    url = f"http://{settings.embeddings_server}:{settings.embeddings_server_port}/agents/{quote(agent_name, safe='')}"
+    try:
+        response = requests.delete(url, headers={settings.header_name: settings.header_key}, timeout=30)
+        if response.status_code != 200:
+            print(f"Error deleting the embeddings of agent {agent_name}: {response.status_code}")
+    except requests.exceptions.RequestException as e:
+        print(f"Error deleting the embeddings of agent {agent_name}: {str(e)}")
+
+# function to re-queue the ingest of agents left in progress (e.g. after a restart of either server)
+def resume_pending_embeddings():
+    for agent_name in get_agent_names_by_embeddings_status("I"):
+        trigger_embeddings_generation(agent_name, resume=True)
+
+# Helper function to answer with an ETag, or 304 when the client already has this content
+def etag_response(request: Request, content: Dict[str, Any], cache_control: str, etag: Optional[str] = None) -> Response:
+    """
+    Build a JSON response with ETag and Cache-Control headers. The ETag defaults to a hash of the
+    content; a matching If-None-Match header gives an empty 304 response.
+    """
+    body = json.dumps(content, separators=(",", ":")).encode("utf-8")
+    if etag is None:
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if_none_match = request.headers.get("if-none-match", "")
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    if etag in candidates or "*" in candidates:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 # Helper function to compose the LLM request
 def compose_request(instruction, document_chunks, history, user_prompt):
@@ -183,26 +281,36 @@ def send_prompt_vllm(
     temperature: float = settings.chat_temperature, # controls the randomness or creativity of token selection by adjusting the overall probability distribution.
     top_p: float = settings.chat_top_p, # limits the range of tokens the model can choose from by cutting off low-probability tokens.
     frequency_penalty: float = settings.chat_frequency_penalty, # It reduces the likelihood of tokens (words or phrases) being repeated based on how frequently they have already appeared in the generated text. Range is -2 to 2.
-    presence_penalty: float = settings.chat_presence_penalty #  It reduces the likelihood of tokens (words or phrases) being repeated based on whether they have appeared at all in the generated text so far, without considering their frequency. This encourages the model to introduce new topics or words into the conversation. Range is -2 to 2
+    presence_penalty: float = settings.chat_presence_penalty, #  It reduces the likelihood of tokens (words or phrases) being repeated based on whether they have appeared at all in the generated text so far, without considering their frequency. This encourages the model to introduce new topics or words into the conversation. Range is -2 to 2
+    max_tokens: Optional[int] = None # overrides the length derived from response_length
     ):
     try:
-        max_tokens = get_max_tokens_by_length(response_length)
-
-        # Call the vLLM API using requests
-        url = f"http://{settings.llm-server}:{settings.llm_server_port}/v1/chat/completions"
-        response = requests.post(url,
-            json={
-               "model": settings.llm_model_name,
-                "messages": messages,
-                "temperature": temperature,
-                "max_tokens": max_tokens,
-                "top_p": top_p,
-                "frequency_penalty": frequency_penalty,
-                "presence_penalty": presence_penalty
-            },
-            timeout=600
-        )
-        response.raise_for_status()
+        max_tokens = max_tokens or get_max_tokens_by_length(response_length)
+
+        payload = {
+            "model": settings.llm_model_name,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "top_p": top_p,
+            "frequency_penalty": frequency_penalty,
+            "presence_penalty": presence_penalty
+        }
+
+        # Call the vLLM API using requests (waits for a slot, or fails fast when overloaded)
+        with llm_admission.slot():
+            # route to the least loaded healthy replica, trying another one if it is unreachable
+            attempted = []
+            while True:
+                try:
+                    with llm_upstreams.route(exclude=attempted) as upstream:
+                        attempted.append(upstream)
+                        response = requests.post(f"{upstream.base_url}/v1/chat/completions", json=payload, timeout=600)
+                        response.raise_for_status()
+                    break
+                except requests.exceptions.ConnectionError:
+                    if len(attempted) >= min(settings.llm_max_attempts, len(llm_upstreams.upstreams)):
+                        raise
         response_data = response.json()
         choices = response_data['choices']
         choice = choices[0]
@@ -217,6 +325,58 @@ def send_prompt_vllm(
         raise Exception(f"Error connecting to vLLM server: {str(e)}")
 
 
+# Helper functions for the chat sessions
+def get_session_history(session_id: str) -> List[Dict[str, str]]:
+    """
+    History of a session for compose_request: the running summary (if any) followed by the
+    turns it does not cover yet.
+    """
+    summary, last_turn_id = get_session_summary(session_id)
+    history = [{"system": f"Summary of the earlier conversation:\n{summary}"}] if summary else []
+    history += [
+        {turn["role"]: turn["content"]}
+        for turn in get_session_turns(session_id) if turn["id"] > last_turn_id
+    ]
+    return history
+
+
+def summarize_session(session_id: str) -> None:
+    """
+    Fold the turns older than the summary window into the running summary of the session.
+    Runs after the reply is sent; only the turns not yet covered are sent to the LLM, together
+    with the previous summary, and nothing is done until enough of them have accumulated.
+    """
+    try:
+        summary, last_turn_id = get_session_summary(session_id)
+        turns = [turn for turn in get_session_turns(session_id) if turn["id"] > last_turn_id]
+        older = turns[:-settings.chat_summary_window] if settings.chat_summary_window > 0 else turns
+        # never leave a reply in the window without its question
+        while older and older[-1]["role"] == "user":
+            older.pop()
+        if len(older) < settings.chat_summary_min_turns:
+            return
+
+        transcript = "\n".join(f"{turn['role'].capitalize()}: {turn['content']}" for turn in older)
+        messages = [
+            {
+                "role": "system",
+                "content": "You maintain a running summary of a conversation between a user and an assistant. "
+                "Update the summary with the new turns, keeping the facts, names, decisions and open "
+                "questions needed to continue the conversation. Reply with the updated summary only.",
+            },
+            {
+                "role": "user",
+                "content": f"Current summary:\n{summary or '(empty)'}\n\nNew turns:\n{transcript}",
+            },
+        ]
+        llm_response = send_prompt_vllm(
+            messages=messages, temperature=0.2, max_tokens=settings.chat_summary_max_tokens
+        )
+        save_session_summary(session_id, llm_response["content"].strip(), older[-1]["id"])
+    except Exception as e:
+        # the raw turns stay in the history, the next turn retries
+        print(f"Failed to summarize chat session: {str(e)}")
+
 
 # --------- API Routes ---------
 
@@ -342,9 +502,17 @@ def route_logout(response: Response):
 
 
 @app.get("/api/agents")
-def route_agents(request: Request):
+def route_agents(
+    request: Request,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    sort: str = "name",
+    order: str = "asc",
+    prefix: Optional[str] = None,
+):
     """
-    Route to fetch all agents.
+    Route to fetch a page of agents, sorted and optionally filtered by name prefix.
+    Pass the returned next_cursor to fetch the following page. Supports If-None-Match.
     """
     try:
         verify_x_api_key(request.headers)
@@ -354,10 +522,11 @@ def route_agents(request: Request):
         payload = verify_jwt_token(access_token)
         if payload["sub"] != "admin":
             raise HTTPException(status_code=403, detail="Access denied")
-        # Get list of agents from the database
-        agents: List[Dict[str, any]] = get_agents()
-        # Convert the Agent objects 
-        return {"list": agents}
+        # Get a page of agents from the database
+        limit = max(1, min(limit, settings.agents_page_max_limit))
+        agents, next_cursor = get_agents(limit, cursor, sort, order.lower(), prefix)
+        # Unchanged pages are answered with 304
+        return etag_response(request, {"list": agents, "next_cursor": next_cursor}, "private, no-cache")
 
     except Exception as e:
         raise HTTPException(
@@ -447,8 +616,17 @@ def route_update_agent(
             new_files,
             deleted_files,
         )
+        deleted_files_list = [file.strip() for file in deleted_files.split(",") if file.strip()]
         # check if files have been added or deleted
-        if new_files or deleted_files != "":
+        if (
+            not new_files
+            and deleted_files_list
+            and get_agent(agent_name)["embeddings_status"] != "I"
+            and delete_file_embeddings(agent_name, deleted_files_list)
+        ):
+            # only deletions: the chunks of the other files are kept as they are
+            embeddings_status = None
+        elif new_files or deleted_files_list:
             # call the embeddings-server
             trigger_embeddings_generation(agent_name)
             # set embeddings_status
@@ -471,6 +649,119 @@ def route_update_agent(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/api/agents/{agent_name}/chunking")
+def route_get_agent_chunking(agent_name: str, request: Request):
+    """
+    Route to fetch the chunking settings of an agent and the limits of the embedding model
+    """
+    try:
+        verify_x_api_key(request.headers)
+        url = f"http://{settings.embeddings_server}:{settings.embeddings_server_port}/agents/{agent_name}/chunking"
+        response = requests.get(url, headers={settings.header_name: settings.header_key}, timeout=30)
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.json().get("detail"))
+        return response.json()
+    except Exception as e:
+        raise HTTPException(
+            status_code=getattr(e, "status_code", 400),
+            detail=getattr(e, "detail", str(e)),
+        )
+
+
+@app.put("/api/agents/{agent_name}/chunking")
+def route_update_agent_chunking(agent_name: str, request: Request, body: dict = Body(...)):
+    """
+    Route to change the chunking settings of an agent (chunk_size, chunk_overlap, strategy).
+    The embeddings-server validates them against the embedding model, then the files are re-ingested.
+    """
+    try:
+        verify_x_api_key(request.headers)
+        agent = get_agent(agent_name)
+        url = f"http://{settings.embeddings_server}:{settings.embeddings_server_port}/agents/{agent_name}/chunking"
+        response = requests.put(url, json=body, headers={settings.header_name: settings.header_key}, timeout=30)
+        if response.status_code != 200:
+            raise HTTPException(status_code=response.status_code, detail=response.json().get("detail"))
+
+        if agent["files"]:
+            trigger_embeddings_generation(agent_name)
+            agent = change_agent(
+                name=agent_name,
+                instructions=None,
+                welcome_message=None,
+                suggested_prompts=None,
+                files=None,
+                embeddings_status="I",
+            )
+        return {**response.json(), "agent": agent}
+    except Exception as e:
+        raise HTTPException(
+            status_code=getattr(e, "status_code", 400),
+            detail=getattr(e, "detail", str(e)),
+        )
+
+
+@app.post("/api/agents/{agent_name}/archive")
+async def route_upload_agent_archive(agent_name: str, request: Request):
+    """
+    Route to add the documents of a zip or tar archive, sent as the raw request body, to an agent
+    and index them with a single ingest job.
+    """
+    archive_path: Optional[str] = None
+    try:
+        verify_x_api_key(request.headers)
+
+        access_token = request.cookies.get("access_token")
+        if not access_token:
+            raise HTTPException(status_code=403, detail="Access denied")
+
+        payload = verify_jwt_token(access_token)
+        if payload["sub"] != "admin":
+            raise HTTPException(status_code=403, detail="Access denied")
+
+        # the agent must exist (this also keeps the name from pointing outside the agents directory)
+        await run_in_threadpool(get_agent, agent_name)
+
+        content_length = request.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > settings.archive_max_bytes:
+            raise HTTPException(status_code=413, detail=f"The archive exceeds {settings.archive_max_bytes} bytes")
+
+        # spool the body to disk chunk by chunk, checking the size as it arrives
+        archive_path = spool_upload_path()
+        received = 0
+        with open(archive_path, "wb") as f:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > settings.archive_max_bytes:
+                    raise HTTPException(status_code=413, detail=f"The archive exceeds {settings.archive_max_bytes} bytes")
+                await run_in_threadpool(f.write, chunk)
+
+        extracted_files = await run_in_threadpool(extract_archive, agent_name, archive_path)
+
+        # one ingest job for the whole archive (the disk and network calls run off the event loop)
+        await run_in_threadpool(trigger_embeddings_generation, agent_name)
+        files = await run_in_threadpool(process_uploaded_files, agent_name)
+        agent = await run_in_threadpool(
+            change_agent,
+            name=agent_name,
+            instructions=None,
+            welcome_message=None,
+            suggested_prompts=None,
+            files=files,
+            embeddings_status="I",
+        )
+        return {"agent": agent, "extracted_files": extracted_files}
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=getattr(e, "status_code", 400),
+            detail=getattr(e, "detail", str(e)),
+        )
+
+    finally:
+        if archive_path and os.path.exists(archive_path):
+            await run_in_threadpool(os.remove, archive_path)
+
+
 @app.get("/api/agents/{agent_name}")
 def route_get_agent(agent_name: str, request: Request):
     try:
@@ -522,8 +813,11 @@ def route_delete_agent(
         # Delete the agent's files (helper function)
         delete_agent_files(agent_name=agent_name)
 
+        # Drop the agent's embeddings so queries for it fail fast
+        delete_agent_embeddings(agent_name)
+
         # Call the agent deletion function from agent.py
-        delete_agent(agent_name=agent_name)
+        delete_agent(name=agent_name)
 
         return Response(content=f"Agent '{agent_name}' deleted successfully.", status_code=200)
     
@@ -537,15 +831,20 @@ def route_delete_agent(
 
 
 @app.post("/api/agents/{agent_name}/update-embeddings-status")
-def route_update_embeddings_status(agent_name: str, request: Request):
+def route_update_embeddings_status(agent_name: str, request: Request, body: Optional[dict] = Body(None)):
     try:
         # Validate the API key in the request header
         verify_x_api_key(headers=request.headers)
         # check if route param is blank
         if not agent_name:
             raise HTTPException(status_code=400, detail="Agent name missing")
-        # call update in agent
-        update_agent_embeddings_status(agent_name, "")
+        # call update in agent ("F" when the ingest job failed)
+        job_status = (body or {}).get("status", "done")
+        update_agent_embeddings_status(agent_name, "F" if job_status == "failed" else "")
+        # final status for the progress stream
+        progress = get_embeddings_progress(agent_name) or {}
+        progress.update({"job_id": (body or {}).get("job_id"), "status": job_status, "eta_seconds": 0})
+        save_embeddings_progress(agent_name, progress)
         return {"message": "Embeddings status updated successfully"}
     except Exception as e:
         # Extract status code and details from the exception
@@ -555,17 +854,112 @@ def route_update_embeddings_status(agent_name: str, request: Request):
         # Raise the HTTPException with the appropriate error message
         raise HTTPException(status_code=status_code, detail=detail)
 
+@app.post("/api/agents/{agent_name}/embeddings-progress")
+def route_save_embeddings_progress(agent_name: str, request: Request, body: dict = Body(...)):
+    """
+    Route used by the embeddings-server to report the progress of an ingest job.
+    """
+    try:
+        verify_x_api_key(headers=request.headers)
+        save_embeddings_progress(agent_name, body)
+        return {"message": "Embeddings progress saved"}
+    except Exception as e:
+        raise HTTPException(
+            status_code=getattr(e, "status_code", 400),
+            detail=getattr(e, "detail", str(e)),
+        )
+
+
+@app.get("/api/agents/{agent_name}/embeddings-progress")
+def route_get_embeddings_progress(agent_name: str, request: Request):
+    """
+    Route to fetch the latest ingest progress of an agent.
+    """
+    try:
+        verify_x_api_key(request.headers)
+        access_token = request.cookies.get("access_token")
+        if not access_token:
+            raise HTTPException(status_code=403, detail="Access denied")
+        payload = verify_jwt_token(access_token)
+        if payload["sub"] != "admin":
+            raise HTTPException(status_code=403, detail="Access denied")
+        return {"progress": get_embeddings_progress(agent_name)}
+    except Exception as e:
+        raise HTTPException(
+            status_code=getattr(e, "status_code", 400),
+            detail=getattr(e, "detail", str(e)),
+        )
+
+
+@app.get("/api/agents/{agent_name}/embeddings-progress/stream")
+async def route_stream_embeddings_progress(agent_name: str, request: Request, key: Optional[str] = None):
+    """
+    Route to push the ingest progress of an agent to the admin UI as server-sent events.
+    EventSource cannot send custom headers, so the X-Requested-With value may be passed as ?key=.
+    """
+    try:
+        if request.headers.get(settings.header_name) is None and key is not None:
+            verify_x_api_key({settings.header_name: key})
+        else:
+            verify_x_api_key(request.headers)
+        access_token = request.cookies.get("access_token")
+        if not access_token:
+            raise HTTPException(status_code=403, detail="Access denied")
+        payload = verify_jwt_token(access_token)
+        if payload["sub"] != "admin":
+            raise HTTPException(status_code=403, detail="Access denied")
+    except Exception as e:
+        raise HTTPException(
+            status_code=getattr(e, "status_code", 400),
+            detail=getattr(e, "detail", str(e)),
+        )
+
+    async def event_stream():
+        # progress is stored in the database so any worker can stream it
+        last_sent = None
+        last_write = time.monotonic()
+        while not await request.is_disconnected():
+            progress = await run_in_threadpool(get_embeddings_progress, agent_name)
+            if progress is not None and progress != last_sent:
+                last_sent = progress
+                last_write = time.monotonic()
+                yield f"data: {json.dumps(progress)}\n\n"
+                if progress.get("status") in ("done", "failed", "superseded"):
+                    break
+            elif time.monotonic() - last_write >= 15:
+                # comment line to keep the connection open through proxies
+                last_write = time.monotonic()
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(settings.progress_poll_interval)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/api/chat/{agent_name}")
-def route_get_agent(agent_name: str, request: Request):
+def route_get_chat_agent(agent_name: str, request: Request):
+    """
+    Route to fetch the public view of an agent for the chat page. The response is cacheable:
+    its ETag is a hash of the returned fields so unchanged agents are answered with 304.
+    """
     try:
         verify_x_api_key(request.headers)
 
         if not agent_name:
             raise HTTPException(status_code=400, detail="Agent name cannot be blank")
 
-        # get agent details
-        agent: Dict[str, any] = get_agent(agent_name)
-        return {"agent": agent}
+        # get the public agent details only
+        agent: Optional[Dict[str, Any]] = get_agent_public(agent_name)
+        if agent is None:
+            raise HTTPException(status_code=404, detail=f"Agent with name '{agent_name}' not found")
+        return etag_response(
+            request,
+            {"agent": agent},
+            f"public, max-age={settings.chat_config_max_age}, stale-while-revalidate={settings.chat_config_stale_while_revalidate}",
+        )
 
     except Exception as e:
         raise HTTPException(
@@ -574,7 +968,7 @@ def route_get_agent(agent_name: str, request: Request):
         )
 
 @app.post("/api/chat/{agent_name}")
-def route_post_chat(agent_name: str, request: Request, body: dict = Body(...)):
+def route_post_chat(agent_name: str, request: Request, background_tasks: BackgroundTasks, body: dict = Body(...)):
     """
     Route to post chat message 
     """
@@ -587,31 +981,97 @@ def route_post_chat(agent_name: str, request: Request, body: dict = Body(...)):
          # get input details
         agent: Dict[str, any] = get_agent(agent_name)
         input: str = body.get("input", "")
-        messages: Dict[str, Any] = body.get("messages")
         response_length = body.get("response_length", settings.chat_response_length_default)
 
+        # the history is kept server-side, a new session is started if the given one expired
+        session_id = get_or_create_session(agent_name, body.get("session_id"))
+        history = get_session_history(session_id)
+
          # Call the embeddings server to query for document chunks
         url = f"http://{settings.embeddings_server}:{settings.embeddings_server_port}/query"
         headers = {
                "X-Requested-With": "XteNATqxnbBkPa6TCHcK0NTxOM1JVkQl"
         }
 
-        # get the response
-        response = requests.post(url, json={"agent_name": agent_name, "prompt": input}, headers=headers)
-        response_json = response.json()
+        # get the response, optionally retrieving from some of the agent's files only
+        query = {"agent_name": agent_name, "prompt": input}
+        if body.get("files"):
+            query["files"] = body["files"]
+        response = requests.post(url, json=query, headers=headers)
+        if response.status_code == 404:
+            # the agent has no embeddings (no files yet): answer without document chunks
+            response_json = {"results": [], "citations": []}
+        else:
+            response_json = response.json()
 
-        # pick the chunks
+        # pick the chunks and their sources
         document_chunks = response_json['results']
-        # create document array
-        document_text_array = [chunk.replace('\n', ' ') for sublist in document_chunks for chunk in sublist]
+        citations = [citation for sublist in response_json.get('citations', []) for citation in sublist]
+        # the relevance cutoff may leave from zero to top_k chunks
+        retrieval_stats.record(
+            sum(len(sublist) for sublist in document_chunks),
+            response_json.get('dropped', 0),
+            response_json.get('dropped_tokens', 0),
+        )
+        # create document array, stitching the chunks that overlap or follow each other into passages
+        document_text_array = [
+            chunk.replace('\n', ' ')
+            for chunk in merge_chunks([chunk for sublist in document_chunks for chunk in sublist], citations)
+        ]
         # compose request
-        messages = compose_request(agent['instructions'], document_text_array, messages, input)
+        messages = compose_request(agent['instructions'], document_text_array, history, input)
         # sent request to llm-server
         llm_response = send_prompt_vllm(messages=messages, response_length=response_length)
+        # keep the turn for the next messages of the session
+        append_session_turns(session_id, [("user", input), ("assistant", llm_response["content"])])
+        if settings.chat_summary_enabled:
+            background_tasks.add_task(summarize_session, session_id)
         # send the saved data back as response
-        return {"content": llm_response["content"], "role": llm_response["role"]}
+        return {
+            "content": llm_response["content"],
+            "role": llm_response["role"],
+            "session_id": session_id,
+            "citations": citations,
+        }
     except Exception as e:
         print(e)
+        raise HTTPException(
+            status_code=getattr(e, "status_code", 400),
+            detail=getattr(e, "detail", str(e)),
+            headers=getattr(e, "headers", None),
+        )
+
+
+@app.delete("/api/chat/{agent_name}/sessions/{session_id}")
+def route_delete_chat_session(agent_name: str, session_id: str, request: Request):
+    """
+    Route to end a chat session and discard its history
+    """
+    try:
+        verify_x_api_key(request.headers)
+        if not delete_session(agent_name, session_id):
+            raise HTTPException(status_code=404, detail=f"Session not found for agent '{agent_name}'")
+        return {"message": "Session deleted"}
+    except Exception as e:
+        raise HTTPException(
+            status_code=getattr(e, "status_code", 400),
+            detail=getattr(e, "detail", str(e)),
+        )
+
+
+@app.get("/api/metrics")
+def route_metrics(request: Request):
+    """
+    Route to fetch the admission control, llm-server routing and retrieval metrics of this worker.
+    """
+    try:
+        verify_x_api_key(request.headers)
+        return {
+            "llm_admission": llm_admission.metrics(),
+            "llm_upstreams": llm_upstreams.metrics(),
+            "retrieval": retrieval_stats.metrics(),
+        }
+    except Exception as e:
         raise HTTPException(
             status_code=getattr(e, "status_code", 400),
             detail=getattr(e, "detail", str(e)),
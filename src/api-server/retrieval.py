@@ -0,0 +1,101 @@
+"""
+retrieval.py
+
+Handling of the document chunks retrieved by the embeddings-server for a chat message.
+The embeddings-server drops the chunks past the relevance cutoff, so a message gets between
+zero and top_k chunks; the statistics kept here show what the cutoff saves in LLM prompt tokens.
+
+Consecutive chunks of a document overlap by construction. When several are retrieved, they are
+stitched into one passage with the overlap removed, using the character offsets the
+embeddings-server returns with each chunk, instead of pasting the shared text twice.
+
+Note: the statistics are per uvicorn worker (API_NO_WORKERS).
+"""
+
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def merge_chunks(chunks: List[str], citations: List[Optional[Dict[str, Any]]]) -> List[str]:
+    """
+    Merge the retrieved chunks that overlap or follow each other in the same document into single
+    passages. A passage takes the rank of its best ranked chunk. Chunks without offsets are kept
+    as they are.
+    """
+    # chunks with known offsets, grouped per document: (start, end, position in the file, rank)
+    groups: Dict[Tuple[str, int], List[Tuple[int, int, int, int]]] = {}
+    for rank, citation in enumerate(citations[:len(chunks)]):
+        citation = citation or {}
+        start, end = citation.get("start_char"), citation.get("end_char")
+        if citation.get("file_name") is None or start is None or end is None or start < 0 or end < start:
+            continue
+        key = (citation["file_name"], citation.get("document_index") or 0)
+        chunk_index = citation.get("chunk_index")
+        groups.setdefault(key, []).append((start, end, -1 if chunk_index is None else chunk_index, rank))
+
+    passages: Dict[int, str] = {}  # rank of the passage -> text
+    merged_ranks = set()
+    for spans in groups.values():
+        spans.sort()
+        runs: List[Tuple[str, int, int, List[int]]] = []  # (text, end, last position, ranks)
+        for start, end, chunk_index, rank in spans:
+            chunk = chunks[rank]
+            if runs:
+                text, text_end, last_index, ranks = runs[-1]
+                overlaps = start < text_end
+                # consecutive chunks are only separated by the whitespace the splitter stripped
+                follows = start >= text_end and chunk_index >= 0 and chunk_index == last_index + 1
+                if overlaps or follows:
+                    if end > text_end:
+                        text = text + chunk[text_end - start:] if overlaps else f"{text} {chunk}"
+                    runs[-1] = (text, max(end, text_end), chunk_index, ranks + [rank])
+                    continue
+            runs.append((chunk, end, chunk_index, [rank]))
+        for text, _, _, ranks in runs:
+            if len(ranks) > 1:
+                passages[min(ranks)] = text
+                merged_ranks.update(ranks)
+
+    merged: List[str] = []
+    for rank, chunk in enumerate(chunks):
+        if rank in passages:
+            merged.append(passages[rank])
+        elif rank not in merged_ranks:
+            merged.append(chunk)
+    return merged
+
+
+class RetrievalStats:
+    """Counters of the chunks sent to the LLM and of the chunks dropped by the relevance cutoff."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.requests: int = 0
+        self.empty_requests: int = 0  # messages sent without any chunk
+        self.chunks_sent: int = 0
+        self.chunks_dropped: int = 0
+        self.tokens_saved: int = 0  # counted with the embedding model's tokenizer
+
+    def record(self, chunks_sent: int, chunks_dropped: int, tokens_saved: int) -> None:
+        with self._lock:
+            self.requests += 1
+            self.empty_requests += chunks_sent == 0
+            self.chunks_sent += chunks_sent
+            self.chunks_dropped += chunks_dropped
+            self.tokens_saved += tokens_saved
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "empty_requests": self.empty_requests,
+                "chunks_sent": self.chunks_sent,
+                "chunks_dropped": self.chunks_dropped,
+                "tokens_saved": self.tokens_saved,
+                "avg_chunks_per_request": round(self.chunks_sent / self.requests, 2) if self.requests else 0.0,
+                "avg_tokens_saved_per_request": round(self.tokens_saved / self.requests, 1) if self.requests else 0.0,
+            }
+
+
+# Instantiate the statistics of the chat retrievals
+retrieval_stats = RetrievalStats()
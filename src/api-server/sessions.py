@@ -0,0 +1,296 @@
+"""
+sessions.py
+
+Server-side chat sessions stored in the SQLite database, so the chat page only sends the new user
+message on each turn. Sessions expire after a TTL of inactivity, each session keeps at most a
+configured number of bytes of turns (oldest turns are dropped first) and the total number of
+sessions is bounded (least recently used sessions are evicted first).
+
+Optionally the older turns are condensed into a running summary; the summary records the last turn
+it covers, and the turns it covers are deleted once it is saved.
+"""
+
+from fastapi import HTTPException
+import secrets
+import sqlite3
+import time
+from sqlite3 import Connection, Cursor
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+
+
+# ---------- Internal Methods
+
+
+def _get_db_connection() -> Tuple[Connection, Cursor]:
+    """
+    Get a database connection and cursor.
+    Ensures the chat sessions tables are created if they do not exist.
+    """
+    conn: Connection = sqlite3.connect(settings.database_url)
+    cursor: Cursor = conn.cursor()
+    _create_tables(cursor)
+    return conn, cursor
+
+
+def _create_tables(cursor: Cursor) -> None:
+    """
+    Create the chat_sessions, chat_turns and chat_summaries tables if they do not exist.
+    """
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chat_sessions (
+            id TEXT PRIMARY KEY,
+            agent_name TEXT,
+            size_bytes INTEGER DEFAULT 0,
+            created_on INTEGER,
+            updated_on INTEGER
+        )
+    """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated_on ON chat_sessions (updated_on)"
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chat_turns (
+            id INTEGER PRIMARY KEY,
+            session_id TEXT,
+            role TEXT,
+            content TEXT,
+            size_bytes INTEGER
+        )
+    """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_chat_turns_session ON chat_turns (session_id, id)"
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chat_summaries (
+            session_id TEXT PRIMARY KEY,
+            summary TEXT,
+            last_turn_id INTEGER,
+            updated_on INTEGER
+        )
+    """
+    )
+
+
+def _delete_sessions(cursor: Cursor, session_ids: List[str]) -> None:
+    for session_id in session_ids:
+        cursor.execute("DELETE FROM chat_turns WHERE session_id = ?", (session_id,))
+        cursor.execute("DELETE FROM chat_summaries WHERE session_id = ?", (session_id,))
+        cursor.execute("DELETE FROM chat_sessions WHERE id = ?", (session_id,))
+
+
+def _evict(cursor: Cursor, now: int) -> None:
+    """
+    Remove the expired sessions and, to make room for a new session within the maximum number of
+    sessions, the least recently used ones.
+    """
+    cursor.execute(
+        "SELECT id FROM chat_sessions WHERE updated_on < ?", (now - settings.chat_session_ttl,)
+    )
+    _delete_sessions(cursor, [row[0] for row in cursor.fetchall()])
+
+    cursor.execute("SELECT COUNT(1) FROM chat_sessions")
+    excess = cursor.fetchone()[0] + 1 - settings.chat_max_sessions
+    if excess > 0:
+        cursor.execute(
+            "SELECT id FROM chat_sessions ORDER BY updated_on LIMIT ?", (excess,)
+        )
+        _delete_sessions(cursor, [row[0] for row in cursor.fetchall()])
+
+
+def _trim(cursor: Cursor, session_id: str) -> int:
+    """
+    Drop the oldest turns of a session until it fits the per-session maximum size.
+    A reply is never kept without the user message before it. Returns the new size.
+    """
+    cursor.execute(
+        "SELECT id, role, size_bytes FROM chat_turns WHERE session_id = ? ORDER BY id DESC",
+        (session_id,),
+    )
+    rows = cursor.fetchall()
+    kept = 0
+    cutoff: Optional[int] = None
+    for i, (turn_id, role, size_bytes) in enumerate(rows):
+        if kept + size_bytes > settings.chat_session_max_bytes:
+            # keep from the next user turn onwards
+            newer = rows[:i]
+            while newer and newer[-1][1] != "user":
+                kept -= newer[-1][2]
+                newer = newer[:-1]
+            cutoff = newer[-1][0] if newer else rows[0][0] + 1
+            break
+        kept += size_bytes
+    if cutoff is not None:
+        cursor.execute(
+            "DELETE FROM chat_turns WHERE session_id = ? AND id < ?", (session_id, cutoff)
+        )
+    return kept
+
+
+# ---------- Methods for Session Operations
+
+
+def get_or_create_session(agent_name: str, session_id: Optional[str] = None) -> str:
+    """
+    Return the given session id if it is still active for this agent, otherwise start a new session.
+    """
+    conn: sqlite3.Connection = None
+    try:
+        conn, cursor = _get_db_connection()
+        now = int(time.time())
+        if session_id:
+            cursor.execute(
+                "SELECT agent_name, updated_on FROM chat_sessions WHERE id = ?", (session_id,)
+            )
+            row = cursor.fetchone()
+            if row and row[0] == agent_name and row[1] >= now - settings.chat_session_ttl:
+                return session_id
+
+        _evict(cursor, now)
+        session_id = secrets.token_urlsafe(16)
+        cursor.execute(
+            "INSERT INTO chat_sessions (id, agent_name, size_bytes, created_on, updated_on) VALUES (?, ?, 0, ?, ?)",
+            (session_id, agent_name, now, now),
+        )
+        conn.commit()
+        return session_id
+
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    finally:
+        if conn:
+            conn.close()
+
+
+def get_session_turns(session_id: str) -> List[Dict[str, Any]]:
+    """
+    Get the turns of a session, oldest first, as {"id", "role", "content"} dictionaries.
+    """
+    conn: sqlite3.Connection = None
+    try:
+        conn, cursor = _get_db_connection()
+        cursor.execute(
+            "SELECT id, role, content FROM chat_turns WHERE session_id = ? ORDER BY id",
+            (session_id,),
+        )
+        return [{"id": row[0], "role": row[1], "content": row[2]} for row in cursor.fetchall()]
+
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    finally:
+        if conn:
+            conn.close()
+
+
+def append_session_turns(session_id: str, turns: List[Tuple[str, str]]) -> None:
+    """
+    Append (role, content) turns to a session and trim it to the maximum session size.
+    """
+    conn: sqlite3.Connection = None
+    try:
+        conn, cursor = _get_db_connection()
+        cursor.executemany(
+            "INSERT INTO chat_turns (session_id, role, content, size_bytes) VALUES (?, ?, ?, ?)",
+            [(session_id, role, content, len(content.encode("utf-8"))) for role, content in turns],
+        )
+        size_bytes = _trim(cursor, session_id)
+        cursor.execute(
+            "UPDATE chat_sessions SET size_bytes = ?, updated_on = ? WHERE id = ?",
+            (size_bytes, int(time.time()), session_id),
+        )
+        conn.commit()
+
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    finally:
+        if conn:
+            conn.close()
+
+
+def get_session_summary(session_id: str) -> Tuple[str, int]:
+    """
+    Get the running summary of a session and the id of the last turn it covers ("" and 0 if none).
+    """
+    conn: sqlite3.Connection = None
+    try:
+        conn, cursor = _get_db_connection()
+        cursor.execute(
+            "SELECT summary, last_turn_id FROM chat_summaries WHERE session_id = ?", (session_id,)
+        )
+        row = cursor.fetchone()
+        return (row[0], row[1]) if row else ("", 0)
+
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    finally:
+        if conn:
+            conn.close()
+
+
+def save_session_summary(session_id: str, summary: str, last_turn_id: int) -> None:
+    """
+    Save the running summary of a session and delete the turns it now covers.
+    A summary covering fewer turns than the saved one (a concurrent update) is ignored.
+    """
+    conn: sqlite3.Connection = None
+    try:
+        conn, cursor = _get_db_connection()
+        cursor.execute(
+            """
+            INSERT INTO chat_summaries (session_id, summary, last_turn_id, updated_on) VALUES (?, ?, ?, ?)
+            ON CONFLICT(session_id) DO UPDATE SET
+                summary = excluded.summary, last_turn_id = excluded.last_turn_id, updated_on = excluded.updated_on
+            WHERE excluded.last_turn_id > chat_summaries.last_turn_id
+        """,
+            (session_id, summary, last_turn_id, int(time.time())),
+        )
+        cursor.execute(
+            "DELETE FROM chat_turns WHERE session_id = ? AND id <= ?", (session_id, last_turn_id)
+        )
+        cursor.execute(
+            "UPDATE chat_sessions SET size_bytes = (SELECT COALESCE(SUM(size_bytes), 0) FROM chat_turns WHERE session_id = ?) WHERE id = ?",
+            (session_id, session_id),
+        )
+        conn.commit()
+
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    finally:
+        if conn:
+            conn.close()
+
+
+def delete_session(agent_name: str, session_id: str) -> bool:
+    """
+    Delete a session of the agent with its turns and summary. Returns False if the agent has no
+    such session (sessions of other agents are left alone).
+    """
+    conn: sqlite3.Connection = None
+    try:
+        conn, cursor = _get_db_connection()
+        cursor.execute(
+            "SELECT id FROM chat_sessions WHERE id = ? AND agent_name = ?", (session_id, agent_name)
+        )
+        if cursor.fetchone() is None:
+            return False
+        _delete_sessions(cursor, [session_id])
+        conn.commit()
+        return True
+
+    except sqlite3.Error as e:
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+    finally:
+        if conn:
+            conn.close()
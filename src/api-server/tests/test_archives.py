@@ -0,0 +1,173 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+from fastapi import HTTPException
+
+import archives
+from config import settings
+
+
+@pytest.fixture(autouse=True)
+def agents_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "agents_dir", str(tmp_path / "agents"))
+    monkeypatch.setattr(settings, "archive_max_files", 100)
+    monkeypatch.setattr(settings, "archive_max_extracted_bytes", 1024 * 1024)
+    return tmp_path / "agents"
+
+
+def _zip(tmp_path, members):
+    path = tmp_path / "upload.zip"
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members:
+            archive.writestr(name, data)
+    return str(path)
+
+
+def _tar(tmp_path, members):
+    path = tmp_path / "upload.tar.gz"
+    with tarfile.open(path, "w:gz") as archive:
+        for info in members:
+            data = info.pop("data", b"")
+            member = tarfile.TarInfo(info.pop("name"))
+            for key, value in info.items():
+                setattr(member, key, value)
+            member.size = len(data) if member.isreg() else 0
+            archive.addfile(member, io.BytesIO(data) if member.isreg() else None)
+    return str(path)
+
+
+def _agent_files(agents_dir, agent_name="a"):
+    agent_dir = agents_dir / agent_name
+    return sorted(os.listdir(agent_dir)) if agent_dir.exists() else []
+
+
+@pytest.mark.parametrize(
+    "member_name,file_name",
+    [
+        ("intro.md", "intro.md"),
+        ("docs/api/intro.md", "docs_api_intro.md"),
+        ("./docs//intro.md", "docs_intro.md"),
+        ("docs\\intro.md", "docs_intro.md"),
+        (".hidden", ""),
+        ("docs/.git/config", ""),
+        ("__MACOSX/._intro.md", ""),
+    ],
+)
+def test_safe_file_name(member_name, file_name):
+    assert archives._safe_file_name(member_name) == file_name
+
+
+@pytest.mark.parametrize(
+    "member_name", ["/etc/passwd", "C:/Windows/win.ini", "c:evil.txt", "../evil.txt", "docs/../../evil.txt", "..\\evil.txt"]
+)
+def test_safe_file_name_rejects_escaping_paths(member_name):
+    with pytest.raises(HTTPException) as error:
+        archives._safe_file_name(member_name)
+    assert error.value.status_code == 400
+
+
+def test_extract_zip(tmp_path, agents_dir):
+    path = _zip(tmp_path, [("docs/a.txt", "one"), ("b.txt", "two"), ("docs/", ""), (".DS_Store", "x")])
+    assert archives.extract_archive("a", path) == ["docs_a.txt", "b.txt"]
+    assert _agent_files(agents_dir) == ["b.txt", "docs_a.txt"]
+    assert (agents_dir / "a" / "docs_a.txt").read_text() == "one"
+    # the staging directory is removed
+    assert sorted(os.listdir(agents_dir)) == ["a"]
+
+
+def test_path_traversal_writes_nothing(tmp_path, agents_dir):
+    path = _zip(tmp_path, [("a.txt", "one"), ("../evil.txt", "evil")])
+    with pytest.raises(HTTPException) as error:
+        archives.extract_archive("a", path)
+    assert error.value.status_code == 400
+    assert _agent_files(agents_dir) == []
+    assert not (agents_dir / "evil.txt").exists()
+    assert sorted(os.listdir(agents_dir)) == ["a"]
+
+
+def test_zip_symlinks_are_skipped(tmp_path, agents_dir):
+    path = tmp_path / "upload.zip"
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("a.txt", "one")
+        link = zipfile.ZipInfo("link.txt")
+        link.external_attr = 0o120777 << 16
+        archive.writestr(link, "/etc/passwd")
+    assert archives.extract_archive("a", str(path)) == ["a.txt"]
+
+
+def test_tar_special_members_are_skipped(tmp_path, agents_dir):
+    path = _tar(
+        tmp_path,
+        [
+            {"name": "a.txt", "data": b"one"},
+            {"name": "link.txt", "type": tarfile.SYMTYPE, "linkname": "/etc/passwd"},
+            {"name": "hard.txt", "type": tarfile.LNKTYPE, "linkname": "a.txt"},
+            {"name": "fifo", "type": tarfile.FIFOTYPE},
+            {"name": "docs", "type": tarfile.DIRTYPE},
+        ],
+    )
+    assert archives.extract_archive("a", path) == ["a.txt"]
+    assert _agent_files(agents_dir) == ["a.txt"]
+
+
+def test_tar_path_traversal_is_rejected(tmp_path, agents_dir):
+    path = _tar(tmp_path, [{"name": "/tmp/evil.txt", "data": b"evil"}])
+    with pytest.raises(HTTPException) as error:
+        archives.extract_archive("a", path)
+    assert error.value.status_code == 400
+    assert _agent_files(agents_dir) == []
+
+
+@pytest.mark.parametrize("names", [["a/b.txt", "a_b.txt"], ["docs/a.txt", "./docs/a.txt"]])
+def test_members_flattened_to_the_same_name_are_rejected(tmp_path, agents_dir, names):
+    path = _zip(tmp_path, [(name, name) for name in names])
+    with pytest.raises(HTTPException) as error:
+        archives.extract_archive("a", path)
+    assert error.value.status_code == 400
+    assert _agent_files(agents_dir) == []
+
+
+def test_tar_repeated_member_is_rejected(tmp_path, agents_dir):
+    path = _tar(tmp_path, [{"name": "a.txt", "data": b"one"}, {"name": "a.txt", "data": b"two"}])
+    with pytest.raises(HTTPException) as error:
+        archives.extract_archive("a", path)
+    assert error.value.status_code == 400
+    assert _agent_files(agents_dir) == []
+
+
+def test_too_many_files(tmp_path, agents_dir, monkeypatch):
+    monkeypatch.setattr(settings, "archive_max_files", 2)
+    path = _zip(tmp_path, [(f"{i}.txt", "x") for i in range(3)])
+    with pytest.raises(HTTPException) as error:
+        archives.extract_archive("a", path)
+    assert error.value.status_code == 413
+    assert _agent_files(agents_dir) == []
+
+
+def test_extracted_size_is_counted_while_copying(tmp_path, agents_dir, monkeypatch):
+    monkeypatch.setattr(settings, "archive_max_extracted_bytes", 1000)
+    # compresses far below the limit, expands above it
+    path = _zip(tmp_path, [("a.txt", "x" * 600), ("b.txt", "x" * 600)])
+    assert os.path.getsize(path) < 1000
+    with pytest.raises(HTTPException) as error:
+        archives.extract_archive("a", path)
+    assert error.value.status_code == 413
+    assert _agent_files(agents_dir) == []
+
+
+def test_not_an_archive(tmp_path):
+    path = tmp_path / "upload.bin"
+    path.write_bytes(b"not an archive")
+    with pytest.raises(HTTPException) as error:
+        archives.extract_archive("a", str(path))
+    assert error.value.status_code == 400
+
+
+def test_empty_archive(tmp_path):
+    path = _zip(tmp_path, [("docs/", ""), (".hidden", "x")])
+    with pytest.raises(HTTPException) as error:
+        archives.extract_archive("a", path)
+    assert error.value.status_code == 400
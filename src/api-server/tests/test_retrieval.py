@@ -0,0 +1,56 @@
+from retrieval import merge_chunks
+
+TEXT = "Alpha beta gamma delta. Epsilon zeta eta theta. Iota kappa lambda mu. Nu xi omicron pi."
+
+
+def _chunk(start, end, chunk_index=None, file_name="doc.txt", document_index=0):
+    citation = {"file_name": file_name, "document_index": document_index, "start_char": start, "end_char": end}
+    if chunk_index is not None:
+        citation["chunk_index"] = chunk_index
+    return TEXT[start:end], citation
+
+
+def _merge(*chunks):
+    return merge_chunks([text for text, _ in chunks], [citation for _, citation in chunks])
+
+
+def test_overlapping_chunks_are_stitched_without_repeating_the_overlap():
+    assert _merge(_chunk(24, 70), _chunk(0, 47)) == [TEXT[0:70]]
+
+
+def test_contained_chunk_is_absorbed():
+    assert _merge(_chunk(0, 47), _chunk(10, 30)) == [TEXT[0:47]]
+
+
+def test_consecutive_chunks_are_joined_with_a_space():
+    assert _merge(_chunk(24, 47, 1), _chunk(0, 23, 0)) == [TEXT[0:47]]
+
+
+def test_distant_chunks_are_kept_apart():
+    # not overlapping and not consecutive in the file
+    assert _merge(_chunk(0, 23, 0), _chunk(48, 70, 2)) == [TEXT[0:23], TEXT[48:70]]
+    # no chunk index to tell whether they follow each other
+    assert _merge(_chunk(0, 23), _chunk(24, 47)) == [TEXT[0:23], TEXT[24:47]]
+
+
+def test_passage_takes_the_rank_of_its_best_chunk():
+    other = ("Other document.", {"file_name": "other.txt", "start_char": 0, "end_char": 15})
+    assert _merge(other, _chunk(48, 88, 2), _chunk(24, 70, 1)) == ["Other document.", TEXT[24:88]]
+
+
+def test_chunks_of_other_documents_are_not_merged():
+    assert _merge(_chunk(0, 47), _chunk(24, 70, file_name="other.txt")) == [TEXT[0:47], TEXT[24:70]]
+    assert _merge(_chunk(0, 47), _chunk(24, 70, document_index=1)) == [TEXT[0:47], TEXT[24:70]]
+
+
+def test_chunks_without_offsets_are_kept_as_they_are():
+    chunks = ["first", "second", TEXT[0:47], TEXT[24:70]]
+    citations = [None, {"file_name": "doc.txt", "start_char": -1, "end_char": -1}, _chunk(0, 47)[1], _chunk(24, 70)[1]]
+    assert merge_chunks(chunks, citations) == ["first", "second", TEXT[0:70]]
+    # fewer citations than chunks
+    assert merge_chunks(["first", "second"], [None]) == ["first", "second"]
+
+
+def test_no_text_is_repeated_in_a_run_of_chunks():
+    chunks = [_chunk(start, start + 30) for start in (50, 0, 25, 40)]
+    assert _merge(*chunks) == [TEXT[0:80]]
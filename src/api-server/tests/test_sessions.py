@@ -0,0 +1,111 @@
+import sqlite3
+import time
+
+import pytest
+
+import sessions
+from config import settings
+
+
+@pytest.fixture(autouse=True)
+def sessions_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "database_url", str(tmp_path / "sia.db"))
+    monkeypatch.setattr(settings, "chat_session_ttl", 3600)
+    monkeypatch.setattr(settings, "chat_session_max_bytes", 100)
+    monkeypatch.setattr(settings, "chat_max_sessions", 10)
+
+
+def _session_ids():
+    conn = sqlite3.connect(settings.database_url)
+    try:
+        return {row[0] for row in conn.execute("SELECT id FROM chat_sessions")}
+    finally:
+        conn.close()
+
+
+def _touch(session_id, updated_on):
+    conn = sqlite3.connect(settings.database_url)
+    try:
+        conn.execute("UPDATE chat_sessions SET updated_on = ? WHERE id = ?", (updated_on, session_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_session_is_reused_by_its_agent_only():
+    session_id = sessions.get_or_create_session("a")
+    assert sessions.get_or_create_session("a", session_id) == session_id
+    assert sessions.get_or_create_session("b", session_id) != session_id
+    assert sessions.get_or_create_session("a", "unknown") != session_id
+
+
+def test_expired_session_is_replaced_and_removed():
+    session_id = sessions.get_or_create_session("a")
+    sessions.append_session_turns(session_id, [("user", "hi"), ("assistant", "hello")])
+    _touch(session_id, int(time.time()) - settings.chat_session_ttl - 1)
+
+    new_session_id = sessions.get_or_create_session("a", session_id)
+    assert new_session_id != session_id
+    assert _session_ids() == {new_session_id}
+    assert sessions.get_session_turns(session_id) == []
+
+
+def test_least_recently_used_sessions_are_evicted(monkeypatch):
+    monkeypatch.setattr(settings, "chat_max_sessions", 3)
+    now = int(time.time())
+    first, second, third = (sessions.get_or_create_session("a") for _ in range(3))
+    _touch(first, now - 20)
+    _touch(second, now - 30)
+    _touch(third, now - 10)
+
+    fourth = sessions.get_or_create_session("a")
+    assert _session_ids() == {first, third, fourth}
+
+
+def test_turns_are_trimmed_to_the_session_size():
+    session_id = sessions.get_or_create_session("a")
+    for i in range(5):
+        sessions.append_session_turns(session_id, [("user", f"question {i} " * 2), ("assistant", f"answer {i} " * 2)])
+
+    turns = sessions.get_session_turns(session_id)
+    assert sum(len(turn["content"].encode("utf-8")) for turn in turns) <= settings.chat_session_max_bytes
+    assert turns[0]["role"] == "user"
+    assert turns[-1]["content"] == "answer 4 answer 4 "
+    assert [turn["content"] for turn in turns[:2]] == ["question 3 question 3 ", "answer 3 answer 3 "]
+
+
+def test_reply_is_not_kept_without_its_user_message():
+    session_id = sessions.get_or_create_session("a")
+    sessions.append_session_turns(session_id, [("user", "q" * 40), ("assistant", "a" * 40)])
+    # the new reply alone still fits, but the user message before it does not
+    sessions.append_session_turns(session_id, [("user", "q" * 50), ("assistant", "a" * 40)])
+    assert [turn["role"] for turn in sessions.get_session_turns(session_id)] == ["user", "assistant"]
+
+    sessions.append_session_turns(session_id, [("user", "q" * 30), ("assistant", "a" * 80)])
+    assert sessions.get_session_turns(session_id) == []
+
+
+def test_summary_replaces_the_turns_it_covers():
+    session_id = sessions.get_or_create_session("a")
+    sessions.append_session_turns(session_id, [("user", "hi"), ("assistant", "hello"), ("user", "bye")])
+    turns = sessions.get_session_turns(session_id)
+
+    sessions.save_session_summary(session_id, "greetings", turns[1]["id"])
+    assert sessions.get_session_summary(session_id) == ("greetings", turns[1]["id"])
+    assert [turn["content"] for turn in sessions.get_session_turns(session_id)] == ["bye"]
+
+    # an older summary saved concurrently is ignored
+    sessions.save_session_summary(session_id, "hi", turns[0]["id"])
+    assert sessions.get_session_summary(session_id) == ("greetings", turns[1]["id"])
+
+
+def test_delete_session_is_scoped_to_the_agent():
+    session_id = sessions.get_or_create_session("a")
+    sessions.append_session_turns(session_id, [("user", "hi")])
+
+    assert not sessions.delete_session("b", session_id)
+    assert session_id in _session_ids()
+    assert sessions.delete_session("a", session_id)
+    assert _session_ids() == set()
+    assert sessions.get_session_turns(session_id) == []
+    assert not sessions.delete_session("a", session_id)
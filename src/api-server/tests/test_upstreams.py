@@ -0,0 +1,81 @@
+import pytest
+import requests
+
+import upstreams
+from upstreams import UpstreamPool
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(upstreams.time, "monotonic", clock)
+    return clock
+
+
+def _pool(health_interval=0):
+    return UpstreamPool([("a", 1), ("b", 1)], "/health", health_interval, failure_threshold=2, eject_cooldown=30)
+
+
+def _request(pool):
+    with pool.route() as upstream:
+        return upstream
+
+
+def _eject(pool, upstream):
+    others = [u for u in pool.upstreams if u is not upstream]
+    for _ in range(pool.failure_threshold):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            with pool.route(exclude=others):
+                raise requests.exceptions.ConnectionError("refused")
+    assert not upstream.healthy
+
+
+def test_ejected_upstream_is_skipped(clock):
+    pool = _pool()
+    a, b = pool.upstreams
+    _eject(pool, a)
+    assert {_request(pool).host for _ in range(4)} == {"b"}
+
+
+def test_ejected_upstream_is_retried_after_the_cooldown_without_health_checks(clock):
+    pool = _pool()
+    a, b = pool.upstreams
+    _eject(pool, a)
+    clock.now += 31
+    # a failed retry starts a new cool-down
+    with pytest.raises(requests.exceptions.ConnectionError):
+        with pool.route(exclude=[b]) as upstream:
+            assert upstream is a
+            raise requests.exceptions.ConnectionError("refused")
+    assert not a.healthy
+    assert {_request(pool).host for _ in range(4)} == {"b"}
+    clock.now += 31
+    assert {_request(pool).host for _ in range(4)} == {"a", "b"}
+    assert a.healthy and a.consecutive_failures == 0
+    assert a.ejections == 1
+
+
+def test_ejected_upstream_waits_for_the_health_checks_when_enabled(clock):
+    pool = _pool(health_interval=10)
+    a, b = pool.upstreams
+    _eject(pool, a)
+    clock.now += 3600
+    assert {_request(pool).host for _ in range(4)} == {"b"}
+
+
+def test_success_restores_an_ejected_upstream(clock):
+    pool = _pool(health_interval=10)
+    a, b = pool.upstreams
+    _eject(pool, a)
+    # the all-ejected fallback still routes to it
+    with pool.route(exclude=[b]) as upstream:
+        assert upstream is a
+    assert a.healthy
@@ -0,0 +1,213 @@
+"""
+upstreams.py
+
+Load balancing of chat requests across several LLM server replicas. Each request is routed to the
+healthy upstream with the least outstanding requests. A background thread actively checks the
+health endpoint of every upstream, ejects the ones that fail and brings them back once they pass
+again. A successful request also brings an ejected upstream back, and with the health checks
+disabled an ejected upstream is tried again after a cool-down, so a burst of failures does not
+remove it for good. Per-upstream latency statistics are kept for the metrics route.
+"""
+
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+import requests
+
+from config import settings
+
+
+class Upstream:
+    """A single LLM server replica and its routing statistics."""
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self.outstanding: int = 0
+        self.healthy: bool = True
+        self.consecutive_failures: int = 0
+        self.ejections: int = 0
+        self.ejected_on: float = 0.0  # time.monotonic() of the ejection or the last failed retry
+        # latency statistics (seconds)
+        self.requests: int = 0
+        self.errors: int = 0
+        self.total_latency: float = 0.0
+        self.ewma_latency: Optional[float] = None
+        self.max_latency: float = 0.0
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "upstream": f"{self.host}:{self.port}",
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ejections": self.ejections,
+            "avg_latency_seconds": round(self.total_latency / self.requests, 4) if self.requests else 0.0,
+            "ewma_latency_seconds": round(self.ewma_latency, 4) if self.ewma_latency is not None else None,
+            "max_latency_seconds": round(self.max_latency, 4),
+        }
+
+
+class UpstreamPool:
+    """Routes requests to the least loaded healthy upstream and tracks upstream health."""
+
+    def __init__(
+        self,
+        upstreams: List[Tuple[str, int]],
+        health_path: str,
+        health_interval: int,
+        failure_threshold: int,
+        eject_cooldown: int,
+    ) -> None:
+        self.upstreams: List[Upstream] = [Upstream(host, port) for host, port in upstreams]
+        self.health_path = health_path
+        self.health_interval = health_interval
+        self.failure_threshold = max(failure_threshold, 1)
+        self.eject_cooldown = eject_cooldown
+        self._lock = threading.Lock()
+        # rotates the starting point so ties are spread across upstreams
+        self._counter = itertools.count()
+        self._health_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # ---------- Routing
+
+    def _choose(self, exclude: List[Upstream]) -> Upstream:
+        """
+        Pick the healthy upstream with the least outstanding requests (ties broken by latency).
+        """
+        now = time.monotonic()
+        candidates = [
+            u for u in self.upstreams
+            if u not in exclude and (u.healthy or self._cooled_down(u, now))
+        ]
+        if not candidates:
+            # all ejected: still try the ones not yet attempted rather than failing outright
+            candidates = [u for u in self.upstreams if u not in exclude]
+        if not candidates:
+            raise HTTPException(status_code=503, detail="No LLM server available")
+        offset = next(self._counter) % len(candidates)
+        rotated = candidates[offset:] + candidates[:offset]
+        return min(rotated, key=lambda u: (u.outstanding, u.ewma_latency or 0.0))
+
+    def _cooled_down(self, upstream: Upstream, now: float) -> bool:
+        """
+        Whether an ejected upstream can be tried again: only without health checks, which
+        otherwise bring it back, once the cool-down since its ejection (or last failure) passed.
+        """
+        return self.health_interval <= 0 and now - upstream.ejected_on >= self.eject_cooldown
+
+    def _record(self, upstream: Upstream, latency: float, failed: bool) -> None:
+        upstream.outstanding -= 1
+        upstream.requests += 1
+        upstream.total_latency += latency
+        upstream.max_latency = max(upstream.max_latency, latency)
+        alpha = 0.2
+        upstream.ewma_latency = latency if upstream.ewma_latency is None else (
+            alpha * latency + (1 - alpha) * upstream.ewma_latency
+        )
+        if failed:
+            upstream.errors += 1
+            self._mark_failure(upstream)
+        else:
+            self._mark_success(upstream)
+
+    def _mark_success(self, upstream: Upstream) -> None:
+        if not upstream.healthy:
+            print(f"LLM upstream {upstream.host}:{upstream.port} restored")
+        upstream.healthy = True
+        upstream.consecutive_failures = 0
+
+    def _mark_failure(self, upstream: Upstream) -> None:
+        upstream.consecutive_failures += 1
+        if not upstream.healthy:
+            # a failed retry after the cool-down starts a new one
+            upstream.ejected_on = time.monotonic()
+        elif upstream.consecutive_failures >= self.failure_threshold:
+            upstream.healthy = False
+            upstream.ejections += 1
+            upstream.ejected_on = time.monotonic()
+            print(f"LLM upstream {upstream.host}:{upstream.port} ejected")
+
+    @contextmanager
+    def route(self, exclude: Optional[List[Upstream]] = None) -> Iterator[Upstream]:
+        """
+        Context manager yielding the upstream to use and recording the outcome of the request.
+        Connection errors, timeouts and 5xx responses count as failures of the upstream.
+        """
+        with self._lock:
+            upstream = self._choose(exclude or [])
+            upstream.outstanding += 1
+        start = time.monotonic()
+        failed = False
+        try:
+            yield upstream
+        except requests.exceptions.HTTPError as e:
+            status_code = e.response.status_code if e.response is not None else 500
+            failed = status_code >= 500
+            raise
+        except requests.exceptions.RequestException:
+            failed = True
+            raise
+        finally:
+            with self._lock:
+                self._record(upstream, time.monotonic() - start, failed)
+
+    # ---------- Health Checks
+
+    def check_health(self) -> None:
+        """
+        Check every upstream once, ejecting failing ones and restoring recovered ones.
+        """
+        for upstream in self.upstreams:
+            try:
+                response = requests.get(f"{upstream.base_url}{self.health_path}", timeout=5)
+                ok = response.status_code == 200
+            except requests.exceptions.RequestException:
+                ok = False
+            with self._lock:
+                if ok:
+                    self._mark_success(upstream)
+                else:
+                    self._mark_failure(upstream)
+
+    def _health_loop(self) -> None:
+        while not self._stop.wait(self.health_interval):
+            self.check_health()
+
+    def start_health_checks(self) -> None:
+        """
+        Start the background health check thread (no-op if disabled or already running).
+        """
+        if self.health_interval <= 0 or self._health_thread is not None:
+            return
+        self._stop.clear()
+        self._health_thread = threading.Thread(target=self._health_loop, name="llm-health", daemon=True)
+        self._health_thread.start()
+
+    def stop_health_checks(self) -> None:
+        self._stop.set()
+        self._health_thread = None
+
+    def metrics(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [u.to_dict() for u in self.upstreams]
+
+
+# Instantiate the pool of llm-server replicas
+llm_upstreams = UpstreamPool(
+    upstreams=settings.llm_servers,
+    health_path=settings.llm_health_path,
+    health_interval=settings.llm_health_interval,
+    failure_threshold=settings.llm_failure_threshold,
+    eject_cooldown=settings.llm_eject_cooldown,
+)
@@ -0,0 +1,638 @@
+"""
+benchmark.py
+
+Ingestion benchmark for the /generate path of the Embeddings-server.
+Creates a synthetic corpus of text, Markdown and PDF files in a temporary agent
+directory, runs the ingestion pipeline end to end against a temporary ChromaDB store
+and reports documents/s, chunks/s, peak RSS and the time spent in each stage.
+A second run rebuilds the agent with the text cache filled by the first one.
+
+Usage:
+    python benchmark.py --files 50 --size-kb 20 --types txt,md,pdf
+    python benchmark.py --parse-workers 4  # parse through the process pool of the ingest worker
+    python benchmark.py --startup  # startup time and RSS per EMBEDDINGS_ROLE
+    python benchmark.py --vector-store --vectors 50000 --dim 384  # recall and latency per vector store backend
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config import settings
+
+# Vectors sent to the vector store in one upsert
+STORE_BATCH = 1000
+
+# Small vocabulary used to generate the synthetic text
+WORDS: List[str] = (
+    "agent document embedding vector query model token chunk server store index "
+    "retrieval prompt context answer system user knowledge file text search "
+    "the a of and to in is for on with as by that this from at be are"
+).split()
+
+
+# ---------- Corpus Generation
+
+
+def _make_text(size_bytes: int, rng: random.Random) -> str:
+    """
+    Generate random paragraphs of roughly the given size in bytes.
+    """
+    parts: List[str] = []
+    total = 0
+    while total < size_bytes:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + "."
+        parts.append(sentence)
+        total += len(sentence) + 1
+        if rng.random() < 0.15:
+            parts.append("\n\n")
+    return " ".join(parts)
+
+
+def _make_markdown(size_bytes: int, rng: random.Random) -> str:
+    """
+    Generate a Markdown document with headings and paragraphs.
+    """
+    sections: List[str] = []
+    section_size = max(size_bytes // 4, 256)
+    for i in range(max(size_bytes // section_size, 1)):
+        sections.append(f"## Section {i + 1}\n\n{_make_text(section_size, rng)}\n")
+    return "# Synthetic document\n\n" + "\n".join(sections)
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _make_pdf(size_bytes: int, rng: random.Random) -> bytes:
+    """
+    Generate a minimal multi-page PDF with plain text content (no external dependencies).
+    """
+    lines = [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(max(size_bytes // 80, 1))]
+    lines_per_page = 50
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)]
+
+    # objects 1: catalog, 2: pages, 3: font, then (page, content) pairs
+    objects: List[bytes] = []
+    page_ids = [4 + 2 * i for i in range(len(pages))]
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {len(pages)} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for page_id, page_lines in zip(page_ids, pages):
+        stream = "BT /F1 10 Tf 40 800 Td 14 TL\n"
+        stream += "\n".join(f"({_pdf_escape(line)}) '" for line in page_lines)
+        stream += "\nET"
+        stream_bytes = stream.encode("latin-1")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>".encode()
+        )
+        objects.append(
+            f"<< /Length {len(stream_bytes)} >>\nstream\n".encode() + stream_bytes + b"\nendstream"
+        )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets: List[int] = []
+    for i, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref_offset = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def _near_copy(text: str, rng: random.Random, changed: float = 0.02) -> str:
+    """
+    The text with a small fraction of its words replaced, like a revised version of a document.
+    """
+    words = text.split(" ")
+    for i in rng.sample(range(len(words)), int(len(words) * changed)):
+        words[i] = rng.choice(WORDS)
+    return " ".join(words)
+
+
+def create_corpus(
+    agent_dir: str, no_files: int, size_kb: int, types: List[str], seed: int = 42, duplicate_percent: int = 0
+) -> int:
+    """
+    Write a synthetic corpus into agent_dir and return the total number of bytes written.
+    duplicate_percent more files are copies of the first ones, alternately exact copies and
+    near copies with a few words changed (PDF files are always copied as is).
+    """
+    os.makedirs(agent_dir, exist_ok=True)
+    rng = random.Random(seed)
+    size_bytes = size_kb * 1024
+    total = 0
+    originals: List[str] = []
+    for i in range(no_files):
+        file_type = types[i % len(types)]
+        file_path = os.path.join(agent_dir, f"doc_{i:05d}.{file_type}")
+        if file_type == "pdf":
+            content: bytes = _make_pdf(size_bytes, rng)
+        elif file_type == "md":
+            content = _make_markdown(size_bytes, rng).encode("utf-8")
+        else:
+            content = _make_text(size_bytes, rng).encode("utf-8")
+        with open(file_path, "wb") as f:
+            f.write(content)
+        total += len(content)
+        originals.append(file_path)
+
+    for i in range(no_files * duplicate_percent // 100):
+        source = originals[i % len(originals)]
+        with open(source, "rb") as f:
+            content = f.read()
+        if i % 2 and not source.endswith(".pdf"):
+            content = _near_copy(content.decode("utf-8"), rng).encode("utf-8")
+        with open(os.path.join(agent_dir, f"dup_{i:05d}{os.path.splitext(source)[1]}"), "wb") as f:
+            f.write(content)
+        total += len(content)
+    return total
+
+
+# ---------- Measurement
+
+
+def peak_rss_mb() -> float:
+    """
+    Peak resident set size of this process in MB (ru_maxrss is in KB on Linux).
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def timed(stages: Dict[str, float], name: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Run func(*args, **kwargs), recording its duration in seconds under stages[name].
+    """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    stages[name] = time.perf_counter() - start
+    return result
+
+
+def timed_iter(stages: Dict[str, float], name: str, items: Iterable[Any]) -> Iterator[Any]:
+    """
+    Iterate over items, adding the time spent waiting for each one to stages[name].
+    """
+    iterator = iter(items)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            stages[name] += time.perf_counter() - start
+            return
+        stages[name] += time.perf_counter() - start
+        yield item
+
+
+def _parse_in_process(files: List[Tuple[int, str]]) -> Iterator[Tuple[int, Optional[List[Any]], Optional[str]]]:
+    from ingest import load_file
+
+    for file_no, file_path in files:
+        try:
+            yield file_no, load_file(file_path), None
+        except Exception as e:
+            yield file_no, None, str(e)
+
+
+def load_documents(
+    agent_dir: str, file_names: List[str], parse_pool: Optional[Any], cache: Optional[Any] = None
+) -> Iterator[Tuple[int, Optional[List[Any]], Optional[str]]]:
+    """
+    Parse the files like the ingest worker, in this process or through the parse pool, and yield
+    (file_no, documents, error) in the order of the files, holding the results the pool finishes
+    early. With a text cache, cached files are not parsed and the others are added to it.
+    """
+    from textcache import file_digest
+
+    to_parse: List[Tuple[int, str]] = []
+    cache_keys: Dict[int, str] = {}
+    for file_no, file_name in enumerate(file_names):
+        file_path = os.path.join(agent_dir, file_name)
+        if cache is not None:
+            cache_keys[file_no] = cache.key(file_path, file_digest(file_path))
+            if cache.contains(cache_keys[file_no]):
+                continue
+        to_parse.append((file_no, file_path))
+    uncached = {file_no for file_no, _ in to_parse}
+
+    parsed = parse_pool.parse(to_parse) if parse_pool is not None else _parse_in_process(to_parse)
+    ready: Dict[int, Tuple[int, Optional[List[Any]], Optional[str]]] = {}
+    for file_no, file_name in enumerate(file_names):
+        if file_no not in uncached:
+            documents = cache.get(cache_keys[file_no])
+            if documents is None:
+                # evicted since it was looked up
+                yield next(_parse_in_process([(file_no, os.path.join(agent_dir, file_name))]))
+            else:
+                yield file_no, documents, None
+            continue
+        while file_no not in ready:
+            parsed_no, documents, error = next(parsed)
+            if documents is not None and parsed_no in cache_keys:
+                cache.put(cache_keys[parsed_no], documents)
+            ready[parsed_no] = (parsed_no, documents, error)
+        yield ready.pop(file_no)
+
+
+def ingest_corpus(
+    agent_dir: str,
+    collection: Any,
+    embedding_model: Any,
+    text_splitter: Any,
+    parse_pool: Optional[Any],
+    cache: Optional[Any] = None,
+    dedup: bool = True,
+) -> Dict[str, Any]:
+    """
+    Run the per-file path of the ingest jobs over the corpus and return the counts, the total time
+    and the time of each stage summed over the files. With dedup, the duplicate chunks are dropped
+    before encoding as in the ingest jobs (DEDUP_NEAR_THRESHOLD, DEDUP_SHINGLE_SIZE).
+    """
+    from ingest import list_files, chunk_documents_with_offsets, encode_chunks, store_file_chunks
+    from dedup import ChunkDeduplicator
+
+    deduplicator = ChunkDeduplicator(settings.dedup_near_threshold, settings.dedup_shingle_size) if dedup else None
+    stages: Dict[str, float] = {name: 0.0 for name in ("load", "split", "dedup", "encode", "insert")}
+    no_documents = 0
+    no_chunks = 0
+    parse_errors = 0
+    first_parsed: Optional[float] = None
+    file_names = list_files(agent_dir)
+    start = time.perf_counter()
+    for file_no, documents, error in timed_iter(stages, "load", load_documents(agent_dir, file_names, parse_pool, cache)):
+        if first_parsed is None:
+            first_parsed = time.perf_counter() - start
+        if error is not None:
+            parse_errors += 1
+            continue
+        file_name = file_names[file_no]
+        file_stages: Dict[str, float] = {}
+        # chunks located in the text with their offsets, stored in their metadata, as in the ingest jobs
+        chunks, offsets = timed(file_stages, "split", chunk_documents_with_offsets, documents, text_splitter)
+        positions = list(range(len(chunks)))
+        if deduplicator is not None:
+            positions = timed(file_stages, "dedup", deduplicator.filter, chunks)
+            chunks = [chunks[position] for position in positions]
+            offsets = [offsets[position] for position in positions]
+        embeddings = timed(file_stages, "encode", encode_chunks, embedding_model, chunks)
+        timed(
+            file_stages, "insert", store_file_chunks, collection, file_no, file_name, chunks, embeddings, positions, offsets
+        )
+        for name, value in file_stages.items():
+            stages[name] += value
+        no_documents += len(documents)
+        no_chunks += len(chunks)
+    return {
+        "files": len(file_names),
+        "documents": no_documents,
+        "chunks": no_chunks,
+        "chunks_dropped": deduplicator.dropped if deduplicator is not None else 0,
+        "near_duplicates_dropped": deduplicator.near_dropped if deduplicator is not None else 0,
+        "parse_errors": parse_errors,
+        "first_parsed_s": first_parsed or 0.0,
+        "total_s": time.perf_counter() - start,
+        "stages_s": stages,
+    }
+
+
+def run_benchmark(
+    no_files: int,
+    size_kb: int,
+    types: List[str],
+    keep: bool = False,
+    parse_workers: int = 0,
+    parse_timeout: float = 300,
+    warm_run: bool = True,
+    duplicate_percent: int = 10,
+    dedup: bool = True,
+) -> Dict[str, Any]:
+    """
+    Generate the corpus, run the ingestion pipeline end to end and return the report.
+    With parse_workers, the files are parsed by a ParsePool as in the ingest jobs: the load stage is
+    then the time the pipeline waited for parsed files, and the time to the first parsed file
+    includes starting the worker processes.
+    The first run fills a temporary text cache; with warm_run the corpus is ingested a second time
+    into a new collection, like a rebuild of the agent, loading the files from that cache.
+    duplicate_percent of the files are added as duplicates for the dedup stage to drop.
+    """
+    # imported here so that corpus generation does not pay for the heavy imports
+    import chromadb
+    from sentence_transformers import SentenceTransformer
+    from ingest import resolve_chunking, make_text_splitter
+    from parsing import ParsePool
+    from textcache import TextCache
+
+    work_dir = tempfile.mkdtemp(prefix="sia-bench-")
+    agent_dir = os.path.join(work_dir, "agents", "bench")
+    store_dir = os.path.join(work_dir, "store")
+    parse_pool = ParsePool(parse_workers, parse_timeout) if parse_workers > 0 else None
+    try:
+        corpus_bytes = create_corpus(agent_dir, no_files, size_kb, types, duplicate_percent=duplicate_percent)
+        stages: Dict[str, float] = {}
+
+        embedding_model = timed(
+            stages, "model_load", SentenceTransformer,
+            model_name_or_path=settings.embedding_model_name,
+            cache_folder=settings.models_dir,
+            token=settings.hf_api_token,
+        )
+        client = chromadb.PersistentClient(path=store_dir)
+        cache = TextCache(os.path.join(work_dir, "text_cache"), max(corpus_bytes * 4, 1024 * 1024 * 1024))
+        rss_before = peak_rss_mb()
+
+        chunking = resolve_chunking(embedding_model, {})
+        text_splitter = make_text_splitter(embedding_model, chunking)
+        cold = ingest_corpus(
+            agent_dir, client.get_or_create_collection(name="agent_bench"), embedding_model, text_splitter, parse_pool, cache, dedup
+        )
+        stages.update(cold["stages_s"])
+        total = cold["total_s"]
+
+        warm: Optional[Dict[str, Any]] = None
+        if warm_run:
+            hits = cache.hits
+            warm = ingest_corpus(
+                agent_dir, client.get_or_create_collection(name="agent_bench_rebuild"), embedding_model, text_splitter, parse_pool, cache, dedup
+            )
+            warm = {
+                "total_s": round(warm["total_s"], 3),
+                "load_s": round(warm["stages_s"]["load"], 3),
+                "stages_s": {name: round(value, 3) for name, value in warm["stages_s"].items()},
+                "text_cache_hits": cache.hits - hits,
+            }
+
+        return {
+            "files": cold["files"],
+            "duplicate_files": cold["files"] - no_files,
+            "types": types,
+            "corpus_mb": round(corpus_bytes / (1024 * 1024), 2),
+            "documents": cold["documents"],
+            "chunks": cold["chunks"],
+            "chunks_dropped": cold["chunks_dropped"],
+            "near_duplicates_dropped": cold["near_duplicates_dropped"],
+            "chunking": chunking,
+            "parse_workers": parse_workers,
+            "parse_errors": cold["parse_errors"],
+            "parse_timeouts": parse_pool.timeouts if parse_pool is not None else 0,
+            "first_parsed_s": round(cold["first_parsed_s"], 3),
+            "total_s": round(total, 3),
+            "files_per_s": round(cold["files"] / total, 2) if total else 0.0,
+            "documents_per_s": round(cold["documents"] / total, 2) if total else 0.0,
+            "chunks_per_s": round(cold["chunks"] / total, 2) if total else 0.0,
+            "stages_s": {name: round(value, 3) for name, value in stages.items()},
+            "warm_run": warm,
+            "peak_rss_mb_before_ingest": round(rss_before, 1),
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+            "work_dir": work_dir if keep else None,
+        }
+    finally:
+        if parse_pool is not None:
+            parse_pool.close()
+        if not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# Run in a fresh interpreter so each role pays its own imports
+STARTUP_SNIPPET = """
+import json, resource, time
+start = time.perf_counter()
+import main
+from config import settings
+from resources import resources
+if settings.ingest_enabled:
+    import ingest
+resources.load()
+print(json.dumps({
+    "startup_s": round(time.perf_counter() - start, 3),
+    "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    "ready": resources.ready,
+}))
+"""
+
+
+def run_startup_benchmark(roles: List[str]) -> Dict[str, Any]:
+    """
+    Measure the startup time and peak RSS of the app for each serving role.
+    """
+    report: Dict[str, Any] = {}
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    for role in roles:
+        env = dict(os.environ, EMBEDDINGS_ROLE=role)
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_SNIPPET],
+            cwd=base_dir, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        report[role] = json.loads(output.strip().splitlines()[-1])
+    return report
+
+
+def _clustered_vectors(count: int, dim: int, rng: Any) -> Any:
+    """
+    Random vectors around a few hundred centers, closer to real embeddings than uniform noise.
+    """
+    import numpy as np
+
+    centers = rng.normal(size=(max(count // 100, 1), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), size=count)] + 0.3 * rng.normal(size=(count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+# Run in a fresh interpreter per backend so the RSS growth is that of serving a cold agent
+VECTOR_QUERY_SNIPPET = """
+import json, os, resource, sys, time
+import numpy as np
+from vectorstore import open_vector_store
+
+def rss_mb():
+    # resident set now (the peak is already reached by the imports), peak where /proc is missing
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+backend, path, queries_path, top_k = sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4])
+queries = np.load(queries_path)
+rss_before = rss_mb()
+start = time.perf_counter()
+client = open_vector_store(backend, path)
+collection = client.get_collection("agent_bench_live")
+open_s = time.perf_counter() - start
+start = time.perf_counter()
+collection.query(query_embeddings=[queries[0].tolist()], n_results=top_k)
+first_query_s = time.perf_counter() - start
+latencies, ids = [], []
+for query in queries:
+    start = time.perf_counter()
+    result = collection.query(query_embeddings=[query.tolist()], n_results=top_k, include=["distances"])
+    latencies.append(time.perf_counter() - start)
+    ids.append(result["ids"][0])
+print(json.dumps({
+    "open_s": open_s,
+    "first_query_s": first_query_s,
+    "latencies": latencies,
+    "ids": ids,
+    "rss_mb_increase": rss_mb() - rss_before,
+}))
+"""
+
+
+def run_vector_store_benchmark(no_vectors: int, dim: int, no_queries: int, top_k: int, backends: List[str]) -> Dict[str, Any]:
+    """
+    Insert the same synthetic vectors in each backend, then measure in a fresh process, like a query
+    replica serving a cold agent, the time to open the collection and answer a first query, the
+    query latency, the recall@k against an exact search and the growth of its RSS.
+    """
+    import numpy as np
+    from vectorstore import open_vector_store
+
+    rng = np.random.default_rng(42)
+    vectors = _clustered_vectors(no_vectors, dim, rng)
+    queries = vectors[rng.integers(0, no_vectors, size=no_queries)] + 0.05 * rng.normal(size=(no_queries, dim)).astype(np.float32)
+    # exact neighbours by squared L2 distance, in blocks to bound the memory
+    truth = []
+    for start in range(0, no_queries, 64):
+        block = queries[start:start + 64]
+        distances = (vectors ** 2).sum(1)[None, :] - 2 * block @ vectors.T
+        truth.extend(set(row) for row in np.argsort(distances, axis=1)[:, :top_k])
+
+    report: Dict[str, Any] = {"vectors": no_vectors, "dim": dim, "queries": no_queries, "top_k": top_k, "backends": {}}
+    work_dir = tempfile.mkdtemp(prefix="sia-vector-bench-")
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    try:
+        queries_path = os.path.join(work_dir, "queries.npy")
+        np.save(queries_path, queries)
+        for backend in backends:
+            path = os.path.join(work_dir, backend)
+            client = open_vector_store(backend, path)
+            collection = client.get_or_create_collection(name="agent_bench")
+            start = time.perf_counter()
+            for batch in range(0, no_vectors, STORE_BATCH):
+                ids = [f"v{i}" for i in range(batch, min(batch + STORE_BATCH, no_vectors))]
+                collection.upsert(
+                    ids=ids,
+                    embeddings=vectors[batch:batch + STORE_BATCH].tolist(),
+                    documents=ids,
+                    metadatas=[{"file_name": "bench"} for _ in ids],
+                )
+            # the ingest jobs publish a collection by renaming it, which builds the HNSW graph of the local backend
+            collection.modify(name="agent_bench_live")
+            insert_s = time.perf_counter() - start
+            del collection, client
+
+            output = subprocess.run(
+                [sys.executable, "-c", VECTOR_QUERY_SNIPPET, backend, path, queries_path, str(top_k)],
+                cwd=base_dir, capture_output=True, text=True, check=True,
+            ).stdout
+            served = json.loads(output.strip().splitlines()[-1])
+            hits = sum(
+                len(expected & {int(record_id[1:]) for record_id in record_ids})
+                for expected, record_ids in zip(truth, served["ids"])
+            )
+            latencies = sorted(served["latencies"])
+            report["backends"][backend] = {
+                "insert_s": round(insert_s, 4),
+                "open_s": round(served["open_s"], 4),
+                "first_query_s": round(served["first_query_s"], 4),
+                "recall_at_k": round(hits / (no_queries * top_k), 4),
+                "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+                "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 3),
+                "rss_mb_increase": round(served["rss_mb_increase"], 1),
+            }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return report
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    print(f"corpus      : {report['files']} files ({', '.join(report['types'])}, {report['duplicate_files']} duplicated), {report['corpus_mb']} MB")
+    print(f"documents   : {report['documents']}")
+    chunking = report["chunking"]
+    print(f"chunks      : {report['chunks']} ({chunking['strategy']}, {chunking['chunk_size']} tokens, {chunking['chunk_overlap']} overlap)")
+    print(f"dropped     : {report['chunks_dropped']} duplicate chunks ({report['near_duplicates_dropped']} near duplicates)")
+    parsing = f"{report['parse_workers']} processes" if report["parse_workers"] else "in process"
+    print(f"parsing     : {parsing}, first file after {report['first_parsed_s']} s, "
+          f"{report['parse_errors']} errors ({report['parse_timeouts']} timeouts)")
+    print(f"total       : {report['total_s']} s")
+    print(f"files/s     : {report['files_per_s']}")
+    print(f"documents/s : {report['documents_per_s']}")
+    print(f"chunks/s    : {report['chunks_per_s']}")
+    print(f"peak RSS    : {report['peak_rss_mb']} MB (model loaded: {report['peak_rss_mb_before_ingest']} MB)")
+    print("stages:")
+    for name, value in report["stages_s"].items():
+        print(f"  {name:<10}: {value} s")
+    warm = report["warm_run"]
+    if warm:
+        print(f"rebuild     : {warm['total_s']} s, load {warm['load_s']} s ({warm['text_cache_hits']} text cache hits)")
+    if report["work_dir"]:
+        print(f"work dir kept at {report['work_dir']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the embeddings-server ingestion pipeline")
+    parser.add_argument("--files", type=int, default=20, help="number of files in the corpus")
+    parser.add_argument("--size-kb", type=int, default=16, help="approximate size of each file in KB")
+    parser.add_argument("--types", default="txt,md,pdf", help="comma-delimited file types (txt, md, pdf)")
+    parser.add_argument("--keep", action="store_true", help="keep the temporary corpus and store")
+    parser.add_argument("--parse-workers", type=int, default=0, help="parser processes, 0 parses in this process")
+    parser.add_argument("--parse-timeout", type=float, default=settings.parse_timeout, help="seconds before a file is skipped")
+    parser.add_argument("--no-warm-run", action="store_true", help="skip the rebuild from the text cache")
+    parser.add_argument("--duplicate-percent", type=int, default=10, help="files added as copies of others")
+    parser.add_argument("--no-dedup", action="store_true", help="encode the duplicate chunks too")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--startup", action="store_true", help="measure startup time and RSS per serving role")
+    parser.add_argument("--vector-store", action="store_true", help="compare the recall and latency of the vector store backends")
+    parser.add_argument("--vectors", type=int, default=20000, help="vectors in the vector store benchmark")
+    parser.add_argument("--dim", type=int, default=384, help="dimension of the vectors")
+    parser.add_argument("--queries", type=int, default=200, help="queries in the vector store benchmark")
+    parser.add_argument("--top-k", type=int, default=5, help="neighbours per query")
+    parser.add_argument("--backends", default="chroma,local", help="comma-delimited vector store backends")
+    args = parser.parse_args()
+
+    if args.vector_store:
+        backend_names = [b.strip().lower() for b in args.backends.split(",") if b.strip()]
+        vector_report = run_vector_store_benchmark(args.vectors, args.dim, args.queries, args.top_k, backend_names)
+        if args.json:
+            print(json.dumps(vector_report, indent=2))
+        else:
+            print(f"{vector_report['vectors']} vectors of {vector_report['dim']} dimensions, "
+                  f"{vector_report['queries']} queries, top {vector_report['top_k']}")
+            for backend_name, values in vector_report["backends"].items():
+                print(f"{backend_name:<7}: recall@k {values['recall_at_k']}, p50 {values['p50_ms']} ms, "
+                      f"p95 {values['p95_ms']} ms, insert {values['insert_s']} s, open {values['open_s']} s, "
+                      f"first query {values['first_query_s']} s, RSS +{values['rss_mb_increase']} MB")
+        sys.exit(0)
+
+    if args.startup:
+        startup = run_startup_benchmark(["query", "ingest", "both"])
+        if args.json:
+            print(json.dumps(startup, indent=2))
+        else:
+            for role_name, values in startup.items():
+                print(f"{role_name:<7}: startup {values['startup_s']} s, peak RSS {values['peak_rss_mb']} MB")
+        sys.exit(0)
+
+    file_types = [t.strip().lower() for t in args.types.split(",") if t.strip()]
+    result = run_benchmark(
+        args.files, args.size_kb, file_types, keep=args.keep,
+        parse_workers=args.parse_workers, parse_timeout=args.parse_timeout, warm_run=not args.no_warm_run,
+        duplicate_percent=args.duplicate_percent, dedup=not args.no_dedup,
+    )
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        _print_report(result)
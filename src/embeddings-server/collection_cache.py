@@ -0,0 +1,132 @@
+"""
+collection_cache.py
+
+Cache of the agents' collection handles for the query endpoints, so a query does not look the
+collection up in the store every time, and never creates one: an agent without a collection
+(never ingested, deleted, or a typo in the name) gets a 404, and that answer is itself cached for
+a short time so repeated queries for it do not touch the store either, unless a job of the agent is
+running: its collection is then missing only while the job publishes it.
+
+Collections are tagged with the embedding model that built them (see model_metadata), so
+queries are encoded with the same model even while a model change is being re-embedded.
+
+Entries are invalidated when an ingest job publishes a new collection or an agent is deleted.
+Other processes (e.g. query replicas) do not see these events: a handle to a replaced collection
+fails on use, and is then looked up again once (see CollectionCache.run).
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from fastapi import HTTPException
+
+from config import settings
+from vectorstore import is_collection_missing
+import jobs
+
+T = TypeVar("T")
+
+
+def collection_name(agent_name: str) -> str:
+    """
+    Name of the live collection of an agent.
+    """
+    return f"agent_{agent_name}"
+
+
+def model_metadata() -> Dict[str, Any]:
+    """
+    Metadata tagging a collection with the embedding model that builds it.
+    """
+    return {"embedding_model": settings.embedding_model_name}
+
+
+def collection_model(collection: Any) -> str:
+    """
+    Name of the embedding model that built the collection. Collections from before the tagging
+    are tagged by the ingest worker at startup; until then they are taken as the configured model's.
+    """
+    return (collection.metadata or {}).get("embedding_model") or settings.embedding_model_name
+
+
+class CollectionCache:
+    """Collection handles per agent name, with the agents known to have no collection."""
+
+    def __init__(self, missing_ttl: float) -> None:
+        self.missing_ttl = missing_ttl
+        self._lock = threading.Lock()
+        self._handles: Dict[str, Any] = {}
+        self._missing: Dict[str, float] = {}  # agent name -> time of the failed lookup
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def get(self, client: Any, agent_name: str) -> Any:
+        """
+        The handle of the agent's collection.
+
+        Raises:
+            HTTPException: 404 if the agent has no collection. Other errors of the store are raised
+                as they are and not cached.
+        """
+        with self._lock:
+            handle = self._handles.get(agent_name)
+            if handle is not None:
+                self.hits += 1
+                return handle
+            missing_since: Optional[float] = self._missing.get(agent_name)
+            if missing_since is not None and time.monotonic() - missing_since < self.missing_ttl:
+                self.hits += 1
+                raise HTTPException(status_code=404, detail=f"No embeddings for agent {agent_name}")
+            self.misses += 1
+        try:
+            handle = client.get_collection(name=collection_name(agent_name))
+        except Exception as e:
+            if not is_collection_missing(e):
+                raise
+            if not jobs.has_running_job(agent_name):
+                with self._lock:
+                    self._missing[agent_name] = time.monotonic()
+            raise HTTPException(status_code=404, detail=f"No embeddings for agent {agent_name}")
+        with self._lock:
+            self._handles[agent_name] = handle
+            self._missing.pop(agent_name, None)
+        return handle
+
+    def invalidate(self, agent_name: str) -> None:
+        """
+        Forget the agent's handle (its collection was replaced or deleted).
+        """
+        with self._lock:
+            self._handles.pop(agent_name, None)
+            self._missing.pop(agent_name, None)
+
+    def run(self, client: Any, agent_name: str, action: Callable[[Any], T]) -> T:
+        """
+        Run action with the agent's collection. If it fails with a cached handle, the collection
+        may have been replaced by another process: the handle is looked up again and action retried.
+        """
+        cached = agent_name in self._handles
+        collection = self.get(client, agent_name)
+        try:
+            return action(collection)
+        except HTTPException:
+            raise
+        except Exception:
+            if not cached:
+                raise
+            self.invalidate(agent_name)
+            return action(self.get(client, agent_name))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "handles": len(self._handles),
+                "missing": len(self._missing),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+# Instantiate the cache of the collection handles
+collection_cache = CollectionCache(settings.collection_missing_ttl)
@@ -25,6 +25,7 @@ class Settings:
         self.agents_dir: str = os.path.join(self.data_dir, "agents")
         self.models_dir: str = os.path.join(self.data_dir, "models")
         self.store_dir: str = os.path.join(self.data_dir, "store")
+        self.vector_store_dir: str = os.path.join(self.data_dir, "vectors") # used by the local backend
         
         # Security settings
         self.header_name: str = "X-Requested-With"  # Fixed header name for requests from the frontend
@@ -34,6 +35,66 @@ class Settings:
         self.api_server = os.getenv("API_SERVER", "embeddings-server")
         self.api_server_port = self._get_env_int("API_SERVER_PORT", 8080) # port used by the api-server
 
+        # serving role: "ingest" (/generate), "query" (/query) or "both"
+        self.role: str = os.getenv("EMBEDDINGS_ROLE", "both").strip().lower()
+        if self.role not in ("ingest", "query", "both"):
+            self.role = "both"
+        self.ingest_enabled: bool = self.role in ("ingest", "both")
+        self.query_enabled: bool = self.role in ("query", "both")
+
+        # persistent ingest jobs
+        self.jobs_database_url: str = os.getenv("EMBEDDINGS_JOBS_DATABASE_URL", os.path.join(self.data_dir, "jobs.db"))
+        self.ingest_poll_interval: int = self._get_env_int("INGEST_POLL_INTERVAL", 2) # seconds between checks for queued jobs
+        self.ingest_stale_seconds: int = self._get_env_int("INGEST_STALE_SECONDS", 600) # running job without heartbeat is resumed
+        self.ingest_max_attempts: int = self._get_env_int("INGEST_MAX_ATTEMPTS", 3) # attempts before a job is marked failed
+        self.notify_interval: int = self._get_env_int("INGEST_NOTIFY_INTERVAL", 5) # seconds between notification retries
+        self.notify_max_backoff: int = self._get_env_int("INGEST_NOTIFY_MAX_BACKOFF", 300) # maximum seconds between retries
+        self.progress_interval: int = self._get_env_int("INGEST_PROGRESS_INTERVAL", 2) # minimum seconds between progress reports
+        self.parse_workers: int = self._get_env_int("INGEST_PARSE_WORKERS", 2) # parser processes, 0 parses in the ingest thread
+        self.parse_timeout: int = self._get_env_int("INGEST_PARSE_TIMEOUT", 300) # seconds before a file is skipped
+        self.reembed_throttle_seconds: float = self._get_env_float("REEMBED_THROTTLE_SECONDS", 1) # pause after each file re-embedded for a model change
+        # default chunking, agents can override it (validated against the embedding model)
+        self.chunk_size: int = self._get_env_int("CHUNK_SIZE", 0) # tokens, 0 uses the model's max_seq_length
+        self.chunk_overlap_percent: int = self._get_env_int("CHUNK_OVERLAP_PERCENT", 10) # of the chunk size
+        self.chunk_strategy: str = os.getenv("CHUNK_STRATEGY", "token") # "token" or "sentence"
+        # removal of duplicate chunks before encoding
+        self.dedup_enabled: bool = self._get_env_bool("DEDUP_ENABLED", True)
+        self.dedup_near_threshold: float = self._get_env_float("DEDUP_NEAR_THRESHOLD", 0.85) # estimated Jaccard similarity, 0 only drops exact duplicates
+        self.dedup_shingle_size: int = self._get_env_int("DEDUP_SHINGLE_SIZE", 5) # words per shingle
+        self.text_cache_dir: str = os.path.join(self.data_dir, "text_cache")
+        self.text_cache_max_bytes: int = self._get_env_int("TEXT_CACHE_MAX_BYTES", 1024 * 1024 * 1024) # 0 disables the cache
+
+        # vector store: "chroma" (ChromaDB) or "local" (memory-mapped vectors, HNSW for large collections)
+        self.vector_store_backend: str = os.getenv("VECTOR_STORE_BACKEND", "chroma").strip().lower()
+        self.vector_store_hnsw_threshold: int = self._get_env_int("VECTOR_STORE_HNSW_THRESHOLD", 20000) # vectors from which a collection gets an HNSW graph
+        self.vector_store_hnsw_m: int = self._get_env_int("VECTOR_STORE_HNSW_M", 16) # links per node
+        self.vector_store_hnsw_ef_construction: int = self._get_env_int("VECTOR_STORE_HNSW_EF_CONSTRUCTION", 200)
+        self.vector_store_hnsw_ef_search: int = self._get_env_int("VECTOR_STORE_HNSW_EF_SEARCH", 64) # higher is slower with a better recall
+        # per-agent indexes held in memory: least recently used ones are unloaded over the budget
+        self.vector_store_memory_budget: int = self._get_env_int("VECTOR_STORE_MEMORY_BUDGET_MB", 0) * 1024 * 1024 # 0 for no budget
+        self.vector_store_index_idle_seconds: int = self._get_env_int("VECTOR_STORE_INDEX_IDLE_SECONDS", 1800) # 0 keeps idle indexes loaded
+
+        # collection handles cached by the query endpoints
+        self.collection_missing_ttl: int = self._get_env_int("COLLECTION_MISSING_TTL", 30) # seconds an agent without collection is answered 404 from cache
+
+        # batch queries
+        self.query_batch_max_items: int = self._get_env_int("QUERY_BATCH_MAX_ITEMS", 256) # items accepted by /query_batch
+        self.query_batch_encode_size: int = self._get_env_int("QUERY_BATCH_ENCODE_SIZE", 32) # prompts per encode batch
+        # diversity re-ranking of the retrieved chunks (maximal marginal relevance), requests can override it
+        self.query_mmr_enabled: bool = self._get_env_bool("QUERY_MMR_ENABLED", False)
+        self.query_mmr_lambda: float = self._get_env_float("QUERY_MMR_LAMBDA", 0.5) # 1 ranks by relevance only, 0 by diversity only
+        self.query_mmr_candidates: int = self._get_env_int("QUERY_MMR_CANDIDATES", 4) # candidates fetched per chunk returned
+        # relevance cutoff, a query returns from 0 to top_k chunks (requests can override it)
+        self.query_max_distance: float = self._get_env_float("QUERY_MAX_DISTANCE", 0) # chunks farther from the prompt are dropped, 0 disables
+        self.query_relative_gap: float = self._get_env_float("QUERY_RELATIVE_GAP", 0) # cut at a jump of this fraction between neighbours, 0 disables
+
+        # startup warm-up and readiness
+        self.warmup_enabled: bool = self._get_env_bool("EMBEDDINGS_WARMUP", True)
+        self.warmup_rounds: int = self._get_env_int("EMBEDDINGS_WARMUP_ROUNDS", 2)
+        self.warmup_batch_size: int = self._get_env_int("EMBEDDINGS_WARMUP_BATCH_SIZE", 8)
+        self.warmup_text: str = os.getenv("EMBEDDINGS_WARMUP_TEXT", "This sentence is encoded at startup to warm up the model.")
+        self.retry_after_seconds: int = self._get_env_int("EMBEDDINGS_RETRY_AFTER", 5) # sent with 503 while not ready
+
     def _get_env_int(self, key: str, default: int) -> int:
         """Helper function to safely get an integer environment variable."""
         try:
@@ -41,5 +102,19 @@ class Settings:
         except ValueError:
             return default
 
+    def _get_env_float(self, key: str, default: float) -> float:
+        """Helper function to safely get a float environment variable."""
+        try:
+            return float(os.getenv(key, default))
+        except ValueError:
+            return default
+
+    def _get_env_bool(self, key: str, default: bool) -> bool:
+        """Helper function to safely get a boolean environment variable."""
+        value = os.getenv(key)
+        if value is None:
+            return default
+        return value.strip().lower() in ("1", "true", "yes", "on")
+
 # Instantiate settings object
 settings = Settings()
@@ -0,0 +1,94 @@
+"""
+dedup.py
+
+Removal of duplicate chunks during an ingest job, before they are encoded. Exact duplicates are
+found by a hash of the normalized text. Near duplicates (e.g. two versions of the same manual, or
+shared boilerplate) are found with MinHash signatures of word shingles: locality sensitive hashing
+over bands of the signature finds candidate chunks, which are dropped when their estimated
+Jaccard similarity reaches the threshold.
+"""
+
+import hashlib
+import re
+import zlib
+from typing import Dict, List, Set
+
+import numpy as np
+
+# Mersenne prime used by the universal hash functions of the MinHash permutations
+_PRIME = (1 << 61) - 1
+_WORD_RE = re.compile(r"\w+")
+
+
+class ChunkDeduplicator:
+    """Remembers the chunks kept so far in a job and filters out the duplicates of new ones."""
+
+    def __init__(self, near_threshold: float, shingle_size: int = 5, num_perm: int = 64, bands: int = 16, seed: int = 1) -> None:
+        self.near_threshold = near_threshold
+        self.shingle_size = max(shingle_size, 1)
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(seed)
+        # a < 2**31 and b < 2**32 keep a * x + b below 2**64 for 32-bit shingle hashes x
+        self._a = rng.integers(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._hashes: Set[bytes] = set()
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._signatures: List[np.ndarray] = []
+        self.exact_dropped: int = 0
+        self.near_dropped: int = 0
+
+    @property
+    def dropped(self) -> int:
+        return self.exact_dropped + self.near_dropped
+
+    def _signature(self, words: List[str]) -> np.ndarray:
+        """
+        MinHash signature of the word shingles of a chunk.
+        """
+        size = min(self.shingle_size, len(words))
+        shingles = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+        values = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        # (a * x + b) mod p for every permutation and shingle
+        hashed = (np.outer(self._a, values) + self._b[:, None]) % _PRIME
+        return hashed.min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def is_duplicate(self, chunk: str) -> bool:
+        """
+        Whether the chunk duplicates one already kept; if not, it is remembered as kept.
+        """
+        words = _WORD_RE.findall(chunk.lower())
+        digest = hashlib.sha1(" ".join(words).encode("utf-8")).digest()
+        if digest in self._hashes:
+            self.exact_dropped += 1
+            return True
+
+        if self.near_threshold > 0 and words:
+            signature = self._signature(words)
+            band_keys = self._band_keys(signature)
+            candidates: Set[int] = set()
+            for bucket, key in zip(self._buckets, band_keys):
+                candidates.update(bucket.get(key, ()))
+            for candidate in candidates:
+                if np.mean(self._signatures[candidate] == signature) >= self.near_threshold:
+                    self.near_dropped += 1
+                    return True
+            index = len(self._signatures)
+            self._signatures.append(signature)
+            for bucket, key in zip(self._buckets, band_keys):
+                bucket.setdefault(key, []).append(index)
+
+        self._hashes.add(digest)
+        return False
+
+    def filter(self, chunks: List[str]) -> List[int]:
+        """
+        Positions of the chunks that are not duplicates, in order.
+        """
+        return [position for position, chunk in enumerate(chunks) if not self.is_duplicate(chunk)]
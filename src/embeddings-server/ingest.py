@@ -0,0 +1,269 @@
+"""
+ingest.py
+
+Stages of the document ingestion pipeline used by the ingest jobs:
+loading the agent's files, chunking, encoding and storing the vectors in ChromaDB.
+Each stage is a separate function so it can be timed on its own (see benchmark.py).
+"""
+
+import hashlib
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from llama_index.core.text_splitter import SentenceSplitter, TokenTextSplitter
+from llama_index.core.readers.file.base import SimpleDirectoryReader
+
+from config import settings
+from vectorstore import is_collection_missing
+
+# Maximum number of chunks sent to ChromaDB in one call
+STORE_BATCH_SIZE = 1000
+
+# Chunking strategies: "token" splits on token counts only, "sentence" keeps sentences whole
+CHUNKING_STRATEGIES = ("token", "sentence")
+# Largest overlap accepted, as a fraction of the chunk size
+MAX_OVERLAP_RATIO = 0.25
+
+
+# ---------- Chunking Settings
+
+
+def chunking_limits(embedding_model: Any) -> Dict[str, int]:
+    """
+    Token limits of the embedding model. The special tokens the tokenizer adds ([CLS], [SEP], ...)
+    count against max_seq_length, so a chunk can use the rest without being truncated.
+    """
+    max_seq_length = embedding_model.max_seq_length
+    special_tokens = embedding_model.tokenizer.num_special_tokens_to_add(pair=False)
+    return {
+        "max_seq_length": max_seq_length,
+        "special_tokens": special_tokens,
+        "max_chunk_size": max_seq_length - special_tokens,
+    }
+
+
+def resolve_chunking(embedding_model: Any, chunking: Dict[str, Any], strict: bool = True) -> Dict[str, Any]:
+    """
+    Complete an agent's chunking settings with the defaults and check them against the model.
+
+    Chunk sizes are counted with the model's own tokenizer. With strict=True settings the model
+    would truncate (or an excessive overlap) raise ValueError; otherwise they are clamped, which is
+    what ingest jobs do with settings saved for a previous model.
+    """
+    max_chunk_size = chunking_limits(embedding_model)["max_chunk_size"]
+
+    chunk_size = chunking.get("chunk_size") or settings.chunk_size or max_chunk_size
+    chunk_size = int(chunk_size)
+    if chunk_size > max_chunk_size or chunk_size < 16:
+        if strict:
+            raise ValueError(
+                f"chunk_size must be between 16 and {max_chunk_size} tokens for {settings.embedding_model_name}"
+            )
+        chunk_size = min(max(chunk_size, 16), max_chunk_size)
+
+    chunk_overlap = chunking.get("chunk_overlap")
+    if chunk_overlap is None:
+        chunk_overlap = chunk_size * settings.chunk_overlap_percent // 100
+    chunk_overlap = int(chunk_overlap)
+    max_overlap = int(chunk_size * MAX_OVERLAP_RATIO)
+    if chunk_overlap < 0 or chunk_overlap > max_overlap:
+        if strict:
+            raise ValueError(f"chunk_overlap must be between 0 and {max_overlap} tokens for a chunk_size of {chunk_size}")
+        chunk_overlap = min(max(chunk_overlap, 0), max_overlap)
+
+    strategy = chunking.get("strategy") or settings.chunk_strategy
+    if strategy not in CHUNKING_STRATEGIES:
+        if strict:
+            raise ValueError(f"strategy must be one of {', '.join(CHUNKING_STRATEGIES)}")
+        strategy = CHUNKING_STRATEGIES[0]
+
+    return {"chunk_size": chunk_size, "chunk_overlap": chunk_overlap, "strategy": strategy}
+
+
+def make_text_splitter(embedding_model: Any, chunking: Dict[str, Any]) -> Any:
+    """
+    Text splitter for resolved chunking settings, counting tokens with the model's tokenizer.
+    """
+    tokenizer = embedding_model.tokenizer
+
+    def tokenize(text: str) -> List[int]:
+        return tokenizer.encode(text, add_special_tokens=False)
+
+    splitter_class = SentenceSplitter if chunking["strategy"] == "sentence" else TokenTextSplitter
+    return splitter_class(
+        chunk_size=chunking["chunk_size"],
+        chunk_overlap=chunking["chunk_overlap"],
+        tokenizer=tokenize,
+    )
+
+
+# ---------- Pipeline Stages
+
+
+def list_files(agent_dir: str) -> List[str]:
+    """
+    Sorted names of the files to ingest in the agent's directory (hidden files are skipped).
+    """
+    return sorted(
+        name for name in os.listdir(agent_dir)
+        if not name.startswith(".") and os.path.isfile(os.path.join(agent_dir, name))
+    )
+
+
+def load_file(file_path: str) -> List[Any]:
+    """
+    Load the documents of a single file (a PDF gives one document per page).
+    """
+    directory_reader = SimpleDirectoryReader(input_files=[file_path])
+    return directory_reader.load_data()
+
+
+def chunk_documents(documents: List[Any], text_splitter: Any) -> List[str]:
+    """
+    Chunk documents with overlap using the agent's text splitter (see make_text_splitter).
+    """
+    return chunk_documents_with_offsets(documents, text_splitter)[0]
+
+
+def find_chunk(text: str, chunk: str, start: int = 0) -> Tuple[int, int]:
+    """
+    Span (start, end) of a chunk in the text, searched from start, or (-1, -1) if it is not found.
+    Splitters may re-join the pieces they split on newlines or runs of spaces with a single space,
+    so a chunk that is not a slice of the text is matched with any whitespace between its words.
+    """
+    offset = text.find(chunk, start)
+    if offset >= 0:
+        return offset, offset + len(chunk)
+    words = chunk.split()
+    if not words:
+        return -1, -1
+    match = re.compile(r"\s+".join(re.escape(word) for word in words)).search(text, start)
+    return (match.start(), match.end()) if match else (-1, -1)
+
+
+def chunk_documents_with_offsets(documents: List[Any], text_splitter: Any) -> Tuple[List[str], List[Tuple[int, int]]]:
+    """
+    Chunk documents like chunk_documents and also return where each chunk starts:
+    (index of the document in the file, e.g. the PDF page, character offset in its text).
+    Each chunk is searched after the start of the previous one (see find_chunk). A chunk matched
+    with different whitespace is replaced by the slice of the text it covers, so the offsets always
+    describe the stored chunk; the offset is -1 if it is not found at all.
+    """
+    chunked_documents: List[str] = []
+    offsets: List[Tuple[int, int]] = []
+    for doc_index, doc in enumerate(documents):
+        start = 0
+        for chunk in text_splitter.split_text(doc.text):
+            offset, end = find_chunk(doc.text, chunk, start)
+            if offset >= 0:
+                start = offset + 1
+                chunk = doc.text[offset:end]
+            chunked_documents.append(chunk)
+            offsets.append((doc_index, offset))
+    return chunked_documents, offsets
+
+
+def encode_chunks(embedding_model: Any, chunks: List[str]) -> List[Any]:
+    """
+    Generate embeddings for each chunk using the Hugging Face model.
+    """
+    embeddings = []
+    for chunk in chunks:
+        vector = embedding_model.encode(chunk)
+        embeddings.append(vector)
+    return embeddings
+
+
+def staging_collection_name(collection_name: str, job_id: int) -> str:
+    """
+    Name of the collection an ingest job builds before it replaces the live one.
+    """
+    return f"{collection_name}_job{job_id}"
+
+
+def store_file_chunks(
+    collection: Any,
+    file_no: int,
+    file_name: str,
+    chunks: List[str],
+    embeddings: List[Any],
+    positions: Optional[List[int]] = None,
+    offsets: Optional[List[Tuple[int, int]]] = None,
+) -> None:
+    """
+    Add the chunks of one file to the collection with their source: file name, position of the
+    chunk in the file, hash of its content and, when known, its document and character offsets
+    (see chunk_documents_with_offsets). Ids are derived from the file and the position so
+    re-running an interrupted file overwrites its partial chunks instead of duplicating them.
+    """
+    if positions is None:
+        positions = list(range(len(chunks)))
+    if offsets is None:
+        offsets = [(-1, -1)] * len(chunks)
+    for start in range(0, len(chunks), STORE_BATCH_SIZE):
+        end = start + STORE_BATCH_SIZE
+        collection.upsert(
+            documents=chunks[start:end],
+            embeddings=[embedding.tolist() for embedding in embeddings[start:end]],
+            metadatas=[
+                {
+                    "file_name": file_name,
+                    "chunk_index": position,
+                    "content_hash": hashlib.sha1(chunk.encode("utf-8")).hexdigest(),
+                    "document_index": doc_index,
+                    "start_char": start_char,
+                    "end_char": start_char + len(chunk) if start_char >= 0 else -1,
+                }
+                for chunk, position, (doc_index, start_char) in zip(
+                    chunks[start:end], positions[start:end], offsets[start:end]
+                )
+            ],
+            ids=[f"doc_{file_no}_chunk_{position}" for position in positions[start:end]],
+        )
+
+
+def delete_file_chunks(collection: Any, file_name: str) -> int:
+    """
+    Delete the chunks of a file from the collection and return how many were deleted.
+    """
+    ids = collection.get(where={"file_name": file_name}, include=[])["ids"]
+    if ids:
+        collection.delete(ids=ids)
+    return len(ids)
+
+
+def drop_collection(client: Any, collection_name: str) -> None:
+    """
+    Delete a collection if it exists.
+    """
+    try:
+        client.delete_collection(collection_name)
+    except ValueError:
+        pass
+
+
+def publish_collection(client: Any, staging_name: str, collection_name: str) -> None:
+    """
+    Replace the live collection with the fully built staging collection. The live collection is
+    moved aside and only dropped once the staging one took its name, so queries can only miss it
+    between the two renames, not for the whole deletion. It is put back if the rename fails.
+    """
+    retired_name = f"{staging_name}_old"
+    # left over by a publish interrupted after the live collection was moved aside
+    drop_collection(client, retired_name)
+    try:
+        client.get_collection(collection_name).modify(name=retired_name)
+        retired = True
+    except Exception as e:
+        if not is_collection_missing(e):
+            raise
+        retired = False
+    try:
+        client.get_collection(staging_name).modify(name=collection_name)
+    except Exception:
+        if retired:
+            client.get_collection(retired_name).modify(name=collection_name)
+        raise
+    if retired:
+        drop_collection(client, retired_name)
@@ -0,0 +1,509 @@
+"""
+jobs.py
+
+Persistent ingest jobs in SQLite. Each /generate request creates a job with the list of files to
+ingest; the progress of every file is checkpointed so an interrupted job resumes from the last
+committed file instead of starting over. The notification of the api-server is tracked in the same
+table so it is retried until it succeeds. The chunking settings of each agent and the state of the
+store (e.g. the embedding model it was last built with) are kept in the same database.
+"""
+
+import os
+import sqlite3
+import time
+from sqlite3 import Connection, Cursor
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import settings
+
+# job statuses
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SUPERSEDED = "superseded"
+
+# job kinds: an ingest asked for by the api-server, or a re-embed after a change of embedding model
+# (run after the ingest jobs, throttled)
+INGEST = "ingest"
+REEMBED = "reembed"
+
+# notification statuses
+NOTIFY_PENDING = "pending"
+NOTIFY_DONE = "done"
+
+JOB_COLUMNS = (
+    "id, agent_name, kind, status, attempts, error, owner, total_files, files_done, chunks, chunks_dropped, "
+    "notify_status, notify_attempts, next_notify_on, created_on, updated_on, started_on, finished_on"
+)
+
+
+# ---------- Internal Methods
+
+
+def _get_db_connection() -> Tuple[Connection, Cursor]:
+    """
+    Get a database connection and cursor.
+    Ensures the jobs tables are created if they do not exist.
+    """
+    conn: Connection = sqlite3.connect(settings.jobs_database_url, timeout=30)
+    cursor: Cursor = conn.cursor()
+    _create_tables(cursor)
+    return conn, cursor
+
+
+def _create_tables(cursor: Cursor) -> None:
+    """
+    Create the jobs, job_files, agent_chunking and store_info tables if they do not exist.
+    """
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            agent_name TEXT,
+            kind TEXT DEFAULT 'ingest',
+            status TEXT,
+            attempts INTEGER DEFAULT 0,
+            error TEXT,
+            owner TEXT,
+            total_files INTEGER DEFAULT 0,
+            files_done INTEGER DEFAULT 0,
+            chunks INTEGER DEFAULT 0,
+            chunks_dropped INTEGER DEFAULT 0,
+            notify_status TEXT DEFAULT '',
+            notify_attempts INTEGER DEFAULT 0,
+            next_notify_on INTEGER DEFAULT 0,
+            created_on INTEGER,
+            updated_on INTEGER,
+            started_on INTEGER,
+            finished_on INTEGER
+        )
+    """
+    )
+    # columns added after the table was first created
+    _add_missing_columns(cursor, "jobs", {"chunks_dropped": "INTEGER DEFAULT 0", "kind": "TEXT DEFAULT 'ingest'"})
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)"
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_jobs_notify ON jobs (notify_status, next_notify_on)"
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS job_files (
+            job_id INTEGER,
+            file_no INTEGER,
+            file_name TEXT,
+            status TEXT DEFAULT '',
+            chunks INTEGER DEFAULT 0,
+            updated_on INTEGER,
+            PRIMARY KEY (job_id, file_no)
+        )
+    """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS agent_chunking (
+            agent_name TEXT PRIMARY KEY,
+            chunk_size INTEGER,
+            chunk_overlap INTEGER,
+            strategy TEXT,
+            updated_on INTEGER
+        )
+    """
+    )
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS store_info (
+            key TEXT PRIMARY KEY,
+            value TEXT,
+            updated_on INTEGER
+        )
+    """
+    )
+
+
+def _add_missing_columns(cursor: Cursor, table: str, columns: Dict[str, str]) -> None:
+    """
+    Add the given columns (name: definition) to an existing table that does not have them yet.
+    """
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, definition in columns.items():
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+
+def _row_to_job(row: tuple) -> Dict[str, Any]:
+    return dict(zip([c.strip() for c in JOB_COLUMNS.split(",")], row))
+
+
+# ---------- Methods for Job Operations
+
+
+def create_job(agent_name: str, resume: bool = False, kind: str = INGEST) -> Dict[str, Any]:
+    """
+    Queue an ingest job for the agent.
+
+    A queued job for the same agent is reused since it will pick up the latest files when it runs
+    (a queued re-embed job reused by an ingest becomes an ingest); a running one is superseded by
+    the new job and ends without publishing. With resume=True, and for re-embed jobs, any active
+    (queued or running) job is reused instead of creating a new one.
+    """
+    conn, cursor = _get_db_connection()
+    try:
+        statuses = (QUEUED, RUNNING) if resume or kind == REEMBED else (QUEUED,)
+        cursor.execute(
+            f"SELECT {JOB_COLUMNS} FROM jobs WHERE agent_name = ? AND status IN ({','.join('?' * len(statuses))}) ORDER BY id LIMIT 1",
+            (agent_name, *statuses),
+        )
+        row = cursor.fetchone()
+        if row is not None:
+            job = _row_to_job(row)
+            if kind == INGEST and job["kind"] == REEMBED and job["status"] == QUEUED:
+                cursor.execute("UPDATE jobs SET kind = ? WHERE id = ?", (INGEST, job["id"]))
+                conn.commit()
+                job["kind"] = INGEST
+            return job
+
+        now = int(time.time())
+        cursor.execute(
+            "INSERT INTO jobs (agent_name, kind, status, created_on, updated_on) VALUES (?, ?, ?, ?, ?)",
+            (agent_name, kind, QUEUED, now, now),
+        )
+        conn.commit()
+        return get_job(cursor.lastrowid)
+    finally:
+        conn.close()
+
+
+def get_job(job_id: int) -> Optional[Dict[str, Any]]:
+    conn, cursor = _get_db_connection()
+    try:
+        cursor.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,))
+        row = cursor.fetchone()
+        return _row_to_job(row) if row else None
+    finally:
+        conn.close()
+
+
+def get_jobs(agent_name: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+    conn, cursor = _get_db_connection()
+    try:
+        if agent_name:
+            cursor.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs WHERE agent_name = ? ORDER BY id DESC LIMIT ?",
+                (agent_name, limit),
+            )
+        else:
+            cursor.execute(f"SELECT {JOB_COLUMNS} FROM jobs ORDER BY id DESC LIMIT ?", (limit,))
+        return [_row_to_job(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def get_last_done_job(agent_name: str) -> Optional[Dict[str, Any]]:
+    """
+    The last job that published the agent's collection, None if there is none.
+    """
+    conn, cursor = _get_db_connection()
+    try:
+        cursor.execute(
+            f"SELECT {JOB_COLUMNS} FROM jobs WHERE agent_name = ? AND status = ? ORDER BY id DESC LIMIT 1",
+            (agent_name, DONE),
+        )
+        row = cursor.fetchone()
+        return _row_to_job(row) if row else None
+    finally:
+        conn.close()
+
+
+def _is_abandoned(owner: Optional[str], me: str, updated_on: int, stale_before: int) -> bool:
+    """
+    Whether a running job was left behind by a worker that is no longer running it:
+    the same worker after a restart, a dead process on this host, or no heartbeat for too long.
+    """
+    if owner is None or owner == me or updated_on < stale_before:
+        return True
+    host, _, pid = owner.rpartition(":")
+    if host == me.rpartition(":")[0] and pid.isdigit():
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            return False
+    return False
+
+
+def claim_next_job(owner: str, stale_seconds: int) -> Optional[Dict[str, Any]]:
+    """
+    Claim the oldest job to run: a running one abandoned by a stopped worker (so it resumes first),
+    otherwise a queued one for an agent that no other worker is ingesting, ingests before re-embeds.
+    """
+    conn, cursor = _get_db_connection()
+    try:
+        now = int(time.time())
+        stale_before = now - stale_seconds
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(
+            f"SELECT {JOB_COLUMNS} FROM jobs WHERE status IN (?, ?) ORDER BY id",
+            (QUEUED, RUNNING),
+        )
+        active = [_row_to_job(row) for row in cursor.fetchall()]
+        abandoned = [
+            job for job in active
+            if job["status"] == RUNNING and _is_abandoned(job["owner"], owner, job["updated_on"], stale_before)
+        ]
+        busy_agents = {
+            job["agent_name"] for job in active if job["status"] == RUNNING and job not in abandoned
+        }
+        queued = [job for job in active if job["status"] == QUEUED and job["agent_name"] not in busy_agents]
+        queued.sort(key=lambda job: job["kind"] == REEMBED)
+        candidates = abandoned or queued
+        if not candidates:
+            conn.rollback()
+            return None
+        job = candidates[0]
+        cursor.execute(
+            """
+            UPDATE jobs SET status = ?, owner = ?, attempts = attempts + 1,
+                started_on = COALESCE(started_on, ?), updated_on = ?
+            WHERE id = ?
+        """,
+            (RUNNING, owner, now, now, job["id"]),
+        )
+        conn.commit()
+        return get_job(job["id"])
+    finally:
+        conn.close()
+
+
+def has_newer_job(agent_name: str, job_id: int) -> bool:
+    """
+    Whether a newer job is queued for the agent (which makes this one redundant).
+    """
+    conn, cursor = _get_db_connection()
+    try:
+        cursor.execute(
+            "SELECT COUNT(1) FROM jobs WHERE agent_name = ? AND id > ? AND status = ?",
+            (agent_name, job_id, QUEUED),
+        )
+        return cursor.fetchone()[0] > 0
+    finally:
+        conn.close()
+
+
+def has_running_job(agent_name: str) -> bool:
+    """
+    Whether a job of the agent is running (its collection may be briefly missing while published).
+    """
+    conn, cursor = _get_db_connection()
+    try:
+        cursor.execute(
+            "SELECT COUNT(1) FROM jobs WHERE agent_name = ? AND status = ?",
+            (agent_name, RUNNING),
+        )
+        return cursor.fetchone()[0] > 0
+    finally:
+        conn.close()
+
+
+def get_job_files(job_id: int) -> List[Dict[str, Any]]:
+    conn, cursor = _get_db_connection()
+    try:
+        cursor.execute(
+            "SELECT file_no, file_name, status, chunks FROM job_files WHERE job_id = ? ORDER BY file_no",
+            (job_id,),
+        )
+        return [
+            {"file_no": row[0], "file_name": row[1], "status": row[2], "chunks": row[3]}
+            for row in cursor.fetchall()
+        ]
+    finally:
+        conn.close()
+
+
+def set_job_files(job_id: int, file_names: List[str]) -> None:
+    """
+    Record the snapshot of files the job has to ingest (only done once per job).
+    """
+    conn, cursor = _get_db_connection()
+    try:
+        now = int(time.time())
+        cursor.executemany(
+            "INSERT OR IGNORE INTO job_files (job_id, file_no, file_name, updated_on) VALUES (?, ?, ?, ?)",
+            [(job_id, i, name, now) for i, name in enumerate(file_names)],
+        )
+        cursor.execute(
+            "UPDATE jobs SET total_files = ?, updated_on = ? WHERE id = ?",
+            (len(file_names), now, job_id),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def reset_job_files(job_id: int) -> None:
+    """
+    Forget the files committed by the job, which then ingests all of them again
+    (its staging collection was built with another embedding model).
+    """
+    conn, cursor = _get_db_connection()
+    try:
+        now = int(time.time())
+        cursor.execute(
+            "UPDATE job_files SET status = '', chunks = 0, updated_on = ? WHERE job_id = ?",
+            (now, job_id),
+        )
+        cursor.execute(
+            "UPDATE jobs SET files_done = 0, chunks = 0, chunks_dropped = 0, updated_on = ? WHERE id = ?",
+            (now, job_id),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def checkpoint_file(job_id: int, file_no: int, chunks: int, status: str = DONE, chunks_dropped: int = 0) -> None:
+    """
+    Mark a file as committed to the store (or FAILED when it could not be parsed, so it is not
+    retried when the job resumes) and update the job's progress, including the number of
+    duplicate chunks dropped.
+    """
+    conn, cursor = _get_db_connection()
+    try:
+        now = int(time.time())
+        cursor.execute(
+            "UPDATE job_files SET status = ?, chunks = ?, updated_on = ? WHERE job_id = ? AND file_no = ?",
+            (status, chunks, now, job_id, file_no),
+        )
+        cursor.execute(
+            """
+            UPDATE jobs SET files_done = files_done + 1, chunks = chunks + ?,
+                chunks_dropped = chunks_dropped + ?, updated_on = ?
+            WHERE id = ?
+        """,
+            (chunks, chunks_dropped, now, job_id),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def finish_job(job_id: int, status: str, error: Optional[str] = None) -> None:
+    """
+    Set the final (or retry) status of a job. Final statuses queue the api-server notification.
+    """
+    conn, cursor = _get_db_connection()
+    try:
+        now = int(time.time())
+        final = status in (DONE, FAILED)
+        cursor.execute(
+            """
+            UPDATE jobs SET status = ?, error = ?, updated_on = ?,
+                finished_on = CASE WHEN ? THEN ? ELSE finished_on END,
+                notify_status = CASE WHEN ? THEN ? ELSE notify_status END,
+                next_notify_on = ?
+            WHERE id = ?
+        """,
+            (status, error, now, final, now, final, NOTIFY_PENDING, now, job_id),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_pending_notifications() -> List[Dict[str, Any]]:
+    conn, cursor = _get_db_connection()
+    try:
+        cursor.execute(
+            f"SELECT {JOB_COLUMNS} FROM jobs WHERE notify_status = ? AND next_notify_on <= ? ORDER BY id",
+            (NOTIFY_PENDING, int(time.time())),
+        )
+        return [_row_to_job(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+
+def set_notification_result(job_id: int, success: bool, retry_in: int = 0) -> None:
+    conn, cursor = _get_db_connection()
+    try:
+        now = int(time.time())
+        if success:
+            cursor.execute(
+                "UPDATE jobs SET notify_status = ?, updated_on = ? WHERE id = ?",
+                (NOTIFY_DONE, now, job_id),
+            )
+        else:
+            cursor.execute(
+                """
+                UPDATE jobs SET notify_attempts = notify_attempts + 1, next_notify_on = ?, updated_on = ?
+                WHERE id = ?
+            """,
+                (now + retry_in, now, job_id),
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# ---------- Methods for Chunking Settings
+
+
+def get_chunking_settings(agent_name: str) -> Dict[str, Any]:
+    """
+    The chunking settings saved for the agent (empty if it uses the defaults).
+    """
+    conn, cursor = _get_db_connection()
+    try:
+        cursor.execute(
+            "SELECT chunk_size, chunk_overlap, strategy FROM agent_chunking WHERE agent_name = ?",
+            (agent_name,),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return {}
+        return {"chunk_size": row[0], "chunk_overlap": row[1], "strategy": row[2]}
+    finally:
+        conn.close()
+
+
+def save_chunking_settings(agent_name: str, chunking: Dict[str, Any]) -> None:
+    conn, cursor = _get_db_connection()
+    try:
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO agent_chunking (agent_name, chunk_size, chunk_overlap, strategy, updated_on)
+            VALUES (?, ?, ?, ?, ?)
+        """,
+            (agent_name, chunking["chunk_size"], chunking["chunk_overlap"], chunking["strategy"], int(time.time())),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# ---------- Methods for the Store State
+
+
+def get_store_info(key: str) -> Optional[str]:
+    conn, cursor = _get_db_connection()
+    try:
+        cursor.execute("SELECT value FROM store_info WHERE key = ?", (key,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    finally:
+        conn.close()
+
+
+def set_store_info(key: str, value: str) -> None:
+    conn, cursor = _get_db_connection()
+    try:
+        cursor.execute(
+            "INSERT OR REPLACE INTO store_info (key, value, updated_on) VALUES (?, ?, ?)",
+            (key, value, int(time.time())),
+        )
+        conn.commit()
+    finally:
+        conn.close()
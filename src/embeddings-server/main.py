@@ -1,45 +1,36 @@
 import os
 from fastapi import FastAPI, HTTPException, Request, Body, Header
 from starlette.datastructures import Headers
-from llama_index.core.text_splitter import TokenTextSplitter
-from llama_index.core.readers.file.base import SimpleDirectoryReader
-from sentence_transformers import SentenceTransformer
-import chromadb
-import httpx
-import asyncio
-from typing import Optional
+from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from config import settings
+from resources import resources
+from worker import ingest_worker
+from textcache import text_cache
+from rerank import mmr_select, relevance_cutoff
+from collection_cache import collection_cache, collection_name, collection_model
+from vectorstore import chroma_index_metrics
+import jobs
 
-# Initialize FastAPI app
-app = FastAPI()
-
-# Initialize the Hugging Face embedding model
-embedding_model = SentenceTransformer(model_name_or_path=settings.embedding_model_name, cache_folder=settings.models_dir, token=settings.hf_api_token)
 
-# Initialize the ChromaDB client
-client = chromadb.PersistentClient(path=settings.store_dir)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the embedding model and the ChromaDB client in the background
+    # so that the liveness probe answers while the model is loading
+    resources.start()
+    # The ingestion stack (llama_index readers and splitters) is only imported by ingest replicas
+    if settings.ingest_enabled:
+        import ingest  # noqa: F401
+        # Run the persistent ingest jobs, resuming the ones interrupted by a restart
+        ingest_worker.start()
+    yield
+    if settings.ingest_enabled:
+        ingest_worker.stop()
 
-# Helper function to notify app server
-async def notify_app_server(agent_name: str):
-    url = f"http://{settings.api_server}:{settings.api_server_port}/api/agents/{agent_name}/update-embeddings-status"
-    
-    headers = {
-        "X-Requested-With": "XteNATqxnbBkPa6TCHcK0NTxOM1JVkQl"
-    }
-    
-    try:
-        async with httpx.AsyncClient() as client:
-            # Making the async POST request without body
-            response = await client.post(url, headers=headers)
-            
-            # Optionally, check the response
-            if response.status_code == 200:
-                print(f"Successfully notified app-server for agent {agent_name}")
-            else:
-                print(f"Failed to notify app-server: {response.status_code}")
-    except Exception as e:
-        print(e)
+# Initialize FastAPI app
+app = FastAPI(lifespan=lifespan)
 
 def verify_x_api_key(headers: Headers) -> str:
     """
@@ -74,8 +65,8 @@ def verify_x_api_key(headers: Headers) -> str:
     return x_api_key
 
 
-# Step 1: /generate endpoint to process and store embeddings
-@app.post("/generate")
+# Step 1: /generate endpoint to queue an ingest job that processes and stores the embeddings
+# (registered below only when the role includes ingest)
 async def generate_embeddings(request: Request, body: dict = Body(...)):
     agent_name = body.get("agent_name")
     agent_dir = os.path.join(settings.agents_dir, agent_name)
@@ -87,78 +78,307 @@ async def generate_embeddings(request: Request, body: dict = Body(...)):
         # Validate the API key in the request header
         verify_x_api_key(headers=request.headers)
 
-        # Step 1: Load the documents from the agent's directory
-        directory_reader = SimpleDirectoryReader(agent_dir)
-        documents = directory_reader.load_data()
-
-        # Step 2: Chunk documents with overlap (ignoring sentence/chapter boundaries)
-        text_splitter = TokenTextSplitter(chunk_size=512, chunk_overlap=50)
-        chunked_documents = []
-        for doc in documents:
-            chunks = text_splitter.split_text(doc.text)
-            chunked_documents.extend(chunks)
-
-        # Step 3: Generate embeddings for each chunk using the Hugging Face model
-        embeddings = []
-        for chunk in chunked_documents:
-            vector = embedding_model.encode(chunk)
-            embeddings.append(vector)
-
-        # Step 4: Store the embeddings in ChromaDB
-        collection_name = f"agent_{agent_name}"
-        # Step 5: delete the collection
-        client.delete_collection(collection_name)
-        # Step 6: Use get_or_create_collection to manage the collection
-        collection = client.get_or_create_collection(name=collection_name)
-        # Step 7: Add each chunk with its embedding into ChromaDB
-        for i, chunk in enumerate(chunked_documents):
-            document_id = f"doc_chunk_{i}"
-            collection.add(
-                documents=[chunk],       # Chunked document text
-                embeddings=[embeddings[i].tolist()],  # Embedding vector
-                ids=[document_id]        # Unique ID for each chunk
-            )
-
-        # call app server as an async function
-        asyncio.create_task(notify_app_server(agent_name))
+        # The job is persisted and run by the ingest worker; with resume an active job is reused
+        job = jobs.create_job(agent_name, resume=bool(body.get("resume", False)))
 
-        return {"message": f"Embeddings generated and stored for agent {agent_name}"}
+        return {"message": f"Embeddings generation queued for agent {agent_name}", "job": job}
 
     except Exception as e:
         raise HTTPException(
             status_code=getattr(e, "status_code", 500),
             detail=getattr(e, "detail", str(e)),
+            headers=getattr(e, "headers", None),
         )
 
-# Step 2: /query endpoint to retrieve document chunks based on a prompt
-@app.post("/query")
-async def query_embeddings(request: Request, agent_name: str = Body(), prompt: str = Body(), top_k: int = Body(5)): # top_k defaults to 5
+
+# /jobs endpoints to follow the ingest jobs
+# (registered below only when the role includes ingest)
+async def list_jobs(request: Request, agent_name: Optional[str] = None, limit: int = 20):
+    verify_x_api_key(headers=request.headers)
+    return {"jobs": jobs.get_jobs(agent_name, limit)}
+
+
+async def get_job(request: Request, job_id: int):
+    verify_x_api_key(headers=request.headers)
+    job = jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return {
+        "job": job,
+        "progress": ingest_worker.progress.get(job_id),
+        "files": jobs.get_job_files(job_id),
+    }
+
+
+# /agents/{agent_name}/chunking endpoints to read and set the chunking of an agent
+# (registered below only when the role includes ingest)
+CHUNKING_KEYS = ("chunk_size", "chunk_overlap", "strategy")
+
+
+async def get_agent_chunking(request: Request, agent_name: str):
+    verify_x_api_key(headers=request.headers)
+    from ingest import chunking_limits, resolve_chunking
+
+    embedding_model, _ = resources.require()
+    saved = jobs.get_chunking_settings(agent_name)
+    return {
+        "agent_name": agent_name,
+        "saved": saved,
+        "chunking": resolve_chunking(embedding_model, saved, strict=False),
+        "limits": chunking_limits(embedding_model),
+    }
+
+
+async def set_agent_chunking(request: Request, agent_name: str, body: dict = Body(...)):
+    """
+    Validate and save the agent's chunking settings. Missing values keep following the defaults.
+    The agent's files have to be ingested again for the settings to apply.
+    """
+    verify_x_api_key(headers=request.headers)
+    from ingest import chunking_limits, resolve_chunking
+
+    embedding_model, _ = resources.require()
+    saved = {key: body.get(key) for key in CHUNKING_KEYS}
+    try:
+        chunking = resolve_chunking(embedding_model, saved)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    jobs.save_chunking_settings(agent_name, saved)
+    return {
+        "agent_name": agent_name,
+        "saved": saved,
+        "chunking": chunking,
+        "limits": chunking_limits(embedding_model),
+    }
+
+
+# /agents/{agent_name}/files/{file_name}/chunks endpoint to delete the chunks of one file
+# (registered below only when the role includes ingest)
+async def delete_agent_file_chunks(request: Request, agent_name: str, file_name: str):
+    verify_x_api_key(headers=request.headers)
+    from ingest import delete_file_chunks
+
+    _, client = resources.require()
+    # with deduplication, a chunk of this file may be the only copy kept of a chunk of another file,
+    # so the chunks of one file can only be deleted if the agent was ingested without dropping any
+    last_job = jobs.get_last_done_job(agent_name)
+    if last_job is None:
+        raise HTTPException(
+            status_code=409,
+            detail=f"No completed ingest job on record for agent {agent_name}, it must be ingested again",
+        )
+    if last_job["chunks_dropped"]:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Duplicate chunks were dropped when ingesting agent {agent_name}, it must be ingested again",
+        )
+    try:
+        deleted = collection_cache.run(client, agent_name, lambda collection: delete_file_chunks(collection, file_name))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting the chunks of {file_name}: {str(e)}")
+    return {"agent_name": agent_name, "file_name": file_name, "deleted": deleted}
+
+
+# /agents/{agent_name} endpoint to delete the embeddings of an agent
+# (registered below only when the role includes ingest)
+async def delete_agent_embeddings(request: Request, agent_name: str):
+    verify_x_api_key(headers=request.headers)
+    from ingest import drop_collection
+
+    _, client = resources.require()
+    drop_collection(client, collection_name(agent_name))
+    collection_cache.invalidate(agent_name)
+    return {"agent_name": agent_name, "deleted": True}
+
+
+# /text-cache endpoint to report the size and the hit rate of the extracted-text cache
+# (registered below only when the role includes ingest)
+async def get_text_cache_stats(request: Request):
+    verify_x_api_key(headers=request.headers)
+    return {"text_cache": text_cache.stats()}
+
+def file_filter(files: Optional[List[str]]) -> Optional[Dict[str, Any]]:
+    """
+    ChromaDB where clause limiting a query to the chunks of the given files (None for all files).
+    """
+    if not files:
+        return None
+    if len(files) == 1:
+        return {"file_name": files[0]}
+    return {"file_name": {"$in": list(files)}}
+
+
+def citations(metadatas: List[Optional[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Source of each retrieved chunk: file, position in the file, content hash and where it starts
+    and ends in the text of the file's document_index-th document (-1 when unknown).
+    Chunks stored before the source was recorded have none.
+    """
+    keys = ("file_name", "chunk_index", "content_hash", "document_index", "start_char", "end_char")
+    return [{key: (metadata or {}).get(key) for key in keys} for metadata in metadatas]
+
+
+def resolve_mmr(mmr: Optional[bool], mmr_lambda: Optional[float]) -> Tuple[bool, float]:
+    """
+    Re-ranking of a query: the request's values, or the configured ones.
+    """
+    try:
+        mmr_lambda = settings.query_mmr_lambda if mmr_lambda is None else float(mmr_lambda)
+    except (TypeError, ValueError):
+        mmr_lambda = -1.0
+    if not 0 <= mmr_lambda <= 1:
+        raise HTTPException(status_code=422, detail="mmr_lambda must be between 0 and 1")
+    return (settings.query_mmr_enabled if mmr is None else bool(mmr)), mmr_lambda
+
+
+def resolve_cutoff(max_distance: Optional[float], relative_gap: Optional[float]) -> Tuple[float, float]:
+    """
+    Relevance cutoff of a query: the request's values, or the configured ones.
+    """
+    try:
+        max_distance = settings.query_max_distance if max_distance is None else float(max_distance)
+        relative_gap = settings.query_relative_gap if relative_gap is None else float(relative_gap)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=422, detail="max_distance and relative_gap must be numbers")
+    return max_distance, relative_gap
+
+
+def token_counter(embedding_model: Any) -> Callable[[str], int]:
+    """
+    Count the tokens of a text with the embedding model's tokenizer.
+    """
+    return lambda text: len(embedding_model.tokenizer.encode(text, add_special_tokens=False))
+
+
+def query_collection(
+    collection: Any,
+    prompt_embeddings: List[Any],
+    top_ks: List[int],
+    files: Optional[List[str]] = None,
+    mmr: bool = False,
+    mmr_lambda: float = 0.5,
+    cutoffs: Optional[List[Tuple[float, float]]] = None,
+    count_tokens: Optional[Callable[[str], int]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Retrieve the chunks of each prompt in one vector search, fetching the largest top_k asked for.
+    The candidates past the relevance cutoff (max_distance, relative_gap) of the prompt are dropped.
+    With mmr, more candidates are fetched and the top_k are picked among them for diversity.
+    Each row also reports how many of the top_k nearest chunks the cutoff dropped and their tokens.
+    """
+    n_results = max(top_ks)
+    include = ["documents", "metadatas", "distances"]
+    if mmr:
+        n_results *= max(settings.query_mmr_candidates, 1)
+        include.append("embeddings")
+    results = collection.query(
+        query_embeddings=[embedding.tolist() for embedding in prompt_embeddings],
+        n_results=n_results,
+        where=file_filter(files),
+        include=include,
+    )
+
+    rows: List[Dict[str, Any]] = []
+    for i, top_k in enumerate(top_ks):
+        documents = results["documents"][i]
+        metadatas = results["metadatas"][i]
+        distances = results["distances"][i]
+        max_distance, relative_gap = cutoffs[i] if cutoffs else (settings.query_max_distance, settings.query_relative_gap)
+        kept = relevance_cutoff(distances, max_distance, relative_gap)
+        if mmr:
+            order = mmr_select(prompt_embeddings[i], results["embeddings"][i][:kept], top_k, mmr_lambda)
+        else:
+            order = list(range(min(top_k, kept)))
+        dropped = list(range(kept, min(top_k, len(documents))))
+        rows.append({
+            "results": [[documents[j] for j in order]],
+            "citations": [citations([metadatas[j] for j in order])],
+            "distances": [[distances[j] for j in order]],
+            "dropped": len(dropped),
+            "dropped_tokens": sum(count_tokens(documents[j]) for j in dropped) if count_tokens else 0,
+        })
+    return rows
+
+
+def query_with_collection_model(
+    collection: Any,
+    prompts: List[str],
+    prompt_embeddings: List[Any],
+    encoded_with: str,
+    top_ks: List[int],
+    files: Optional[List[str]] = None,
+    mmr: bool = False,
+    mmr_lambda: float = 0.5,
+    cutoffs: Optional[List[Tuple[float, float]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    query_collection with the prompts encoded by the embedding model that built the collection.
+    The callers encode the prompts with the model of the collection they looked up (encoded_with);
+    if the collection was replaced since, e.g. by a re-embed published in between, the prompts are
+    encoded again with the model of the new one.
+    """
+    model_name = collection_model(collection)
+    embedding_model = resources.model_for(model_name)
+    if model_name != encoded_with:
+        prompt_embeddings = embedding_model.encode(prompts, batch_size=settings.query_batch_encode_size)
+    return query_collection(
+        collection, prompt_embeddings, top_ks, files, mmr, mmr_lambda, cutoffs, token_counter(embedding_model)
+    )
+
+
+def batch_item_error(error: Exception) -> Dict[str, Any]:
+    """
+    Result of a /query_batch item whose agent could not be queried.
+    """
+    return {
+        "status": "error",
+        "detail": getattr(error, "detail", str(error)),
+        "results": [[]],
+        "citations": [[]],
+        "distances": [[]],
+    }
+
+
+# Step 2: /query endpoint to retrieve document chunks based on a prompt, optionally from some files only
+# (registered below only when the role includes query)
+async def query_embeddings(
+    request: Request,
+    agent_name: str = Body(),
+    prompt: str = Body(),
+    top_k: int = Body(5),  # top_k defaults to 5
+    files: Optional[List[str]] = Body(None),
+    mmr: Optional[bool] = Body(None),  # diversity re-ranking, defaults to QUERY_MMR_ENABLED
+    mmr_lambda: Optional[float] = Body(None),
+    max_distance: Optional[float] = Body(None),  # relevance cutoff, defaults to QUERY_MAX_DISTANCE
+    relative_gap: Optional[float] = Body(None),  # relevance cutoff, defaults to QUERY_RELATIVE_GAP
+):
 
     try:
-        print(11)
         # Validate the API key in the request header
         verify_x_api_key(headers=request.headers)
-        print(12)        
-        # Step 1: Generate the embedding for the query prompt
-        prompt_embedding = embedding_model.encode(prompt)
-        print(13)
-        # Step 2: Access the ChromaDB collection for the specified agent
-        collection_name = f"agent_{agent_name}"
-        collection = client.get_or_create_collection(name=collection_name)
-        print(14)
-        # Step 3: Query ChromaDB for the most relevant document chunks
-        results = collection.query(
-            query_embeddings=[prompt_embedding.tolist()],
-            n_results=top_k  # Use the top_k parameter to retrieve the top 'k' results
-        )
-        print(15)
-        # Extract and return the relevant document chunks
-        document_chunks = results['documents']
+        mmr, mmr_lambda = resolve_mmr(mmr, mmr_lambda)
+        cutoff = resolve_cutoff(max_distance, relative_gap)
+        _, client = resources.require()
+        # Step 1: Generate the embedding for the query prompt with the model that built the agent's
+        # collection (cached handle, 404 if the agent has none)
+        model_name = collection_model(collection_cache.get(client, agent_name))
+        prompt_embedding = resources.model_for(model_name).encode(prompt)
+        # Step 2 and 3: Query the agent's collection for the most relevant document chunks (up to top_k of them)
+        result = collection_cache.run(
+            client,
+            agent_name,
+            lambda collection: query_with_collection_model(
+                collection, [prompt], [prompt_embedding], model_name, [top_k], files, mmr, mmr_lambda, [cutoff]
+            ),
+        )[0]
+        # Return the relevant document chunks with their sources
         return {
             "status": "success",
             "agent_name": agent_name,
             "prompt": prompt,
-            "results": document_chunks
+            **result,
         }
     
         # In the function calling the query apply the following
@@ -167,10 +387,156 @@ async def query_embeddings(request: Request, agent_name: str = Body(), prompt: s
 
 
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing query for agent {agent_name}: {str(e)}")
 
 
+# /query_batch endpoint to retrieve document chunks for many (agent_name, prompt, top_k, files) items at once
+# (registered below only when the role includes query)
+async def query_embeddings_batch(request: Request, items: List[Dict[str, Any]] = Body(..., embed=True)):
+
+    try:
+        verify_x_api_key(headers=request.headers)
+        if not items:
+            raise HTTPException(status_code=400, detail="No items to query")
+        if len(items) > settings.query_batch_max_items:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Too many items, the maximum is {settings.query_batch_max_items}",
+            )
+        for item in items:
+            if not item.get("agent_name") or not isinstance(item.get("prompt"), str):
+                raise HTTPException(status_code=400, detail="Each item needs an agent_name and a prompt")
+        mmr_by_item = [resolve_mmr(item.get("mmr"), item.get("mmr_lambda")) for item in items]
+        cutoff_by_item = [resolve_cutoff(item.get("max_distance"), item.get("relative_gap")) for item in items]
+        _, client = resources.require()
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+
+        # Step 1: Find the embedding model that built each agent's collection (cached handles);
+        # an agent without a collection only fails its own items
+        model_by_agent: Dict[str, str] = {}
+        for agent_name in dict.fromkeys(item["agent_name"] for item in items):
+            try:
+                model_by_agent[agent_name] = collection_model(collection_cache.get(client, agent_name))
+            except Exception as e:
+                for position, item in enumerate(items):
+                    if item["agent_name"] == agent_name:
+                        results[position] = batch_item_error(e)
+
+        # Step 2: Encode the prompts in batched forward passes, once per model
+        prompt_embeddings: List[Any] = [None] * len(items)
+        positions_by_model: Dict[str, List[int]] = {}
+        for position, item in enumerate(items):
+            if item["agent_name"] in model_by_agent:
+                positions_by_model.setdefault(model_by_agent[item["agent_name"]], []).append(position)
+        for model_name, positions in positions_by_model.items():
+            embeddings = resources.model_for(model_name).encode(
+                [items[position]["prompt"] for position in positions], batch_size=settings.query_batch_encode_size
+            )
+            for position, embedding in zip(positions, embeddings):
+                prompt_embeddings[position] = embedding
+
+        # Step 3: One vector search per collection, file filter and re-ranking, fetching the largest top_k asked for it
+        positions_by_group: Dict[Tuple[str, Tuple[str, ...], Tuple[bool, float]], List[int]] = {}
+        for position, item in enumerate(items):
+            if item["agent_name"] in model_by_agent:
+                group = (item["agent_name"], tuple(item.get("files") or ()), mmr_by_item[position])
+                positions_by_group.setdefault(group, []).append(position)
+
+        for (agent_name, files, (mmr, mmr_lambda)), positions in positions_by_group.items():
+            top_ks = [int(items[position].get("top_k", 5)) for position in positions]
+            try:
+                rows = collection_cache.run(
+                    client,
+                    agent_name,
+                    lambda collection: query_with_collection_model(
+                        collection,
+                        [items[position]["prompt"] for position in positions],
+                        [prompt_embeddings[position] for position in positions],
+                        model_by_agent[agent_name],
+                        top_ks,
+                        list(files),
+                        mmr,
+                        mmr_lambda,
+                        [cutoff_by_item[position] for position in positions],
+                    ),
+                )
+                for position, row in zip(positions, rows):
+                    results[position] = {"status": "success", **row}
+            except Exception as e:
+                # a failing collection does not fail the items of the other agents
+                for position in positions:
+                    results[position] = batch_item_error(e)
+
+        # Step 4: Return the results in the order of the items
+        return {
+            "status": "success",
+            "results": [
+                {"agent_name": item["agent_name"], "prompt": item["prompt"], **result}
+                for item, result in zip(items, results)
+            ],
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing batch query: {str(e)}")
+
+
+# /indexes endpoint to report the per-agent index state held in memory by this replica: resident
+# collections and sizes for both backends, load/eviction/hit counts for the local backend only
+# (ChromaDB manages its own cache and keeps no counts; VECTOR_STORE_MEMORY_BUDGET_MB sets its LRU limit)
+# (registered below only when the role includes query)
+async def get_index_stats(request: Request):
+    verify_x_api_key(headers=request.headers)
+    _, client = resources.require()
+    indexes = client.indexes.metrics() if hasattr(client, "indexes") else chroma_index_metrics(client)
+    return {
+        "backend": settings.vector_store_backend,
+        "indexes": indexes,
+        "collection_handles": collection_cache.stats(),
+    }
+
+
+# Register the endpoints served by this replica's role
+if settings.ingest_enabled:
+    app.post("/generate")(generate_embeddings)
+    app.get("/jobs")(list_jobs)
+    app.get("/jobs/{job_id}")(get_job)
+    app.get("/text-cache")(get_text_cache_stats)
+    app.get("/agents/{agent_name}/chunking")(get_agent_chunking)
+    app.put("/agents/{agent_name}/chunking")(set_agent_chunking)
+    app.delete("/agents/{agent_name}/files/{file_name}/chunks")(delete_agent_file_chunks)
+    app.delete("/agents/{agent_name}")(delete_agent_embeddings)
+if settings.query_enabled:
+    app.post("/query")(query_embeddings)
+    app.post("/query_batch")(query_embeddings_batch)
+    app.get("/indexes")(get_index_stats)
+
+
+# Liveness probe: the process is up and serving requests
+@app.get("/health/live")
+async def health_live():
+    if resources.error:
+        # loading failed and will not recover without a restart
+        return JSONResponse(status_code=503, content=resources.status())
+    return {"status": "alive"}
+
+
+# Readiness probe: the model and the store are loaded and usable
+@app.get("/health/ready")
+async def health_ready():
+    if not resources.ready:
+        return JSONResponse(
+            status_code=503,
+            content=resources.status(),
+            headers={"Retry-After": str(settings.retry_after_seconds)},
+        )
+    return resources.status()
+
+
 # Step 3: Run the FastAPI app with Uvicorn
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,138 @@
+"""
+parsing.py
+
+Pool of processes parsing the documents of an ingest job in parallel, one file per task.
+Results are yielded as soon as each file is parsed so chunking and encoding start right away.
+Every worker has its own pipe, so a worker stuck on a pathological file past the timeout is
+terminated and replaced on its own while the other workers keep going.
+
+Workers are started with "spawn": the ingest process already runs threads (torch, ChromaDB),
+which makes forking it unsafe.
+"""
+
+import multiprocessing
+import time
+from collections import deque
+from multiprocessing.connection import Connection, wait
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def _serve(conn: Connection) -> None:
+    """
+    Worker process loop: parse the file paths received until None is received.
+    """
+    from ingest import load_file
+
+    while True:
+        file_path = conn.recv()
+        if file_path is None:
+            break
+        try:
+            conn.send(("ok", load_file(file_path)))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+
+class _Worker:
+    """A parser process and the task it is running."""
+
+    def __init__(self, context: Any) -> None:
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_serve, args=(child_conn,), name="ingest-parser", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.task: Optional[Tuple[Any, float]] = None  # (key, started)
+
+    def stop(self, kill: bool = False) -> None:
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class ParsePool:
+    """Parses files in worker processes with a per-file timeout."""
+
+    def __init__(self, workers: int, timeout: float) -> None:
+        self.size = max(workers, 1)
+        self.timeout = timeout
+        self._context = multiprocessing.get_context("spawn")
+        self._workers: List[_Worker] = []
+        # files abandoned because they ran past the timeout
+        self.timeouts: int = 0
+
+    def _replace(self, worker: _Worker) -> _Worker:
+        worker.stop(kill=True)
+        self._workers.remove(worker)
+        new_worker = _Worker(self._context)
+        self._workers.append(new_worker)
+        return new_worker
+
+    def parse(self, files: Iterable[Tuple[Any, str]]) -> Iterator[Tuple[Any, Optional[List[Any]], Optional[str]]]:
+        """
+        Parse (key, file path) pairs and yield (key, documents, error) in completion order.
+        documents is None when the file failed to parse or timed out, with the reason in error.
+        """
+        while len(self._workers) < self.size:
+            self._workers.append(_Worker(self._context))
+
+        pending: Deque[Tuple[Any, str]] = deque(files)
+        idle: List[_Worker] = list(self._workers)
+        busy: Dict[Connection, _Worker] = {}
+        try:
+            while pending or busy:
+                while pending and idle:
+                    worker = idle.pop()
+                    if not worker.process.is_alive():
+                        worker = self._replace(worker)
+                    key, file_path = pending.popleft()
+                    worker.conn.send(file_path)
+                    worker.task = (key, time.monotonic())
+                    busy[worker.conn] = worker
+
+                # wake up for the first result or the earliest timeout
+                deadline = min(worker.task[1] for worker in busy.values()) + self.timeout
+                ready = wait(list(busy), timeout=max(deadline - time.monotonic(), 0))
+
+                for conn in ready:
+                    worker = busy.pop(conn)
+                    key = worker.task[0]
+                    worker.task = None
+                    try:
+                        status, result = conn.recv()
+                    except (EOFError, OSError):
+                        # the worker died (e.g. the parser crashed the process)
+                        idle.append(self._replace(worker))
+                        yield key, None, "parser process exited"
+                        continue
+                    idle.append(worker)
+                    if status == "ok":
+                        yield key, result, None
+                    else:
+                        yield key, None, result
+
+                now = time.monotonic()
+                for conn, worker in list(busy.items()):
+                    if now - worker.task[1] >= self.timeout:
+                        key = worker.task[0]
+                        del busy[conn]
+                        self.timeouts += 1
+                        idle.append(self._replace(worker))
+                        yield key, None, f"parsing timed out after {self.timeout}s"
+        finally:
+            # a worker still busy when the caller stops early would answer the wrong task later
+            for worker in busy.values():
+                self._replace(worker)
+
+    def close(self) -> None:
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
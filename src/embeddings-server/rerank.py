@@ -0,0 +1,62 @@
+"""
+rerank.py
+
+Re-ranking of the chunks retrieved for a prompt. Neighbouring chunks of a file overlap by
+construction and are often all among the nearest ones, so pasting the top k into the prompt
+repeats the same text. Maximal marginal relevance picks the chunks one at a time, trading the
+similarity to the prompt against the similarity to the chunks already picked.
+
+A relevance cutoff drops the candidates too far from the prompt beforehand, so a question the
+documents do not cover (small talk, ...) gets fewer chunks, or none, instead of always top k.
+"""
+
+from typing import Any, List
+
+import numpy as np
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def relevance_cutoff(distances: List[float], max_distance: float, relative_gap: float) -> int:
+    """
+    Number of leading candidates kept, the distances being sorted nearest first. A candidate is cut,
+    with all the farther ones, when its distance exceeds max_distance or the previous candidate's
+    distance by more than the relative_gap fraction. 0 disables either rule.
+    """
+    for i, distance in enumerate(distances):
+        if max_distance > 0 and distance > max_distance:
+            return i
+        if relative_gap > 0 and i > 0 and distance > distances[i - 1] * (1 + relative_gap):
+            return i
+    return len(distances)
+
+
+def mmr_select(query_embedding: Any, candidate_embeddings: Any, k: int, lambda_mult: float) -> List[int]:
+    """
+    Positions of the k candidates selected by maximal marginal relevance, in selection order.
+    lambda_mult = 1 ranks by relevance only, lambda_mult = 0 by diversity only.
+    """
+    candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+    if k <= 0 or len(candidates) == 0:
+        return []
+    if k >= len(candidates) and lambda_mult >= 1:
+        return list(range(len(candidates)))
+
+    candidates = _normalize(candidates)
+    query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    # highest similarity of every candidate to the ones selected so far
+    max_similarity = similarity[selected[0]].copy()
+    for _ in range(min(k, len(candidates)) - 1):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+    return selected
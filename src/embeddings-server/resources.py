@@ -0,0 +1,137 @@
+"""
+resources.py
+
+Lazy loading of the heavy resources of the Embeddings-server: the SentenceTransformer model
+and the vector store client (ChromaDB or the local backend, see vectorstore.py). They are loaded
+in a background thread at startup (followed by an optional warm-up encode) so that the liveness
+probe answers immediately while the readiness probe only reports ready once both are usable.
+"""
+
+import resource
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from config import settings
+
+
+class Resources:
+    """Holds the embedding model and the vector store client once they are loaded."""
+
+    def __init__(self) -> None:
+        self.embedding_model: Any = None
+        self.client: Any = None
+        self.ready: bool = False
+        self.error: Optional[str] = None
+        self.started_on: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+        self.warmup_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+        # models other than the configured one, loaded to query the collections they built
+        self.previous_models: Dict[str, Any] = {}
+        self._models_lock = threading.Lock()
+
+    def start(self) -> None:
+        """
+        Start loading the resources in a background thread.
+        """
+        self.started_on = time.time()
+        threading.Thread(target=self.load, name="resources-loader", daemon=True).start()
+
+    def load(self) -> None:
+        """
+        Load the model and the store, run the warm-up encode and mark the server ready.
+        """
+        with self._lock:
+            if self.ready:
+                return
+            try:
+                start = time.perf_counter()
+                # imported here so that importing the app does not load torch/chromadb
+                from sentence_transformers import SentenceTransformer
+                from vectorstore import open_vector_store
+
+                self.embedding_model = SentenceTransformer(
+                    model_name_or_path=settings.embedding_model_name,
+                    cache_folder=settings.models_dir,
+                    token=settings.hf_api_token,
+                )
+                self.client = open_vector_store()
+                # make sure the store is usable before reporting ready
+                self.client.heartbeat()
+                self.load_seconds = time.perf_counter() - start
+
+                if settings.warmup_enabled:
+                    self.warmup()
+
+                self.error = None
+                self.ready = True
+                print(f"Embeddings-server ready in {time.perf_counter() - start:.2f}s")
+            except Exception as e:
+                self.error = str(e)
+                print(f"Error loading embeddings-server resources: {self.error}")
+
+    def warmup(self) -> None:
+        """
+        Encode a sample text so the first real requests do not pay for lazy CUDA/BLAS
+        initialization and tokenizer warm-up.
+        """
+        start = time.perf_counter()
+        for _ in range(settings.warmup_rounds):
+            self.embedding_model.encode([settings.warmup_text] * settings.warmup_batch_size)
+        self.warmup_seconds = time.perf_counter() - start
+
+    def require(self) -> Tuple[Any, Any]:
+        """
+        Return (embedding_model, client) or raise a 503 if they are not loaded yet.
+        """
+        if not self.ready:
+            raise HTTPException(
+                status_code=503,
+                detail="Embeddings-server is not ready",
+                headers={"Retry-After": str(settings.retry_after_seconds)},
+            )
+        return self.embedding_model, self.client
+
+    def model_for(self, model_name: Optional[str]) -> Any:
+        """
+        The embedding model named model_name: the configured one, or a previous one loaded on first
+        use, to encode the queries of a collection that has not been re-embedded yet.
+        """
+        if not model_name or model_name == settings.embedding_model_name:
+            return self.embedding_model
+        with self._models_lock:
+            model = self.previous_models.get(model_name)
+            if model is None:
+                from sentence_transformers import SentenceTransformer
+
+                print(f"Loading the previous embedding model {model_name} for the collections built with it")
+                model = SentenceTransformer(
+                    model_name_or_path=model_name,
+                    cache_folder=settings.models_dir,
+                    token=settings.hf_api_token,
+                )
+                self.previous_models[model_name] = model
+            return model
+
+    def status(self) -> Dict[str, Any]:
+        """
+        Readiness details returned by the health endpoints.
+        """
+        return {
+            "status": "ready" if self.ready else ("error" if self.error else "loading"),
+            "role": settings.role,
+            "model": settings.embedding_model_name,
+            "previous_models": sorted(self.previous_models),
+            "vector_store": settings.vector_store_backend,
+            "error": self.error,
+            "load_seconds": self.load_seconds,
+            "warmup_seconds": self.warmup_seconds,
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+
+# Instantiate resources object
+resources = Resources()
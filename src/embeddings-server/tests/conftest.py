@@ -0,0 +1,9 @@
+"""
+Tests of the embeddings-server modules, run from src/embeddings-server with: python -m pytest tests
+"""
+
+import os
+import sys
+
+# the modules import each other by name, as when the server runs from its directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,63 @@
+import pytest
+from fastapi import HTTPException
+
+import jobs
+from collection_cache import CollectionCache
+from config import settings
+
+
+class FakeStore:
+    def __init__(self):
+        self.collections = {}
+        self.lookups = 0
+
+    def get_collection(self, name):
+        self.lookups += 1
+        if name not in self.collections:
+            raise ValueError(f"Collection {name} does not exist.")
+        return self.collections[name]
+
+
+@pytest.fixture(autouse=True)
+def jobs_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "jobs_database_url", str(tmp_path / "jobs.db"))
+
+
+def _lookup(cache, store, agent_name):
+    with pytest.raises(HTTPException) as error:
+        cache.get(store, agent_name)
+    assert error.value.status_code == 404
+
+
+def test_missing_collection_is_cached():
+    cache, store = CollectionCache(missing_ttl=30), FakeStore()
+    _lookup(cache, store, "a")
+    _lookup(cache, store, "a")
+    assert store.lookups == 1
+
+    store.collections["agent_a"] = "handle"
+    cache.invalidate("a")
+    assert cache.get(store, "a") == "handle"
+
+
+def test_missing_collection_is_not_cached_while_a_job_runs():
+    cache, store = CollectionCache(missing_ttl=30), FakeStore()
+    jobs.create_job("a")
+    jobs.claim_next_job("other-host:1", 600)
+    # the job may be publishing the collection
+    _lookup(cache, store, "a")
+    store.collections["agent_a"] = "handle"
+    assert cache.get(store, "a") == "handle"
+
+
+def test_other_errors_are_not_cached():
+    class BrokenStore(FakeStore):
+        def get_collection(self, name):
+            self.lookups += 1
+            raise RuntimeError("database is locked")
+
+    cache, store = CollectionCache(missing_ttl=30), BrokenStore()
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            cache.get(store, "a")
+    assert store.lookups == 2
@@ -0,0 +1,47 @@
+from dedup import ChunkDeduplicator
+
+TEXT = (
+    "The embeddings server splits every document into chunks, encodes them with the configured "
+    "model and stores them in the collection of the agent, which the api server queries to find "
+    "the passages relevant to the question of the user before calling the language model."
+)
+
+
+def test_exact_duplicates_ignore_case_punctuation_and_whitespace():
+    dedup = ChunkDeduplicator(near_threshold=0)
+    assert not dedup.is_duplicate(TEXT)
+    assert dedup.is_duplicate(TEXT.upper())
+    assert dedup.is_duplicate(TEXT.replace(" ", "\n  ").replace(",", ";"))
+    assert (dedup.exact_dropped, dedup.near_dropped, dedup.dropped) == (2, 0, 2)
+
+
+def test_near_duplicates_are_dropped():
+    dedup = ChunkDeduplicator(near_threshold=0.8)
+    assert not dedup.is_duplicate(TEXT)
+    assert dedup.is_duplicate(TEXT.replace("language model", "large language model"))
+    assert (dedup.exact_dropped, dedup.near_dropped) == (0, 1)
+
+
+def test_near_duplicates_are_kept_without_threshold():
+    dedup = ChunkDeduplicator(near_threshold=0)
+    assert not dedup.is_duplicate(TEXT)
+    assert not dedup.is_duplicate(TEXT.replace("language model", "large language model"))
+    assert dedup.dropped == 0
+
+
+def test_different_chunks_are_kept():
+    dedup = ChunkDeduplicator(near_threshold=0.8)
+    assert not dedup.is_duplicate(TEXT)
+    assert not dedup.is_duplicate("Sessions expire after an hour of inactivity and the oldest turns are dropped first.")
+    assert not dedup.is_duplicate("")
+    assert dedup.is_duplicate("  ")
+    assert dedup.dropped == 1
+
+
+def test_filter_returns_the_positions_kept():
+    dedup = ChunkDeduplicator(near_threshold=0.8)
+    other = "Archives are extracted to a staging directory before being moved into the agent's directory."
+    chunks = [TEXT, other, TEXT.lower(), TEXT.replace("user", "users"), "short"]
+    assert dedup.filter(chunks) == [0, 1, 4]
+    # the chunks kept are remembered across calls, as across the files of a job
+    assert dedup.filter([other, "another short one"]) == [1]
@@ -0,0 +1,104 @@
+from types import SimpleNamespace
+
+import pytest
+from llama_index.core.text_splitter import TokenTextSplitter
+
+from config import settings
+from ingest import chunk_documents_with_offsets, find_chunk, publish_collection
+from vectorstore import LocalVectorStore
+
+MULTI_LINE_TEXT = (
+    "Installation guide\n\n"
+    "Download the archive and   extract it.\n"
+    "Run the installer\tas an administrator.\r\n\r\n"
+    "Troubleshooting\n"
+    "  If the service does not start, check the logs.\n"
+)
+
+
+class JoiningSplitter:
+    """Splits on whitespace and re-joins the words with single spaces, like older splitters."""
+
+    def __init__(self, words_per_chunk: int, overlap: int) -> None:
+        self.words_per_chunk = words_per_chunk
+        self.overlap = overlap
+
+    def split_text(self, text):
+        words = text.split()
+        step = self.words_per_chunk - self.overlap
+        return [" ".join(words[i:i + self.words_per_chunk]) for i in range(0, len(words), step)]
+
+
+def test_find_chunk_exact_slice():
+    text = "one two three two three"
+    assert find_chunk(text, "two three") == (4, 13)
+    assert find_chunk(text, "two three", 5) == (14, 23)
+
+
+def test_find_chunk_ignores_whitespace_differences():
+    start, end = find_chunk(MULTI_LINE_TEXT, "archive and extract it. Run the installer")
+    assert MULTI_LINE_TEXT[start:end] == "archive and   extract it.\nRun the installer"
+
+
+def test_find_chunk_not_found():
+    assert find_chunk(MULTI_LINE_TEXT, "not in the text") == (-1, -1)
+    assert find_chunk(MULTI_LINE_TEXT, "the logs.", 200) == (-1, -1)
+
+
+def test_offsets_of_rejoined_chunks_on_multi_line_text():
+    documents = [SimpleNamespace(text="Cover page"), SimpleNamespace(text=MULTI_LINE_TEXT)]
+    chunks, offsets = chunk_documents_with_offsets(documents, JoiningSplitter(6, 2))
+
+    assert offsets[0] == (0, 0)
+    assert all(offset >= 0 for _, offset in offsets)
+    for chunk, (doc_index, offset) in zip(chunks, offsets):
+        # the chunks are the slices of the text the offsets point to
+        assert documents[doc_index].text[offset:offset + len(chunk)] == chunk
+    starts = [offset for doc_index, offset in offsets if doc_index == 1]
+    assert starts == sorted(starts)
+    assert chunks[1].startswith("Installation guide\n\nDownload")
+
+
+def test_offsets_of_token_splitter_chunks_on_multi_line_text():
+    text = MULTI_LINE_TEXT * 20
+    splitter = TokenTextSplitter(chunk_size=24, chunk_overlap=4, tokenizer=str.split)
+    chunks, offsets = chunk_documents_with_offsets([SimpleNamespace(text=text)], splitter)
+
+    assert len(chunks) > 1
+    for chunk, (_, offset) in zip(chunks, offsets):
+        assert offset >= 0
+        assert text[offset:offset + len(chunk)] == chunk
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "vector_store_index_idle_seconds", 0)
+    return LocalVectorStore(str(tmp_path / "vectors"))
+
+
+def _add(store, name, document):
+    store.get_or_create_collection(name).upsert(["id0"], [[1.0, 0.0]], [document], [{}])
+
+
+def test_publish_replaces_the_live_collection(store):
+    _add(store, "agent_a", "old")
+    _add(store, "agent_a_job2", "new")
+    publish_collection(store, "agent_a_job2", "agent_a")
+    assert [c.name for c in store.list_collections()] == ["agent_a"]
+    assert store.get_collection("agent_a").get()["documents"] == ["new"]
+
+
+def test_publish_without_live_collection(store):
+    _add(store, "agent_a_job2", "new")
+    # left over by an interrupted publish
+    _add(store, "agent_a_job2_old", "older")
+    publish_collection(store, "agent_a_job2", "agent_a")
+    assert [c.name for c in store.list_collections()] == ["agent_a"]
+
+
+def test_publish_failure_restores_the_live_collection(store):
+    _add(store, "agent_a", "old")
+    with pytest.raises(ValueError):
+        publish_collection(store, "agent_a_job2", "agent_a")
+    assert [c.name for c in store.list_collections()] == ["agent_a"]
+    assert store.get_collection("agent_a").get()["documents"] == ["old"]
@@ -0,0 +1,230 @@
+import os
+import socket
+
+import numpy as np
+import pytest
+
+import jobs
+from config import settings
+from resources import resources
+from textcache import text_cache
+from vectorstore import LocalVectorStore
+from worker import IngestWorker
+
+HOST = socket.gethostname()
+ME = f"{HOST}:{os.getpid()}"
+# workers on other hosts, whose liveness cannot be checked from here
+OTHER = "other-host:1"
+THIRD = "third-host:1"
+
+
+@pytest.fixture(autouse=True)
+def jobs_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "jobs_database_url", str(tmp_path / "jobs.db"))
+
+
+def test_create_job_reuses_the_queued_job():
+    first = jobs.create_job("a")
+    assert jobs.create_job("a")["id"] == first["id"]
+    assert jobs.create_job("b")["id"] != first["id"]
+
+
+def test_create_job_queues_a_new_job_behind_a_running_one():
+    running = jobs.create_job("a")
+    jobs.claim_next_job(ME, 600)
+    assert jobs.create_job("a")["id"] != running["id"]
+    # resuming reuses the running job instead
+    assert jobs.create_job("a", resume=True)["id"] == running["id"]
+
+
+def test_claim_takes_the_oldest_queued_job():
+    first = jobs.create_job("a")
+    jobs.create_job("b")
+    job = jobs.claim_next_job(ME, 600)
+    assert job["id"] == first["id"]
+    assert job["status"] == jobs.RUNNING
+    assert job["owner"] == ME
+    assert job["attempts"] == 1
+
+
+def test_claim_skips_agents_another_worker_is_ingesting():
+    jobs.create_job("a")
+    assert jobs.claim_next_job(OTHER, 600)["agent_name"] == "a"
+    jobs.create_job("a")
+    b = jobs.create_job("b")
+    assert jobs.claim_next_job(ME, 600)["id"] == b["id"]
+    assert jobs.claim_next_job(THIRD, 600) is None
+
+
+def test_claim_resumes_the_job_of_a_restarted_worker_first():
+    a = jobs.create_job("a")
+    jobs.claim_next_job(ME, 600)
+    jobs.create_job("b")
+    # the same owner claiming again means the worker restarted while running the job
+    job = jobs.claim_next_job(ME, 600)
+    assert job["id"] == a["id"]
+    assert job["attempts"] == 2
+
+
+def test_claim_resumes_the_job_of_a_dead_process():
+    a = jobs.create_job("a")
+    jobs.claim_next_job(f"{HOST}:99999999", 600)
+    assert jobs.claim_next_job(ME, 600)["id"] == a["id"]
+
+
+def test_claim_resumes_a_job_without_heartbeat():
+    a = jobs.create_job("a")
+    jobs.claim_next_job(OTHER, 600)
+    assert jobs.claim_next_job(ME, 600) is None
+    assert jobs.claim_next_job(ME, -1)["id"] == a["id"]
+
+
+def test_resume_skips_the_committed_files():
+    job = jobs.create_job("a")
+    jobs.set_job_files(job["id"], ["one.txt", "two.txt", "three.txt"])
+    jobs.checkpoint_file(job["id"], 0, 5)
+    jobs.checkpoint_file(job["id"], 1, 0, jobs.FAILED)
+
+    files = jobs.get_job_files(job["id"])
+    assert [f["file_name"] for f in files] == ["one.txt", "two.txt", "three.txt"]
+    assert [f["status"] for f in files] == [jobs.DONE, jobs.FAILED, ""]
+    job = jobs.get_job(job["id"])
+    assert (job["total_files"], job["files_done"], job["chunks"]) == (3, 2, 5)
+
+    jobs.reset_job_files(job["id"])
+    assert [f["status"] for f in jobs.get_job_files(job["id"])] == ["", "", ""]
+    assert jobs.get_job(job["id"])["files_done"] == 0
+
+
+def test_failed_attempt_is_queued_again():
+    job = jobs.create_job("a")
+    jobs.claim_next_job(ME, 600)
+    jobs.finish_job(job["id"], jobs.QUEUED, "boom")
+    job = jobs.claim_next_job(OTHER, 600)
+    assert job["attempts"] == 2
+    assert job["error"] == "boom"
+
+
+def test_finished_jobs_are_notified():
+    job = jobs.create_job("a")
+    jobs.claim_next_job(ME, 600)
+    assert jobs.get_pending_notifications() == []
+    jobs.finish_job(job["id"], jobs.DONE)
+    assert [pending["id"] for pending in jobs.get_pending_notifications()] == [job["id"]]
+    jobs.set_notification_result(job["id"], True)
+    assert jobs.get_pending_notifications() == []
+
+
+def test_has_newer_job():
+    job = jobs.create_job("a")
+    jobs.claim_next_job(ME, 600)
+    assert not jobs.has_newer_job("a", job["id"])
+    jobs.create_job("a")
+    assert jobs.has_newer_job("a", job["id"])
+
+
+def test_ingest_jobs_run_before_reembeds():
+    jobs.create_job("a", kind=jobs.REEMBED)
+    b = jobs.create_job("b")
+    assert jobs.claim_next_job(ME, 600)["id"] == b["id"]
+
+
+def test_ingest_takes_over_a_queued_reembed():
+    reembed = jobs.create_job("a", kind=jobs.REEMBED)
+    job = jobs.create_job("a")
+    assert job["id"] == reembed["id"]
+    assert job["kind"] == jobs.INGEST
+    # a re-embed reuses any active job
+    assert jobs.create_job("a", kind=jobs.REEMBED)["kind"] == jobs.INGEST
+
+
+def test_store_info():
+    assert jobs.get_store_info("embedding_model") is None
+    jobs.set_store_info("embedding_model", "m1")
+    jobs.set_store_info("embedding_model", "m2")
+    assert jobs.get_store_info("embedding_model") == "m2"
+
+
+class FakeTokenizer:
+    def encode(self, text, add_special_tokens=False):
+        return [hash(word) % 1000 for word in text.split()]
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 2
+
+
+class FakeModel:
+    max_seq_length = 130
+    tokenizer = FakeTokenizer()
+
+    def encode(self, text):
+        return np.array([len(text), text.count(" ") + 1], dtype=np.float32)
+
+
+@pytest.fixture
+def worker(tmp_path, monkeypatch):
+    for name in ("one.txt", "two.txt"):
+        (tmp_path / "agents" / "a").mkdir(parents=True, exist_ok=True)
+        (tmp_path / "agents" / "a" / name).write_text(f"The text of {name}.")
+    monkeypatch.setattr(settings, "agents_dir", str(tmp_path / "agents"))
+    monkeypatch.setattr(settings, "parse_workers", 0)
+    monkeypatch.setattr(settings, "vector_store_index_idle_seconds", 0)
+    monkeypatch.setattr(text_cache, "max_bytes", 0)
+    monkeypatch.setattr(resources, "embedding_model", FakeModel())
+    monkeypatch.setattr(resources, "client", LocalVectorStore(str(tmp_path / "vectors")))
+    monkeypatch.setattr(resources, "ready", True)
+    ingest_worker = IngestWorker()
+    monkeypatch.setattr(ingest_worker, "report_progress", lambda *args: None)
+    return ingest_worker
+
+
+def test_worker_publishes_the_job(worker):
+    job = jobs.create_job("a")
+    worker.run_job(jobs.claim_next_job(worker.owner, 600))
+    assert jobs.get_job(job["id"])["status"] == jobs.DONE
+    assert resources.client.get_collection("agent_a").count() == 2
+    assert [pending["id"] for pending in jobs.get_pending_notifications()] == [job["id"]]
+
+
+def test_running_job_is_superseded_by_a_newer_one(worker, monkeypatch):
+    job = jobs.create_job("a")
+    parse_files = worker.parse_files
+
+    def parse_files_then_queue_a_job(agent_dir, job_files):
+        for i, parsed in enumerate(parse_files(agent_dir, job_files)):
+            if i == 0:
+                jobs.create_job("a")
+            yield parsed
+
+    monkeypatch.setattr(worker, "parse_files", parse_files_then_queue_a_job)
+    worker.run_job(jobs.claim_next_job(worker.owner, 600))
+
+    assert jobs.get_job(job["id"])["status"] == jobs.SUPERSEDED
+    assert jobs.get_job(job["id"])["files_done"] == 1
+    # nothing published, no "done" sent while the newer job is queued
+    assert resources.client.list_collections() == []
+    assert jobs.get_pending_notifications() == []
+
+    newer = jobs.claim_next_job(worker.owner, 600)
+    monkeypatch.setattr(worker, "parse_files", parse_files)
+    worker.run_job(newer)
+    assert jobs.get_job(newer["id"])["status"] == jobs.DONE
+    assert resources.client.get_collection("agent_a").count() == 2
+
+
+def test_parsed_files_are_yielded_in_file_order(worker, monkeypatch, tmp_path):
+    agent_dir = tmp_path / "agents" / "a"
+    for name in ("three.txt", "zero.txt"):
+        (agent_dir / name).write_text(f"The text of {name}.")
+    job_files = [
+        {"file_no": i, "file_name": name}
+        for i, name in enumerate(["zero.txt", "one.txt", "gone.txt", "two.txt", "three.txt"])
+    ]
+    parse_uncached = worker._parse_uncached
+    # the parsers finish in reverse order
+    monkeypatch.setattr(worker, "_parse_uncached", lambda files: (result for result in reversed(list(parse_uncached(files)))))
+
+    parsed = list(worker.parse_files(str(agent_dir), job_files))
+    assert [job_file["file_no"] for job_file, _, _ in parsed] == [0, 1, 2, 3, 4]
+    assert parsed[2][1] == []
+    assert parsed[4][1][0].text == "The text of three.txt."
@@ -0,0 +1,71 @@
+import numpy as np
+
+from rerank import mmr_select, relevance_cutoff
+
+QUERY = [1.0, 0.0, 0.0]
+# two near copies of the most relevant chunk and a less relevant but different one
+CANDIDATES = [
+    [0.9, 0.1, 0.0],
+    [0.9, 0.11, 0.0],
+    [0.6, 0.0, 0.8],
+    [0.0, 1.0, 0.0],
+]
+
+
+def test_relevance_only_keeps_the_nearest_order():
+    assert mmr_select(QUERY, CANDIDATES, 3, 1.0) == [0, 1, 2]
+
+
+def test_diversity_skips_the_near_copy():
+    assert mmr_select(QUERY, CANDIDATES, 2, 0.5) == [0, 2]
+
+
+def test_first_pick_is_the_most_relevant():
+    assert mmr_select(QUERY, CANDIDATES, 1, 0.0) == [0]
+    assert mmr_select(QUERY, list(reversed(CANDIDATES)), 1, 0.5) == [3]
+
+
+def test_embeddings_are_normalized():
+    scaled = np.asarray(CANDIDATES) * np.array([[100], [1], [0.01], [5]])
+    assert mmr_select([3.0, 0.0, 0.0], scaled, 2, 0.5) == [0, 2]
+
+
+def test_k_larger_than_the_candidates():
+    selected = mmr_select(QUERY, CANDIDATES, 10, 0.5)
+    assert sorted(selected) == [0, 1, 2, 3]
+    assert mmr_select(QUERY, CANDIDATES, 10, 1.0) == [0, 1, 2, 3]
+
+
+def test_nothing_to_select():
+    assert mmr_select(QUERY, [], 3, 0.5) == []
+    assert mmr_select(QUERY, CANDIDATES, 0, 0.5) == []
+
+
+def test_zero_vectors_do_not_fail():
+    assert mmr_select(QUERY, [[0.0, 0.0, 0.0], [1.0, 0.0, 0.0]], 2, 0.5) == [1, 0]
+
+
+def test_cutoff_disabled_keeps_every_candidate():
+    assert relevance_cutoff([0.1, 0.5, 2.0], 0, 0) == 3
+
+
+def test_cutoff_max_distance():
+    assert relevance_cutoff([0.1, 0.5, 0.9, 0.95], 0.8, 0) == 2
+    assert relevance_cutoff([0.9, 1.0], 0.8, 0) == 0
+    # a distance equal to the maximum is kept
+    assert relevance_cutoff([0.1, 0.8], 0.8, 0) == 2
+
+
+def test_cutoff_relative_gap_drops_the_farther_candidates():
+    assert relevance_cutoff([0.2, 0.22, 0.5, 0.51], 0, 0.5) == 2
+    # the gap is relative to the previous candidate, not to the nearest one
+    assert relevance_cutoff([0.2, 0.28, 0.4, 0.58], 0, 0.5) == 4
+
+
+def test_cutoff_combines_both_rules():
+    assert relevance_cutoff([0.2, 0.25, 0.7], 0.9, 0.5) == 2
+    assert relevance_cutoff([0.2, 0.25, 0.3], 0.28, 0.5) == 2
+
+
+def test_cutoff_without_candidates():
+    assert relevance_cutoff([], 0.5, 0.5) == 0
@@ -0,0 +1,228 @@
+import json
+import sqlite3
+
+import numpy as np
+import pytest
+
+import vectorstore
+from config import settings
+from vectorstore import IndexCache, LocalVectorStore, _where_sql
+
+METADATAS = [
+    {"file_name": "a.txt", "chunk_index": 0},
+    {"file_name": "a.txt", "chunk_index": 1},
+    {"file_name": "b.txt", "chunk_index": 0},
+    {"file_name": "c.txt", "chunk_index": 0},
+]
+
+
+@pytest.fixture(autouse=True)
+def vector_store_settings(monkeypatch):
+    monkeypatch.setattr(settings, "vector_store_index_idle_seconds", 0)
+    monkeypatch.setattr(settings, "vector_store_memory_budget", 0)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalVectorStore(str(tmp_path / "vectors"))
+
+
+def _matching(where):
+    conn = sqlite3.connect(":memory:")
+    try:
+        conn.execute("CREATE TABLE records (row INTEGER, metadata TEXT)")
+        conn.executemany("INSERT INTO records VALUES (?, ?)", [(i, json.dumps(m)) for i, m in enumerate(METADATAS)])
+        sql, params = _where_sql(where)
+        return [row for (row,) in conn.execute(f"SELECT row FROM records WHERE {sql} ORDER BY row", params)]
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize(
+    "where,rows",
+    [
+        (None, [0, 1, 2, 3]),
+        ({}, [0, 1, 2, 3]),
+        ({"file_name": "a.txt"}, [0, 1]),
+        ({"file_name": {"$eq": "b.txt"}}, [2]),
+        ({"file_name": {"$ne": "a.txt"}}, [2, 3]),
+        ({"file_name": {"$in": ["a.txt", "c.txt"]}}, [0, 1, 3]),
+        ({"file_name": {"$nin": ["a.txt", "c.txt"]}}, [2]),
+        ({"file_name": {"$in": []}}, []),
+        ({"file_name": "a.txt", "chunk_index": 1}, [1]),
+        ({"$and": [{"file_name": "a.txt"}, {"chunk_index": 0}]}, [0]),
+        ({"$or": [{"file_name": "b.txt"}, {"chunk_index": 1}]}, [1, 2]),
+        ({"$or": [{"file_name": "c.txt"}, {"$and": [{"file_name": "a.txt"}, {"chunk_index": 0}]}]}, [0, 3]),
+        ({"missing": "x"}, []),
+    ],
+)
+def test_where_sql(where, rows):
+    assert _matching(where) == rows
+
+
+def test_where_sql_rejects_unsupported_operators():
+    with pytest.raises(ValueError):
+        _where_sql({"chunk_index": {"$gt": 0}})
+
+
+def test_get_or_create_keeps_the_existing_metadata(store):
+    store.get_or_create_collection("agent", metadata={"embedding_model": "one"})
+    assert store.get_or_create_collection("agent", metadata={"embedding_model": "two"}).metadata == {"embedding_model": "one"}
+    with pytest.raises(ValueError):
+        store.get_collection("missing")
+
+
+def test_upsert_query_and_get(store):
+    collection = store.get_or_create_collection("agent")
+    embeddings = np.eye(4, dtype=np.float32)
+    collection.upsert([f"id{i}" for i in range(4)], embeddings, [f"doc{i}" for i in range(4)], METADATAS)
+    assert collection.count() == 4
+
+    results = collection.query([[0.9, 0.1, 0, 0]], n_results=2)
+    assert results["ids"] == [["id0", "id1"]]
+    assert results["documents"] == [["doc0", "doc1"]]
+    assert results["metadatas"][0][0] == METADATAS[0]
+    assert results["distances"][0][0] == pytest.approx(0.02)
+
+    results = collection.query([[0.9, 0.1, 0, 0]], n_results=2, where={"file_name": {"$ne": "a.txt"}})
+    assert results["ids"] == [["id2", "id3"]]
+    assert collection.get(where={"file_name": "a.txt"})["ids"] == ["id0", "id1"]
+    assert collection.get(ids=["id3", "missing"])["documents"] == ["doc3"]
+
+
+def test_upsert_replaces_records_with_the_same_id(store):
+    collection = store.get_or_create_collection("agent")
+    collection.upsert(["id0", "id1"], np.eye(2), ["old0", "doc1"], METADATAS[:2])
+    collection.upsert(["id0"], [[0.0, 1.0]], ["new0"], [METADATAS[0]])
+    assert collection.count() == 2
+    assert collection.get(ids=["id0"])["documents"] == ["new0"]
+    assert collection.query([[0.0, 1.0]], n_results=2)["distances"][0] == [0.0, 0.0]
+    with pytest.raises(ValueError):
+        collection.upsert(["id2"], [[1.0, 0.0, 0.0]], ["doc2"], [{}])
+
+
+def test_delete_by_filter_and_ids(store):
+    collection = store.get_or_create_collection("agent")
+    collection.upsert([f"id{i}" for i in range(4)], np.eye(4), [f"doc{i}" for i in range(4)], METADATAS)
+    collection.delete(where={"file_name": "a.txt"})
+    collection.delete(ids=["id3"])
+    assert collection.get()["ids"] == ["id2"]
+    assert collection.query([[1.0, 0, 0, 0]], n_results=3)["ids"] == [["id2"]]
+
+
+def test_rename_and_delete_collection(store):
+    collection = store.get_or_create_collection("staging", metadata={"embedding_model": "one"})
+    collection.upsert(["id0"], [[1.0, 0.0]], ["doc0"], [{}])
+    store.get_or_create_collection("agent")
+    with pytest.raises(ValueError):
+        collection.modify(name="agent")
+    store.delete_collection("agent")
+
+    collection.modify(name="agent")
+    assert [c.name for c in store.list_collections()] == ["agent"]
+    assert store.get_collection("agent").get()["documents"] == ["doc0"]
+    assert store.get_collection("agent").metadata == {"embedding_model": "one"}
+
+    store.delete_collection("agent")
+    assert store.list_collections() == []
+    with pytest.raises(ValueError):
+        store.delete_collection("agent")
+
+
+def test_hnsw_search_matches_the_exact_search(store, monkeypatch):
+    pytest.importorskip("hnswlib")
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(300, 16)).astype(np.float32)
+    queries = rng.normal(size=(5, 16)).astype(np.float32)
+    metadatas = [{"file_name": f"{i % 3}.txt"} for i in range(300)]
+    collection = store.get_or_create_collection("agent")
+    collection.upsert([f"id{i}" for i in range(300)], embeddings, [""] * 300, metadatas)
+    exact = collection.query(queries, n_results=5, where={"file_name": "1.txt"})
+
+    monkeypatch.setattr(settings, "vector_store_hnsw_threshold", 100)
+    collection.build_index()
+    assert store.indexes.metrics()["collections"]["agent"]["loads"] == 1
+    assert collection.query(queries, n_results=5, where={"file_name": "1.txt"})["ids"] == exact["ids"]
+
+    # records deleted after the graph was built are not returned
+    collection.delete(ids=[exact["ids"][0][0]])
+    assert exact["ids"][0][0] not in collection.query(queries[:1], n_results=5)["ids"][0]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(vectorstore.time, "monotonic", clock)
+    return clock
+
+
+def _entry(uid="uid"):
+    return (uid, object(), 10, 0)
+
+
+def test_index_cache_evicts_the_least_recently_used_over_the_budget(clock):
+    cache = IndexCache(budget_bytes=250, idle_seconds=0)
+    cache.put("a", _entry(), 100)
+    cache.put("b", _entry(), 100)
+    assert cache.get("a") is not None
+    cache.put("c", _entry(), 100)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    metrics = cache.metrics()
+    assert metrics["resident_bytes"] == 200
+    assert metrics["collections"]["b"] == {
+        "resident": False, "resident_bytes": 0, "idle_seconds": None, "loads": 1, "evictions": 1, "hits": 0,
+    }
+    assert metrics["collections"]["a"]["hits"] == 2
+
+
+def test_index_cache_keeps_a_graph_larger_than_the_budget_while_it_is_queried(clock):
+    cache = IndexCache(budget_bytes=100, idle_seconds=0)
+    cache.put("a", _entry(), 100)
+    cache.put("b", _entry(), 500)
+    assert cache.get("b") is not None
+    # the query of another collection brings the cache back within the budget
+    assert cache.get("a") is None
+    assert cache.metrics()["resident_bytes"] == 0
+
+
+def test_index_cache_unloads_idle_graphs(clock):
+    cache = IndexCache(budget_bytes=0, idle_seconds=60)
+    cache.put("a", _entry(), 100)
+    cache.put("b", _entry(), 100)
+    clock.now += 30
+    cache.get("b")
+    clock.now += 40
+
+    # the background sweep unloads the idle graph without waiting for another query
+    cache.sweep()
+    metrics = cache.metrics()
+    assert not metrics["collections"]["a"]["resident"]
+    assert metrics["collections"]["a"]["evictions"] == 1
+    assert metrics["collections"]["b"]["resident"]
+    assert metrics["collections"]["b"]["idle_seconds"] == 40
+    assert cache._sweeper is not None and cache._sweeper.daemon
+
+
+def test_index_cache_counts_a_new_build_as_a_load(clock):
+    cache = IndexCache(budget_bytes=0, idle_seconds=0)
+    cache.put("a", _entry("one"), 100)
+    cache.put("a", _entry("one"), 120)
+    cache.put("a", _entry("two"), 120)
+    assert cache.metrics()["collections"]["a"]["loads"] == 2
+    assert cache._sweeper is None
+
+    # forgetting the graph of a deleted collection is not an eviction
+    cache.pop("a")
+    assert cache.metrics()["collections"]["a"] == {
+        "resident": False, "resident_bytes": 0, "idle_seconds": None, "loads": 2, "evictions": 0, "hits": 0,
+    }
@@ -0,0 +1,158 @@
+"""
+textcache.py
+
+On-disk cache of the text extracted from the agents' files, keyed by a hash of the file content,
+so a rebuild only runs the readers (PDF, DOCX, ...) on files it has not seen before. Entries are
+gzip-compressed JSON. The total size is bounded: once it is exceeded, the least recently used
+entries are deleted.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional
+
+from config import settings
+
+# Size of the blocks read when hashing a file
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_digest(file_path: str) -> str:
+    """
+    SHA-256 of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class TextCache:
+    """Extracted documents of files, stored per content hash and file extension."""
+
+    def __init__(self, cache_dir: str, max_bytes: int) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size_bytes: Optional[int] = None  # computed on first use
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key(self, file_path: str, digest: str) -> str:
+        """
+        Cache key of a file: the reader depends on the extension, so it is part of the key.
+        """
+        extension = os.path.splitext(file_path)[1].lower().lstrip(".")
+        return f"{digest}.{extension}" if extension else digest
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json.gz")
+
+    def _entries(self) -> List[os.DirEntry]:
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for shard in os.scandir(self.cache_dir):
+                if shard.is_dir():
+                    entries.extend(entry for entry in os.scandir(shard.path) if entry.name.endswith(".json.gz"))
+        return entries
+
+    def _ensure_size(self) -> int:
+        if self._size_bytes is None:
+            self._size_bytes = sum(entry.stat().st_size for entry in self._entries())
+        return self._size_bytes
+
+    def contains(self, key: str) -> bool:
+        """
+        Whether the documents of a file are cached (without reading them).
+        """
+        return os.path.exists(self._path(key))
+
+    def get(self, key: str) -> Optional[List[Any]]:
+        """
+        The cached documents of a file, or None.
+        """
+        from llama_index.core.schema import Document
+
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                entries = json.load(f)
+            # the modification time orders the entries for eviction
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return [Document(text=entry["text"], metadata=entry["metadata"]) for entry in entries]
+
+    def put(self, key: str, documents: List[Any]) -> None:
+        """
+        Store the documents of a file, evicting the least recently used entries over the limit.
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entries = [{"text": doc.text, "metadata": doc.metadata} for doc in documents]
+        # written to a temporary file and renamed so a reader never sees a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.open(raw, "wt", encoding="utf-8", compresslevel=6) as f:
+                json.dump(entries, f, separators=(",", ":"), default=str)
+            size = os.path.getsize(tmp_path)
+            with self._lock:
+                previous = os.path.getsize(path) if os.path.exists(path) else 0
+                os.replace(tmp_path, path)
+                self._size_bytes = self._ensure_size() + size - previous
+                if self._size_bytes > self.max_bytes:
+                    self._evict()
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _evict(self) -> None:
+        """
+        Delete the least recently used entries until the cache is back to 90% of its limit.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry.stat().st_mtime)
+        target = int(self.max_bytes * 0.9)
+        size = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if size <= target:
+                break
+            try:
+                entry_size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            size -= entry_size
+            self.evictions += 1
+        self._size_bytes = size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = len(self._entries())
+            size_bytes = self._ensure_size()
+            return {
+                "enabled": self.enabled,
+                "entries": entries,
+                "size_bytes": size_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+# Instantiate the cache of extracted text
+text_cache = TextCache(settings.text_cache_dir, settings.text_cache_max_bytes)
@@ -0,0 +1,731 @@
+"""
+vectorstore.py
+
+Vector stores of the Embeddings-server. The rest of the server only uses the small part of the
+ChromaDB client API described by VectorStore and VectorCollection, so the backend is chosen with
+VECTOR_STORE_BACKEND:
+
+- "chroma": ChromaDB's PersistentClient (the default).
+- "local": a built-in store with one directory per collection. Documents and metadata are kept in
+  SQLite, vectors in a flat float32 file that is memory-mapped, so opening a collection reads
+  nothing and an agent that is not queried costs no memory. Small collections are searched
+  exactly over the mapped array; collections of VECTOR_STORE_HNSW_THRESHOLD vectors or more get
+  an HNSW graph (hnswlib, installed with chromadb as chroma-hnswlib), built when the collection is
+  published and kept on disk next to the vectors. The graphs are loaded in memory on demand and
+  unloaded when idle or when the memory budget (VECTOR_STORE_MEMORY_BUDGET_MB) is exceeded, least
+  recently used first, so only the active agents take RAM.
+
+Distances are squared L2 in both backends, like ChromaDB's default, so the relevance cutoff of
+/query means the same whatever the backend.
+"""
+
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Protocol, Sequence, Tuple
+
+import numpy as np
+
+from config import settings
+
+# Files of a collection of the local backend
+RECORDS_FILE = "records.db"
+VECTORS_FILE = "vectors.f32"
+HNSW_FILE = "hnsw.bin"
+HNSW_STATE_FILE = "hnsw.json"
+
+DEFAULT_INCLUDE = ("documents", "metadatas", "distances")
+
+
+class VectorCollection(Protocol):
+    """The collection calls the Embeddings-server makes (a subset of chromadb's Collection)."""
+
+    name: str
+    metadata: Optional[Dict[str, Any]]
+
+    def count(self) -> int: ...
+
+    def upsert(self, ids: List[str], embeddings: List[Any], documents: List[str], metadatas: List[Dict[str, Any]]) -> None: ...
+
+    def query(self, query_embeddings: List[Any], n_results: int = 10, where: Optional[Dict[str, Any]] = None,
+              include: Sequence[str] = DEFAULT_INCLUDE) -> Dict[str, Any]: ...
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            include: Sequence[str] = ("documents", "metadatas")) -> Dict[str, Any]: ...
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> None: ...
+
+    def modify(self, name: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None) -> None: ...
+
+
+class VectorStore(Protocol):
+    """The client calls the Embeddings-server makes (a subset of chromadb's ClientAPI)."""
+
+    def heartbeat(self) -> int: ...
+
+    def get_collection(self, name: str) -> VectorCollection: ...
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> VectorCollection: ...
+
+    def list_collections(self) -> List[VectorCollection]: ...
+
+    def delete_collection(self, name: str) -> None: ...
+
+
+# ---------- Metadata Filters
+
+
+def _where_sql(where: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+    """
+    Translate a ChromaDB where clause into SQL over the JSON metadata. Supports equality, $eq, $ne,
+    $in, $nin, $and and $or, which covers the filters of the Embeddings-server.
+    """
+    if not where:
+        return "1", []
+    clauses: List[str] = []
+    params: List[Any] = []
+    for key, condition in where.items():
+        if key in ("$and", "$or"):
+            parts = [_where_sql(sub) for sub in condition]
+            joiner = " AND " if key == "$and" else " OR "
+            clauses.append("(" + joiner.join(sql for sql, _ in parts) + ")")
+            for _, sub_params in parts:
+                params.extend(sub_params)
+            continue
+        field = "json_extract(metadata, ?)"
+        path = f'$."{key}"'
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, value in condition.items():
+            if operator in ("$eq", "$ne"):
+                clauses.append(f"{field} {'=' if operator == '$eq' else '!='} ?")
+                params.extend([path, value])
+            elif operator in ("$in", "$nin"):
+                values = list(value)
+                placeholders = ", ".join("?" for _ in values) or "NULL"
+                clauses.append(f"{field} {'IN' if operator == '$in' else 'NOT IN'} ({placeholders})")
+                params.extend([path, *values])
+            else:
+                raise ValueError(f"Unsupported where operator: {operator}")
+    return " AND ".join(clauses), params
+
+
+# ---------- Local Backend
+
+
+class LocalCollection:
+    """A collection of the local backend (see the module docstring for the layout)."""
+
+    def __init__(self, store: "LocalVectorStore", name: str) -> None:
+        self._store = store
+        self.name = name
+
+    @property
+    def path(self) -> str:
+        return self._store.collection_path(self.name)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(os.path.join(self.path, RECORDS_FILE), timeout=30)
+
+    def _create(self) -> None:
+        """
+        Create the collection's directory and tables if they do not exist.
+        """
+        os.makedirs(self.path, exist_ok=True)
+        conn = self._connect()
+        try:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS records (
+                    row INTEGER PRIMARY KEY,
+                    id TEXT NOT NULL,
+                    document TEXT,
+                    metadata TEXT,
+                    deleted INTEGER DEFAULT 0
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_records_id ON records(id, deleted)")
+            conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+            # identifies this build of the collection, so a process notices it was replaced
+            conn.execute("INSERT OR IGNORE INTO info (key, value) VALUES ('uid', ?)", (uuid.uuid4().hex,))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _uid(self, conn: sqlite3.Connection) -> str:
+        return conn.execute("SELECT value FROM info WHERE key = 'uid'").fetchone()[0]
+
+    def _dimension(self, conn: sqlite3.Connection) -> Optional[int]:
+        row = conn.execute("SELECT value FROM info WHERE key = 'dimension'").fetchone()
+        return int(row[0]) if row else None
+
+    def _vectors(self, dimension: int) -> np.ndarray:
+        """
+        The vectors file mapped read-only; rows past the last committed record are ignored by the callers.
+        """
+        path = os.path.join(self.path, VECTORS_FILE)
+        rows = os.path.getsize(path) // (4 * dimension) if os.path.exists(path) else 0
+        if rows == 0:
+            return np.zeros((0, dimension), dtype=np.float32)
+        return np.memmap(path, dtype=np.float32, mode="r", shape=(rows, dimension))
+
+    def count(self) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM records WHERE deleted = 0").fetchone()[0]
+        finally:
+            conn.close()
+
+    def upsert(self, ids: List[str], embeddings: List[Any], documents: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """
+        Add the records, replacing the ones with the same ids. Vectors are append-only: a replaced
+        record is marked deleted and its new version is appended, which keeps the HNSW graph valid.
+        """
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("Expected one embedding per id")
+        with self._store.lock(self.name):
+            conn = self._connect()
+            try:
+                dimension = self._dimension(conn)
+                if dimension is None:
+                    dimension = vectors.shape[1]
+                    conn.execute("INSERT INTO info (key, value) VALUES ('dimension', ?)", (str(dimension),))
+                elif vectors.shape[1] != dimension:
+                    raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match the collection ({dimension})")
+
+                # vectors of an interrupted upsert past the last record are overwritten
+                last_row = conn.execute("SELECT MAX(row) FROM records").fetchone()[0]
+                first_row = 0 if last_row is None else last_row + 1
+                with open(os.path.join(self.path, VECTORS_FILE), "ab") as f:
+                    f.truncate(first_row * 4 * dimension)
+                    f.write(vectors.tobytes())
+
+                conn.executemany("UPDATE records SET deleted = 1 WHERE id = ? AND deleted = 0", [(i,) for i in ids])
+                conn.executemany(
+                    "INSERT INTO records (row, id, document, metadata) VALUES (?, ?, ?, ?)",
+                    [
+                        (first_row + i, record_id, document, json.dumps(metadata or {}))
+                        for i, (record_id, document, metadata) in enumerate(zip(ids, documents, metadatas))
+                    ],
+                )
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _alive_rows(self, conn: sqlite3.Connection, where: Optional[Dict[str, Any]]) -> np.ndarray:
+        sql, params = _where_sql(where)
+        rows = conn.execute(f"SELECT row FROM records WHERE deleted = 0 AND {sql} ORDER BY row", params).fetchall()
+        return np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+
+    def _records(self, conn: sqlite3.Connection, rows: List[int]) -> Dict[int, Tuple[str, str, str]]:
+        records: Dict[int, Tuple[str, str, str]] = {}
+        # bounded number of parameters per statement
+        for start in range(0, len(rows), 500):
+            batch = rows[start:start + 500]
+            placeholders = ", ".join("?" for _ in batch)
+            for row, record_id, document, metadata in conn.execute(
+                f"SELECT row, id, document, metadata FROM records WHERE row IN ({placeholders})", batch
+            ):
+                records[row] = (record_id, document, metadata)
+        return records
+
+    def query(self, query_embeddings: List[Any], n_results: int = 10, where: Optional[Dict[str, Any]] = None,
+              include: Sequence[str] = DEFAULT_INCLUDE) -> Dict[str, Any]:
+        """
+        Nearest records of each query embedding, in the format of chromadb's Collection.query.
+        """
+        queries = np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32))
+        conn = self._connect()
+        try:
+            dimension = self._dimension(conn)
+            total = conn.execute("SELECT COUNT(*) FROM records WHERE deleted = 0").fetchone()[0]
+            labels: List[List[int]] = [[] for _ in queries]
+            distances: List[List[float]] = [[] for _ in queries]
+            vectors = None
+            if dimension is not None and total > 0:
+                vectors = self._vectors(dimension)
+                if total >= settings.vector_store_hnsw_threshold and self._store.hnsw_available:
+                    # the rows passing the filter are only needed when there is one
+                    alive = self._alive_rows(conn, where) if where else None
+                    if alive is None or len(alive) > 0:
+                        labels, distances = self._store.hnsw_search(self, conn, vectors, queries, n_results, total, alive)
+                else:
+                    alive = self._alive_rows(conn, where)
+                    if len(alive) > 0:
+                        labels, distances = _flat_search(vectors, queries, n_results, alive)
+            records = self._records(conn, sorted({row for query_labels in labels for row in query_labels}))
+        finally:
+            conn.close()
+
+        results: Dict[str, Any] = {"ids": [[records[row][0] for row in query_labels] for query_labels in labels]}
+        if "documents" in include:
+            results["documents"] = [[records[row][1] for row in query_labels] for query_labels in labels]
+        if "metadatas" in include:
+            results["metadatas"] = [[json.loads(records[row][2]) for row in query_labels] for query_labels in labels]
+        if "distances" in include:
+            results["distances"] = distances
+        if "embeddings" in include:
+            results["embeddings"] = [
+                np.asarray(vectors[query_labels]) if vectors is not None and query_labels else np.zeros((0, 0))
+                for query_labels in labels
+            ]
+        return results
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None,
+            include: Sequence[str] = ("documents", "metadatas")) -> Dict[str, Any]:
+        sql, params = _where_sql(where)
+        if ids is not None:
+            placeholders = ", ".join("?" for _ in ids) or "NULL"
+            sql = f"{sql} AND id IN ({placeholders})"
+            params = params + list(ids)
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT id, document, metadata FROM records WHERE deleted = 0 AND {sql} ORDER BY row", params
+            ).fetchall()
+        finally:
+            conn.close()
+        results: Dict[str, Any] = {"ids": [row[0] for row in rows]}
+        if "documents" in include:
+            results["documents"] = [row[1] for row in rows]
+        if "metadatas" in include:
+            results["metadatas"] = [json.loads(row[2]) for row in rows]
+        return results
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Mark the records deleted; their vectors stay in the file and are skipped by the searches.
+        """
+        sql, params = _where_sql(where)
+        if ids is not None:
+            placeholders = ", ".join("?" for _ in ids) or "NULL"
+            sql = f"{sql} AND id IN ({placeholders})"
+            params = params + list(ids)
+        with self._store.lock(self.name):
+            conn = self._connect()
+            try:
+                conn.execute(f"UPDATE records SET deleted = 1 WHERE deleted = 0 AND {sql}", params)
+                conn.commit()
+            finally:
+                conn.close()
+
+    @property
+    def metadata(self) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT value FROM info WHERE key = 'metadata'").fetchone()
+            return json.loads(row[0]) if row else None
+        finally:
+            conn.close()
+
+    def _set_metadata(self, metadata: Dict[str, Any]) -> None:
+        conn = self._connect()
+        try:
+            conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('metadata', ?)", (json.dumps(metadata),))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def modify(self, name: Optional[str] = None, metadata: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Replace the collection's metadata and/or rename it. The ingest jobs publish a collection by
+        renaming it, so a large one gets its HNSW graph built here rather than on its first query.
+        """
+        if metadata is not None:
+            self._set_metadata(metadata)
+        if name is not None and name != self.name:
+            self._store.rename_collection(self.name, name)
+            self.name = name
+            self.build_index()
+
+    def build_index(self) -> None:
+        """
+        Build or update the HNSW graph if the collection is large enough to use one.
+        """
+        if not self._store.hnsw_available:
+            return
+        conn = self._connect()
+        try:
+            dimension = self._dimension(conn)
+            total = conn.execute("SELECT COUNT(*) FROM records WHERE deleted = 0").fetchone()[0]
+            if dimension is not None and total >= settings.vector_store_hnsw_threshold:
+                self._store.sync_index(self, conn, self._vectors(dimension))
+        finally:
+            conn.close()
+
+
+def _flat_search(vectors: np.ndarray, queries: np.ndarray, n_results: int, rows: np.ndarray) -> Tuple[List[List[int]], List[List[float]]]:
+    """
+    Exact nearest rows by squared L2 distance over the mapped vectors.
+    """
+    # rows are sorted, so this is every vector of the file: no deleted records, no orphan vectors
+    everything = len(rows) == len(vectors) and rows[-1] == len(vectors) - 1
+    candidates = vectors if everything else vectors[rows]
+    # |v - q|^2 = |v|^2 - 2 v.q + |q|^2
+    distances = (
+        np.einsum("ij,ij->i", candidates, candidates)[None, :]
+        - 2 * queries @ candidates.T
+        + np.einsum("ij,ij->i", queries, queries)[:, None]
+    )
+    np.maximum(distances, 0, out=distances)
+    k = min(n_results, len(rows))
+    nearest = np.argpartition(distances, k - 1, axis=1)[:, :k] if k < len(rows) else np.tile(np.arange(len(rows)), (len(queries), 1))
+    labels: List[List[int]] = []
+    query_distances: List[List[float]] = []
+    for i, positions in enumerate(nearest):
+        positions = positions[np.argsort(distances[i, positions], kind="stable")]
+        labels.append([int(rows[position]) for position in positions])
+        query_distances.append([float(distances[i, position]) for position in positions])
+    return labels, query_distances
+
+
+class IndexCache:
+    """
+    HNSW graphs held in memory per collection, within a memory budget: the least recently used
+    graphs are unloaded when the budget is exceeded, and graphs idle for longer than idle_seconds
+    are unloaded too, by a background sweep so that an agent that is no longer queried does not
+    wait for another one to be. An unloaded graph is loaded from disk again on the collection's
+    next query.
+    """
+
+    def __init__(self, budget_bytes: int, idle_seconds: float) -> None:
+        self.budget_bytes = budget_bytes  # 0 for no budget
+        self.idle_seconds = idle_seconds  # 0 to keep idle graphs
+        self._lock = threading.Lock()
+        # collection name -> (uid, index, rows indexed, deleted rows marked), least recently used first
+        self._entries: "OrderedDict[str, Tuple[str, Any, int, int]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._last_used: Dict[str, float] = {}
+        # per collection counters, kept after the graph is unloaded
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._sweeper: Optional[threading.Thread] = None
+
+    def _counter(self, name: str) -> Dict[str, int]:
+        return self._counters.setdefault(name, {"loads": 0, "evictions": 0, "hits": 0})
+
+    def _unload(self, name: str, evicted: bool) -> None:
+        self._entries.pop(name, None)
+        self._sizes.pop(name, None)
+        self._last_used.pop(name, None)
+        if evicted:
+            self._counter(name)["evictions"] += 1
+
+    def _evict(self, keep: Optional[str] = None) -> None:
+        """
+        Unload the idle graphs, then the least recently used ones while over the budget.
+        """
+        now = time.monotonic()
+        if self.idle_seconds > 0:
+            for name, last_used in list(self._last_used.items()):
+                if name != keep and now - last_used > self.idle_seconds:
+                    self._unload(name, evicted=True)
+        if self.budget_bytes > 0:
+            for name in list(self._entries):
+                if sum(self._sizes.values()) <= self.budget_bytes:
+                    break
+                if name != keep:
+                    self._unload(name, evicted=True)
+
+    def get(self, name: str) -> Optional[Tuple[str, Any, int, int]]:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                self._entries.move_to_end(name)
+                self._last_used[name] = time.monotonic()
+                self._counter(name)["hits"] += 1
+            self._evict(keep=name)
+            return entry
+
+    def put(self, name: str, entry: Tuple[str, Any, int, int], size_bytes: int) -> None:
+        """
+        Keep the graph of a collection; a graph that was not in memory counts as a load.
+        """
+        with self._lock:
+            if name not in self._entries or self._entries[name][0] != entry[0]:
+                self._counter(name)["loads"] += 1
+            self._entries[name] = entry
+            self._entries.move_to_end(name)
+            self._sizes[name] = size_bytes
+            self._last_used[name] = time.monotonic()
+            self._evict(keep=name)
+            if self.idle_seconds > 0 and self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._sweep_loop, name="index-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def sweep(self) -> None:
+        """
+        Unload the graphs idle for longer than idle_seconds (and any over the budget).
+        """
+        with self._lock:
+            self._evict()
+
+    def _sweep_loop(self) -> None:
+        while True:
+            time.sleep(max(self.idle_seconds / 4, 1))
+            self.sweep()
+
+    def pop(self, name: str) -> None:
+        """
+        Forget the graph of a deleted or renamed collection.
+        """
+        with self._lock:
+            self._unload(name, evicted=False)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "budget_bytes": self.budget_bytes,
+                "idle_seconds": self.idle_seconds,
+                "resident_bytes": sum(self._sizes.values()),
+                "collections": {
+                    name: {
+                        "resident": name in self._entries,
+                        "resident_bytes": self._sizes.get(name, 0),
+                        "idle_seconds": round(now - self._last_used[name], 1) if name in self._last_used else None,
+                        **counters,
+                    }
+                    for name, counters in self._counters.items()
+                },
+            }
+
+
+class LocalVectorStore:
+    """Client of the local backend: one directory per collection under root."""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._locks: Dict[str, threading.RLock] = {}
+        self._locks_lock = threading.Lock()
+        # HNSW graphs loaded in memory, within the memory budget
+        self.indexes = IndexCache(settings.vector_store_memory_budget, settings.vector_store_index_idle_seconds)
+        try:
+            import hnswlib  # noqa: F401
+            self.hnsw_available = True
+        except ImportError:
+            self.hnsw_available = False
+            print("hnswlib is not installed, large collections are searched exactly")
+
+    def collection_path(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    def lock(self, name: str) -> threading.RLock:
+        with self._locks_lock:
+            return self._locks.setdefault(name, threading.RLock())
+
+    def heartbeat(self) -> int:
+        if not os.path.isdir(self.root):
+            raise RuntimeError(f"Vector store directory {self.root} is missing")
+        return 1
+
+    def get_collection(self, name: str) -> LocalCollection:
+        if not os.path.exists(os.path.join(self.collection_path(name), RECORDS_FILE)):
+            raise ValueError(f"Collection {name} does not exist.")
+        return LocalCollection(self, name)
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict[str, Any]] = None) -> LocalCollection:
+        """
+        The collection, created if it does not exist (with the metadata, kept as is otherwise).
+        """
+        collection = LocalCollection(self, name)
+        with self.lock(name):
+            created = not os.path.exists(os.path.join(collection.path, RECORDS_FILE))
+            collection._create()
+            if created and metadata is not None:
+                collection._set_metadata(metadata)
+        return collection
+
+    def list_collections(self) -> List[LocalCollection]:
+        return [
+            LocalCollection(self, entry.name)
+            for entry in sorted(os.scandir(self.root), key=lambda entry: entry.name)
+            if os.path.exists(os.path.join(entry.path, RECORDS_FILE))
+        ]
+
+    def delete_collection(self, name: str) -> None:
+        path = self.collection_path(name)
+        if not os.path.exists(path):
+            raise ValueError(f"Collection {name} does not exist.")
+        with self.lock(name):
+            self.indexes.pop(name)
+            shutil.rmtree(path)
+
+    def rename_collection(self, name: str, new_name: str) -> None:
+        if os.path.exists(self.collection_path(new_name)):
+            raise ValueError(f"Collection {new_name} already exists.")
+        with self.lock(name), self.lock(new_name):
+            self.indexes.pop(name)
+            self.indexes.pop(new_name)
+            os.rename(self.collection_path(name), self.collection_path(new_name))
+
+    def _load_index(self, collection: LocalCollection, uid: str, dimension: int, rows: int) -> Tuple[Any, int, int]:
+        """
+        The HNSW graph of the collection: the one in memory if it is of the same build of the
+        collection, else the one on disk, else a new empty graph.
+        """
+        import hnswlib
+
+        loaded = self.indexes.get(collection.name)
+        if loaded is not None and loaded[0] == uid:
+            return loaded[1:]
+        index = hnswlib.Index(space="l2", dim=dimension)
+        state_path = os.path.join(collection.path, HNSW_STATE_FILE)
+        # the state is read before the graph and written after it, so the graph has at least its rows
+        state = None
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                state = json.load(f)
+        if state is not None and state.get("uid") == uid:
+            index.load_index(os.path.join(collection.path, HNSW_FILE), max_elements=max(state["rows"], 1))
+            return index, state["rows"], state["deleted"]
+        index.init_index(
+            max_elements=max(rows, 1),
+            M=settings.vector_store_hnsw_m,
+            ef_construction=settings.vector_store_hnsw_ef_construction,
+        )
+        return index, 0, 0
+
+    def _index_size(self, collection: LocalCollection, index: Any) -> int:
+        """
+        Memory used by a graph: about the size of its file, or estimated from its vectors and links.
+        """
+        try:
+            return os.path.getsize(os.path.join(collection.path, HNSW_FILE))
+        except OSError:
+            return index.get_current_count() * (index.dim * 4 + 2 * settings.vector_store_hnsw_m * 4 + 16)
+
+    def _save_index(self, collection: LocalCollection, uid: str, index: Any, rows: int, deleted: int) -> None:
+        for file_name, write in (
+            (HNSW_FILE, index.save_index),
+            (HNSW_STATE_FILE, lambda path: _write_json(path, {"uid": uid, "rows": rows, "deleted": deleted})),
+        ):
+            tmp_path = os.path.join(collection.path, f".{file_name}.tmp")
+            write(tmp_path)
+            os.replace(tmp_path, os.path.join(collection.path, file_name))
+
+    def sync_index(self, collection: LocalCollection, conn: sqlite3.Connection, vectors: np.ndarray) -> Any:
+        """
+        The collection's HNSW graph, brought up to date with the vectors appended and the records
+        deleted since it was saved (and saved again if it changed).
+        """
+        with self.lock(collection.name):
+            uid = collection._uid(conn)
+            rows = conn.execute("SELECT MAX(row) FROM records").fetchone()[0] + 1
+            deleted = conn.execute("SELECT COUNT(*) FROM records WHERE deleted = 1").fetchone()[0]
+            index, indexed, marked = self._load_index(collection, uid, vectors.shape[1], rows)
+            if rows > indexed or deleted > marked:
+                if rows > indexed:
+                    index.resize_index(rows)
+                    index.add_items(np.asarray(vectors[indexed:rows]), np.arange(indexed, rows))
+                for (row,) in conn.execute("SELECT row FROM records WHERE deleted = 1"):
+                    try:
+                        index.mark_deleted(row)
+                    except RuntimeError:
+                        pass  # already marked
+                indexed, marked = rows, deleted
+                self._save_index(collection, uid, index, indexed, marked)
+            self.indexes.put(collection.name, (uid, index, indexed, marked), self._index_size(collection, index))
+            return index
+
+    def hnsw_search(self, collection: LocalCollection, conn: sqlite3.Connection, vectors: np.ndarray,
+                    queries: np.ndarray, n_results: int, total: int,
+                    alive: Optional[np.ndarray]) -> Tuple[List[List[int]], List[List[float]]]:
+        """
+        Approximate nearest rows with the collection's HNSW graph, brought up to date with the
+        vectors appended and the records deleted since it was saved. alive restricts the search
+        to the rows passing a filter.
+        """
+        index = self.sync_index(collection, conn, vectors)
+        k = min(n_results, total if alive is None else len(alive))
+        index.set_ef(max(settings.vector_store_hnsw_ef_search, k))
+        try:
+            if alive is not None:
+                allowed = set(alive.tolist())
+                labels, distances = index.knn_query(queries, k=k, filter=lambda label: label in allowed)
+            else:
+                labels, distances = index.knn_query(queries, k=k)
+        except RuntimeError:
+            # the graph could not reach k records (passing the filter)
+            if alive is None:
+                alive = collection._alive_rows(conn, None)
+            return _flat_search(vectors, queries, n_results, alive)
+        return [[int(label) for label in row] for row in labels], [[float(d) for d in row] for row in distances]
+
+
+def _write_json(path: str, content: Dict[str, Any]) -> None:
+    with open(path, "w") as f:
+        json.dump(content, f)
+
+
+# ---------- Backends
+
+
+def open_vector_store(backend: Optional[str] = None, path: Optional[str] = None) -> Any:
+    """
+    Client of the configured vector store backend.
+    """
+    backend = (backend or settings.vector_store_backend).lower()
+    if backend == "local":
+        return LocalVectorStore(path or settings.vector_store_dir)
+    if backend == "chroma":
+        import chromadb
+
+        if settings.vector_store_memory_budget > 0:
+            from chromadb.config import Settings as ChromaSettings
+
+            # ChromaDB unloads the least recently used collections itself past the limit
+            return chromadb.PersistentClient(
+                path=path or settings.store_dir,
+                settings=ChromaSettings(
+                    chroma_segment_cache_policy="LRU",
+                    chroma_memory_limit_bytes=settings.vector_store_memory_budget,
+                ),
+            )
+        return chromadb.PersistentClient(path=path or settings.store_dir)
+    raise ValueError(f"Unknown vector store backend: {backend}")
+
+
+def chroma_index_metrics(client: Any) -> Dict[str, Any]:
+    """
+    The vector indexes a ChromaDB client holds in memory per collection, read from its segment
+    manager (internals of chromadb 0.5: an empty report if they are missing). Sizes are the on-disk
+    sizes of the indexes, which is what its LRU policy counts against chroma_memory_limit_bytes.
+    ChromaDB keeps no load, eviction or hit counts: those are only reported by the local backend.
+    """
+    from chromadb.types import SegmentScope
+
+    try:
+        manager = client._server._manager
+        resident_ids = list(manager.segment_cache[SegmentScope.VECTOR].cache)
+    except (AttributeError, KeyError):
+        return {"budget_bytes": settings.vector_store_memory_budget, "collections": {}}
+    names = {collection.id: collection.name for collection in client.list_collections()}
+    collections: Dict[str, Dict[str, Any]] = {}
+    for collection_id in resident_ids:
+        if collection_id in names:
+            collections[names[collection_id]] = {
+                "resident": True,
+                "resident_bytes": manager._get_segment_disk_size(collection_id),
+            }
+    return {
+        "budget_bytes": settings.vector_store_memory_budget,
+        "resident_bytes": sum(collection["resident_bytes"] for collection in collections.values()),
+        "collections": collections,
+    }
+
+
+def is_collection_missing(error: Exception) -> bool:
+    """
+    Whether an error of get_collection means that the collection does not exist: a ValueError
+    for the local backend, an InvalidCollectionException (not a ValueError) for ChromaDB. Other
+    errors (e.g. a locked database) are not answers about the collection.
+    """
+    return isinstance(error, ValueError) or type(error).__name__ == "InvalidCollectionException"
@@ -0,0 +1,398 @@
+"""
+worker.py
+
+Background threads of the ingest role: the ingest worker runs the queued jobs file by file,
+parsing the files in a process pool (see parsing.py) and checkpointing each file, and the
+notifier tells the api-server about finished jobs, retrying with a backoff until the api-server
+acknowledges.
+"""
+
+import os
+import re
+import socket
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from config import settings
+from resources import resources
+from dedup import ChunkDeduplicator
+from parsing import ParsePool
+from textcache import text_cache, file_digest
+from collection_cache import collection_cache, collection_model, model_metadata
+from vectorstore import is_collection_missing
+import jobs
+
+
+# staging collections of the jobs, named by staging_collection_name, and live collections moved
+# aside while publish_collection replaces them
+STAGING_RE = re.compile(r"_job\d+(_old)?$")
+
+
+class IngestWorker:
+    """Runs the persistent ingest jobs and delivers their notifications."""
+
+    def __init__(self) -> None:
+        # identifies this process as the owner of the jobs it runs
+        self.owner: str = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        self._threads: list = []
+        # live progress of the running jobs by job id
+        self.progress: Dict[int, Dict[str, Any]] = {}
+        # document parser processes, started with the first job
+        self._parse_pool: Optional[ParsePool] = None
+        # the collections are checked against the configured embedding model once, when it is loaded
+        self._models_checked = False
+
+    def start(self) -> None:
+        """
+        Start the ingest and notification threads.
+        """
+        self._stop.clear()
+        for target, name in ((self._run_loop, "ingest-worker"), (self._notify_loop, "ingest-notifier")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._parse_pool is not None:
+            self._parse_pool.close()
+
+    # ---------- Ingest
+
+    def _run_loop(self) -> None:
+        while not self._stop.is_set():
+            if not resources.ready:
+                self._stop.wait(settings.ingest_poll_interval)
+                continue
+            if not self._models_checked:
+                try:
+                    self.schedule_reembeds()
+                    self._models_checked = True
+                except Exception as e:
+                    print(f"Error checking the embedding model of the collections: {str(e)}")
+            try:
+                job = jobs.claim_next_job(self.owner, settings.ingest_stale_seconds)
+            except Exception as e:
+                print(f"Error claiming ingest job: {str(e)}")
+                job = None
+            if job is None:
+                self._stop.wait(settings.ingest_poll_interval)
+                continue
+            self.run_job(job)
+
+    def run_job(self, job: Dict[str, Any]) -> None:
+        """
+        Ingest the files of a job into its staging collection, skipping the files already
+        committed by a previous attempt, then publish the collection.
+        """
+        # imported here so that query replicas never load the ingestion stack
+        from ingest import (
+            list_files,
+            resolve_chunking,
+            make_text_splitter,
+            chunk_documents_with_offsets,
+            encode_chunks,
+            store_file_chunks,
+            staging_collection_name,
+            publish_collection,
+            drop_collection,
+        )
+
+        job_id: int = job["id"]
+        agent_name: str = job["agent_name"]
+        collection_name = f"agent_{agent_name}"
+        staging_name = staging_collection_name(collection_name, job_id)
+        try:
+            embedding_model, client = resources.require()
+
+            if self.supersede_if_newer(job):
+                return
+
+            agent_dir = os.path.join(settings.agents_dir, agent_name)
+            if not os.path.exists(agent_dir):
+                jobs.finish_job(job_id, jobs.FAILED, f"Directory for agent {agent_name} not found")
+                return
+
+            # the file list is snapshotted on the first attempt and reused when resuming
+            files = jobs.get_job_files(job_id)
+            if not files:
+                jobs.set_job_files(job_id, list_files(agent_dir))
+                files = jobs.get_job_files(job_id)
+
+            try:
+                staged_model = (client.get_collection(name=staging_name).metadata or {}).get("embedding_model")
+            except Exception as e:
+                if not is_collection_missing(e):
+                    raise
+                staged_model = settings.embedding_model_name
+            if staged_model != settings.embedding_model_name:
+                # the model changed since the previous attempt (or is unknown): the files are encoded again
+                drop_collection(client, staging_name)
+                jobs.reset_job_files(job_id)
+                files = jobs.get_job_files(job_id)
+            collection = client.get_or_create_collection(name=staging_name, metadata=model_metadata())
+
+            # chunks sized with the model's tokenizer so the encoder never truncates them
+            chunking = resolve_chunking(embedding_model, jobs.get_chunking_settings(agent_name), strict=False)
+            text_splitter = make_text_splitter(embedding_model, chunking)
+            # duplicates are detected across the files of the job (from this attempt on when resuming)
+            deduplicator: Optional[ChunkDeduplicator] = None
+            if settings.dedup_enabled:
+                deduplicator = ChunkDeduplicator(settings.dedup_near_threshold, settings.dedup_shingle_size)
+
+            # progress of this attempt, used for the throughput and the ETA
+            attempt_start = time.monotonic()
+            attempt_files = 0
+            attempt_chunks = 0
+            last_report = 0.0
+            self.report_progress(job_id, attempt_start, attempt_files, attempt_chunks)
+
+            # files are chunked, encoded and stored as soon as they are parsed
+            remaining = [job_file for job_file in files if job_file["status"] not in (jobs.DONE, jobs.FAILED)]
+            for job_file, documents, error in self.parse_files(agent_dir, remaining):
+                chunks = []
+                dropped = 0
+                status = jobs.DONE
+                if error is not None:
+                    # a file that cannot be parsed is skipped instead of failing the whole job
+                    print(f"Skipping {job_file['file_name']} of agent {agent_name} (job {job_id}): {error}")
+                    status = jobs.FAILED
+                elif documents:
+                    chunks, offsets = chunk_documents_with_offsets(documents, text_splitter)
+                    positions = list(range(len(chunks)))
+                    if deduplicator is not None:
+                        positions = deduplicator.filter(chunks)
+                        dropped = len(chunks) - len(positions)
+                        chunks = [chunks[position] for position in positions]
+                        offsets = [offsets[position] for position in positions]
+                    embeddings = encode_chunks(embedding_model, chunks)
+                    store_file_chunks(
+                        collection, job_file["file_no"], job_file["file_name"], chunks, embeddings, positions, offsets
+                    )
+                jobs.checkpoint_file(job_id, job_file["file_no"], len(chunks), status, dropped)
+                attempt_files += 1
+                attempt_chunks += len(chunks)
+                if time.monotonic() - last_report >= settings.progress_interval:
+                    last_report = time.monotonic()
+                    self.report_progress(job_id, attempt_start, attempt_files, attempt_chunks)
+                if self.supersede_if_newer(job):
+                    return
+                if job["kind"] == jobs.REEMBED:
+                    # re-embedding after a model change yields to the queries and to the ingest jobs
+                    if self._stop.wait(settings.reembed_throttle_seconds):
+                        return
+
+            # a job queued while this one ran would publish the latest files right after
+            if self.supersede_if_newer(job):
+                return
+            publish_collection(client, staging_name, collection_name)
+            collection_cache.invalidate(agent_name)
+            jobs.finish_job(job_id, jobs.DONE)
+            self.progress.pop(job_id, None)
+            print(f"Embeddings generated and stored for agent {agent_name} (job {job_id})")
+
+        except Exception as e:
+            # retry from the last checkpoint, up to the maximum number of attempts
+            status = jobs.QUEUED if job["attempts"] < settings.ingest_max_attempts else jobs.FAILED
+            if status == jobs.FAILED and resources.ready:
+                drop_collection(resources.client, staging_name)
+            jobs.finish_job(job_id, status, str(e))
+            self.progress.pop(job_id, None)
+            print(f"Error during ingest job {job_id} for agent {agent_name}: {str(e)}")
+
+    def supersede_if_newer(self, job: Dict[str, Any]) -> bool:
+        """
+        End the job as SUPERSEDED, without publishing its collection nor notifying the api-server,
+        if a newer job is queued for the agent: that job ingests the latest files and its "done"
+        is the one the api-server waits for.
+        """
+        from ingest import drop_collection, staging_collection_name
+
+        if not jobs.has_newer_job(job["agent_name"], job["id"]):
+            return False
+        drop_collection(resources.client, staging_collection_name(f"agent_{job['agent_name']}", job["id"]))
+        jobs.finish_job(job["id"], jobs.SUPERSEDED)
+        self.progress.pop(job["id"], None)
+        print(f"Ingest job {job['id']} for agent {job['agent_name']} superseded by a newer job")
+        return True
+
+    def schedule_reembeds(self) -> None:
+        """
+        Queue a re-embed job for each agent whose collection was built with another embedding model
+        than the configured one. Its queries keep being served from that collection, encoded with
+        the model that built it, until the job publishes the new one.
+        """
+        current = settings.embedding_model_name
+        # collections from before the tagging were built with the model of the previous start
+        previous = jobs.get_store_info("embedding_model") or current
+        client = resources.client
+        for collection in client.list_collections():
+            name = collection.name
+            if not name.startswith("agent_") or STAGING_RE.search(name):
+                continue
+            if not (collection.metadata or {}).get("embedding_model"):
+                collection.modify(metadata={"embedding_model": previous})
+            model = collection_model(collection)
+            agent_name = name[len("agent_"):]
+            if model != current and os.path.isdir(os.path.join(settings.agents_dir, agent_name)):
+                job = jobs.create_job(agent_name, kind=jobs.REEMBED)
+                print(f"Re-embedding agent {agent_name} from {model} to {current} (job {job['id']})")
+        jobs.set_store_info("embedding_model", current)
+
+    def parse_files(
+        self, agent_dir: str, job_files: List[Dict[str, Any]]
+    ) -> Iterator[Tuple[Dict[str, Any], Optional[List[Any]], Optional[str]]]:
+        """
+        Parse the files of a job and yield (job_file, documents, error) in the order of the files.
+        Files whose content is in the text cache are not parsed again; the others are all handed
+        to the process pool, or parsed in this thread (without timeout) if it is disabled. The pool
+        finishes them in any order, so results are held until the files before them are yielded:
+        the deduplicator then keeps the same copy of a duplicate chunk on every run.
+        """
+        from ingest import load_file
+
+        to_parse = []
+        missing = set()
+        cache_keys: Dict[int, str] = {}
+        for job_file in job_files:
+            file_path = os.path.join(agent_dir, job_file["file_name"])
+            if not os.path.exists(file_path):
+                # the file may have been deleted since the job was created
+                missing.add(job_file["file_no"])
+                continue
+            if text_cache.enabled:
+                key = text_cache.key(file_path, file_digest(file_path))
+                cache_keys[job_file["file_no"]] = key
+                if text_cache.contains(key):
+                    continue
+            to_parse.append((job_file, file_path))
+        uncached = {job_file["file_no"] for job_file, _ in to_parse}
+
+        parsed = self._parse_uncached(to_parse)
+        # results of the pool received before their turn, by file number
+        ready: Dict[int, Tuple[Dict[str, Any], Optional[List[Any]], Optional[str]]] = {}
+        try:
+            for job_file in job_files:
+                file_no = job_file["file_no"]
+                if file_no in missing:
+                    yield job_file, [], None
+                elif file_no not in uncached:
+                    documents = text_cache.get(cache_keys[file_no])
+                    if documents is None:
+                        # evicted since it was looked up
+                        try:
+                            documents = load_file(os.path.join(agent_dir, job_file["file_name"]))
+                        except Exception as e:
+                            yield job_file, None, str(e)
+                            continue
+                    yield job_file, documents, None
+                else:
+                    while file_no not in ready:
+                        parsed_file, documents, error = next(parsed)
+                        if documents is not None and parsed_file["file_no"] in cache_keys:
+                            try:
+                                text_cache.put(cache_keys[parsed_file["file_no"]], documents)
+                            except OSError as e:
+                                print(f"Failed to cache the text of {parsed_file['file_name']}: {str(e)}")
+                        ready[parsed_file["file_no"]] = (parsed_file, documents, error)
+                    yield ready.pop(file_no)
+        finally:
+            parsed.close()
+
+    def _parse_uncached(
+        self, files: List[Tuple[Dict[str, Any], str]]
+    ) -> Iterator[Tuple[Dict[str, Any], Optional[List[Any]], Optional[str]]]:
+        from ingest import load_file
+
+        if settings.parse_workers <= 0:
+            for job_file, file_path in files:
+                try:
+                    yield job_file, load_file(file_path), None
+                except Exception as e:
+                    yield job_file, None, str(e)
+            return
+
+        if self._parse_pool is None:
+            self._parse_pool = ParsePool(settings.parse_workers, settings.parse_timeout)
+        yield from self._parse_pool.parse(files)
+
+    # ---------- Progress
+
+    def report_progress(self, job_id: int, attempt_start: float, attempt_files: int, attempt_chunks: int) -> None:
+        """
+        Compute the progress of a running job and send it to the api-server (best effort, the
+        final status is delivered by the notifier).
+        """
+        job = jobs.get_job(job_id)
+        if job is None:
+            return
+        elapsed = time.monotonic() - attempt_start
+        remaining_files = job["total_files"] - job["files_done"]
+        eta: Optional[float] = None
+        if attempt_files:
+            eta = round(remaining_files * elapsed / attempt_files, 1)
+        progress = {
+            "job_id": job_id,
+            "status": job["status"],
+            "files_done": job["files_done"],
+            "total_files": job["total_files"],
+            "chunks": job["chunks"],
+            "chunks_dropped": job["chunks_dropped"],
+            "chunks_per_s": round(attempt_chunks / elapsed, 2) if elapsed > 0 else 0.0,
+            "eta_seconds": eta,
+            "updated_on": int(time.time()),
+        }
+        self.progress[job_id] = progress
+
+        url = f"http://{settings.api_server}:{settings.api_server_port}/api/agents/{job['agent_name']}/embeddings-progress"
+        try:
+            httpx.post(url, headers={settings.header_name: settings.header_key}, json=progress, timeout=5)
+        except httpx.HTTPError as e:
+            print(f"Failed to report progress for job {job_id}: {str(e)}")
+
+    # ---------- Notifications
+
+    def _notify_loop(self) -> None:
+        while not self._stop.wait(settings.notify_interval):
+            try:
+                for job in jobs.get_pending_notifications():
+                    self.notify_app_server(job)
+            except Exception as e:
+                print(f"Error sending ingest notifications: {str(e)}")
+
+    def notify_app_server(self, job: Dict[str, Any]) -> None:
+        """
+        Tell the api-server that the agent's job finished. Client errors (e.g. the agent was
+        deleted) are not retried; connection errors and server errors are retried with a backoff.
+        """
+        agent_name = job["agent_name"]
+        url = f"http://{settings.api_server}:{settings.api_server_port}/api/agents/{agent_name}/update-embeddings-status"
+        headers = {
+            settings.header_name: settings.header_key
+        }
+        try:
+            response = httpx.post(
+                url,
+                headers=headers,
+                json={"job_id": job["id"], "status": job["status"]},
+                timeout=10,
+            )
+            delivered = response.status_code < 500
+            if response.status_code == 200:
+                print(f"Successfully notified app-server for agent {agent_name}")
+            elif delivered:
+                print(f"app-server rejected notification for agent {agent_name}: {response.status_code}")
+        except httpx.HTTPError as e:
+            print(f"Failed to notify app-server for agent {agent_name}: {str(e)}")
+            delivered = False
+
+        retry_in = min(settings.notify_interval * 2 ** job["notify_attempts"], settings.notify_max_backoff)
+        jobs.set_notification_result(job["id"], delivered, retry_in)
+
+
+# Instantiate worker object
+ingest_worker = IngestWorker()
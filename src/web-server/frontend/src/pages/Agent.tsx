@@ -24,6 +24,17 @@ import InfoBlock from '../components/ui/InfoBlock';
 import ErrorBlock from '../components/ui/ErrorBlock';
 import { getErrorMessage } from '../util';
 
+// Progress of the ingest job pushed by the api-server
+interface EmbeddingsProgressType {
+  status: string;
+  files_done?: number;
+  total_files?: number;
+  chunks?: number;
+  chunks_dropped?: number;
+  chunks_per_s?: number;
+  eta_seconds?: number | null;
+}
+
 // Define the type for your agent data
 interface AgentDataType {
   name: string;
@@ -60,6 +71,9 @@ const Agent: React.FC = () => {
   const [newFiles, setNewFiles] = useState<File[]>([]);
   const [deletedFiles, setDeletedFiles] = useState<string>('');
   const [embeddingsStatus, setEmbeddingsStatus] = useState<string>('');
+  // 'I': files are being processed, 'F': the last processing failed
+  const isProcessing = embeddingsStatus === 'I';
+  const [progress, setProgress] = useState<EmbeddingsProgressType | null>(null);
 
   // State for UI interactions
   const [canEdit, setCanEdit] = useState<boolean>(true);
@@ -177,6 +191,28 @@ I’m here to help you navigate your insurance needs and provide expert advice o
     }
   }, [baseUrl, X_REQUEST_STR, agentname]);
 
+  // Follow the ingest progress while the files are being processed
+  useEffect(() => {
+    if (!agentname || !isProcessing) {
+      return;
+    }
+    const source = new EventSource(
+      `${baseUrl}/api/agents/${agentname}/embeddings-progress/stream?key=${X_REQUEST_STR}`,
+      { withCredentials: true }
+    );
+    source.onmessage = (event: MessageEvent) => {
+      const data: EmbeddingsProgressType = JSON.parse(event.data);
+      setProgress(data);
+      if (data.status === 'done' || data.status === 'failed') {
+        setEmbeddingsStatus(data.status === 'failed' ? 'F' : '');
+        source.close();
+      }
+    };
+    return () => {
+      source.close();
+    };
+  }, [baseUrl, X_REQUEST_STR, agentname, isProcessing]);
+
   // Edit handlers
   const handleEdit = (fieldName: string) => {
     setField(fieldName);
@@ -271,6 +307,38 @@ I’m here to help you navigate your insurance needs and provide expert advice o
     }
   };
 
+  // Archive upload handler: the archive is sent as the raw body and indexed as a single job
+  const archiveInputRef = useRef<HTMLInputElement>(null);
+  const handleArchiveUpload = async (event: React.ChangeEvent<HTMLInputElement>) => {
+    const archive = event.target.files?.[0];
+    event.target.value = '';
+    if (!archive || !agentname) {
+      return;
+    }
+    setError("");
+    setIsLoading(true);
+    try {
+      const response = await axios.post(`${baseUrl}/api/agents/${agentname}/archive`, archive, {
+        withCredentials: true,
+        headers: {
+          'X-Requested-With': X_REQUEST_STR,
+          'Content-Type': archive.type || 'application/octet-stream',
+        },
+      });
+      const data = response.data;
+      if (data && data.agent) {
+        setAgentData(data.agent);
+        setFiles(data.agent.files);
+        setEmbeddingsStatus(data.agent.embeddings_status);
+        toast.success(`${data.extracted_files.length} files added from ${archive.name}`);
+      }
+    } catch (error: any) {
+      setError(getErrorMessage(error));
+    } finally {
+      setIsLoading(false);
+    }
+  };
+
   // Refresh handler
   const handleRefresh = () => {
     window.location.reload();
@@ -288,10 +356,24 @@ I’m here to help you navigate your insurance needs and provide expert advice o
                 <ButtonPlain width="auto">Return to Agents</ButtonPlain>
               </Link>
             )}
-            {embeddingsStatus &&
+            {isProcessing &&
               <ButtonFilled width="auto" onClick={handleRefresh}>Refresh</ButtonFilled>
             }
-            {!embeddingsStatus && isEditMode && !agentData.name && (
+            {!isProcessing && !isEditMode && agentData.name && (
+              <>
+                <input
+                  ref={archiveInputRef}
+                  type="file"
+                  accept=".zip,.tar,.tar.gz,.tgz,.tar.bz2,.tar.xz"
+                  className="hidden"
+                  onChange={handleArchiveUpload}
+                />
+                <ButtonPlain width="auto" onClick={() => archiveInputRef.current?.click()}>
+                  Upload archive
+                </ButtonPlain>
+              </>
+            )}
+            {!isProcessing && isEditMode && !agentData.name && (
               <>
                 <Link to="/agents">
                   <ButtonPlain>Return to Agents</ButtonPlain>
@@ -301,7 +383,7 @@ I’m here to help you navigate your insurance needs and provide expert advice o
                 </ButtonFilled>
               </>
             )}
-            {!embeddingsStatus && isEditMode && agentData.name && (
+            {!isProcessing && isEditMode && agentData.name && (
               <>
                 <ButtonPlain onClick={handleReset}>Reset</ButtonPlain>
                 <ButtonFilled width="auto" onClick={handleSave}>
@@ -316,9 +398,24 @@ I’m here to help you navigate your insurance needs and provide expert advice o
             <ErrorBlock>{error}</ErrorBlock>
           </div>
         }
-        {embeddingsStatus &&
+        {isProcessing &&
+          <div className="float-right pr-4">
+            <InfoBlock>
+              Files are being processed ...
+              {progress && progress.total_files ? (
+                <span>
+                  {' '}{progress.files_done}/{progress.total_files} files, {progress.chunks} chunks
+                  {progress.chunks_dropped ? ` (${progress.chunks_dropped} duplicates dropped)` : ''}
+                  {progress.chunks_per_s ? `, ${progress.chunks_per_s} chunks/s` : ''}
+                  {progress.eta_seconds != null ? `, about ${Math.ceil(progress.eta_seconds)}s left` : ''}
+                </span>
+              ) : null}
+            </InfoBlock>
+          </div>
+        }
+        {embeddingsStatus === 'F' &&
           <div className="float-right pr-4">
-            <InfoBlock>Files are being processed ...</InfoBlock>
+            <ErrorBlock>Processing of the files failed. Update the files to retry.</ErrorBlock>
           </div>
         }
 
@@ -337,21 +434,21 @@ I’m here to help you navigate your insurance needs and provide expert advice o
             data={agentData.instructions}
             value={instructions}
             placeholder={agentData.name ? '' : instructionsPlaceholder}
-            canEdit={!embeddingsStatus}
+            canEdit={!isProcessing}
             onEdit={() => handleEdit('instructions')}
           />
           <WelcomeMessageView
             data={agentData.welcome_message}
             value={welcomeMessage}
             placeholder={agentData.name ? '' : welcomeMessagePlaceholder}
-            canEdit={!embeddingsStatus}
+            canEdit={!isProcessing}
             onEdit={() => handleEdit('welcomeMessage')}
           />
           <SuggestedPromptsView
             data={agentData.suggested_prompts}
             value={suggestedPrompts}
             placeholder={agentData.name ? '' : suggestedPromptsPlaceholder}
-            canEdit={!embeddingsStatus}
+            canEdit={!isProcessing}
             onEdit={() => handleEdit('suggestedPrompts')}
           />
           <FilesView
@@ -359,7 +456,7 @@ I’m here to help you navigate your insurance needs and provide expert advice o
             new_files={newFiles}
             deleted_files={deletedFiles}
             placeholder={agentData.name ? '' : filesPlaceholder}
-            canEdit={!embeddingsStatus}
+            canEdit={!isProcessing}
             onEdit={() => handleEdit('files')}
           />
         </div>
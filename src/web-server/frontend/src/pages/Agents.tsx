@@ -90,28 +90,43 @@ const Agents: React.FC = () => {
   }, [showModal]);
 
 
-  // Fetch agents on component mount
-  useEffect(() => {
-    const fetchAgents = async () => {
-      setLoading(true);
-      try {
-        const response = await axios.get(`${baseUrl}/api/agents`, {
-          withCredentials: true,
-          headers: { 'X-Requested-With': X_REQUEST_STR },
-        });
-        const data = response.data;
-        if (data && data.list) {
-          setAgents(data.list);
-        }
-      } catch (error: any) {
-        setError(getErrorMessage(error));
-      } finally {
-        setLoading(false);
+  // Paging and name filter of the agents list
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [prefix, setPrefix] = useState<string>('');
+
+  // Fetch a page of agents (appended to the list when a cursor is given)
+  const fetchAgents = async (cursor: string | null = null) => {
+    setLoading(true);
+    try {
+      const params: Record<string, string> = { limit: '50' };
+      if (cursor) {
+        params.cursor = cursor;
       }
-    };
+      if (prefix) {
+        params.prefix = prefix;
+      }
+      const response = await axios.get(`${baseUrl}/api/agents`, {
+        withCredentials: true,
+        headers: { 'X-Requested-With': X_REQUEST_STR },
+        params: params,
+      });
+      const data = response.data;
+      if (data && data.list) {
+        setAgents((prevAgents) => (cursor ? [...prevAgents, ...data.list] : data.list));
+        setNextCursor(data.next_cursor || null);
+      }
+    } catch (error: any) {
+      setError(getErrorMessage(error));
+    } finally {
+      setLoading(false);
+    }
+  };
 
-    fetchAgents();
-  }, [baseUrl, X_REQUEST_STR]);
+  // Fetch agents on component mount and when the filter changes
+  useEffect(() => {
+    const timer = setTimeout(() => fetchAgents(), 300);
+    return () => clearTimeout(timer);
+  }, [baseUrl, X_REQUEST_STR, prefix]);
 
   return (
     <div className="flex flex-col h-screen">
@@ -126,7 +141,16 @@ const Agents: React.FC = () => {
               </Link>
             </div>
           </div>
-          {agents.length === 0 && !error && (
+          <div className="mt-4">
+            <input
+              type="text"
+              value={prefix}
+              onChange={(e) => setPrefix(e.target.value)}
+              placeholder="Filter by name"
+              className="w-full border border-gray-300 rounded px-2 py-1"
+            />
+          </div>
+          {agents.length === 0 && !error && !loading && (
             <div className="mt-4">
               <InfoBlock>No agent has been created.</InfoBlock>
             </div>
@@ -149,6 +173,11 @@ const Agents: React.FC = () => {
               ))}
             </div>
           )}
+          {nextCursor && (
+            <div className="mt-4 text-center">
+              <ButtonLink onClick={() => fetchAgents(nextCursor)}>Load more</ButtonLink>
+            </div>
+          )}
           {error && (
             <div className="mt-4">
               <ErrorBlock>{error}</ErrorBlock>
@@ -42,6 +42,8 @@ const Chat: React.FC = () => {
     { id: uuidv4(),  content: agentData.welcome_message, role: 'system' },
   ]);
   const [input, setInput] = useState<string>('');
+  // the conversation history is kept by the api-server under this session
+  const [sessionId, setSessionId] = useState<string | null>(null);
 
   // New state variables for temperature and response length
   const [temperature, setTemperature] = useState<number>(2); // 1: Low, 2: Medium, 3: High
@@ -56,7 +58,7 @@ const Chat: React.FC = () => {
 
       const data = {
         input: input,
-        messages: messages,
+        session_id: sessionId,
         temperature: temperature,
         response_length: responseLength,
       };
@@ -72,6 +74,7 @@ const Chat: React.FC = () => {
         };
         const response = await axios.post(url, data, headers);
         console.log(response.data.content)
+        setSessionId(response.data.session_id);
         const responseMessage: Message = {
           id: uuidv4(), 
           content: response.data.content.toString(),